@@ -1,8 +1,119 @@
-from fastapi import FastAPI
-from app.routers import estado_procesos, admin, inferencias, usuarios
+from contextlib import asynccontextmanager
+from time import perf_counter
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.datastructures import Headers
+from app.routers import estado_procesos, admin, inferencias, trabajos, usuarios
 from fastapi.middleware.cors import CORSMiddleware
+from db.database import SessionLocal, cerrar_engine_async
+from db.migraciones import aplicar_migraciones
+from servicios.auditoria_sesiones import auditoria
+from servicios.catalogo_especies import catalogo
+from servicios.ejecucion import bd, cerrar_ejecutores
+from servicios.metricas import METRICAS_HABILITADAS, duracion_http, exportar, peticiones_http
+from servicios.perfilado import perfilador, solicita_perfil
+from servicios.seguridad import admin_desde_token
+from servicios.trabajos import trabajadores
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Tablas y columnas nuevas: los modelos ya las mapean y sin ellas fallaría cada INSERT
+    # de inferencias, así que si no se pueden aplicar la aplicación no arranca
+    try:
+        await bd.ejecutar(aplicar_migraciones)
+    except Exception as e:
+        raise RuntimeError("No se pudo actualizar el esquema de la BD, la aplicación no arranca.") from e
+    # Catálogo de especies; si la BD no responde se sigue intentando en segundo plano
+    try:
+        await bd.ejecutar(catalogo.cargar)
+    except Exception:
+        catalogo.cargar_en_segundo_plano()
+    # Hilos que procesan la cola de trabajos de inferencia asíncrona
+    trabajadores.iniciar()
+    # Hilo que escribe por lotes la auditoría de inicios de sesión
+    auditoria.iniciar()
+    yield
+    # Espera a que terminen las tareas en curso y cierra el pool de procesos
+    trabajadores.detener()
+    # Vacía los inicios de sesión pendientes antes de cerrar las conexiones
+    await run_in_threadpool(auditoria.detener)
+    cerrar_ejecutores()
+    await cerrar_engine_async()
+
+app = FastAPI(lifespan=lifespan)
+
+# Rechaza subidas demasiado grandes por Content-Length antes de recibir el cuerpo. Es el
+# único rechazo previo a la recepción: Starlette recibe el multipart completo antes de
+# llamar al handler, así que recibir_audio solo puede dejar de copiarlo.
+# (Se registra antes que CORS para que la respuesta 413 lleve sus cabeceras.)
+RUTAS_SUBIDA = {
+    "/v1/inferencia/procesar_inferencia": inferencias.MAX_SIZE_MB,
+    "/v1/inferencia/procesar_lote": inferencias.LOTE_MAX_MB,
+    "/v1/trabajos/inferencia": inferencias.MAX_SIZE_MB,
+    "/v1/trabajos/grabacion_larga": trabajos.LARGAS_MAX_MB,
+}
+MARGEN_MULTIPART = 64 * 1024
+
+@app.middleware("http")
+async def limitar_tamano_subida(request: Request, call_next):
+    if request.method == "POST" and request.url.path in RUTAS_SUBIDA:
+        max_mb = RUTAS_SUBIDA[request.url.path]
+        longitud = request.headers.get("content-length", "")
+        if longitud.isdigit() and int(longitud) > max_mb * 1024 * 1024 + MARGEN_MULTIPART:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"Archivo demasiado grande, el tamaño máximo es {max_mb} MB."}
+            )
+    return await call_next(request)
+
+# Perfilado a demanda (servicios/perfilado.py): solo administradores y solo con la cabecera
+# X-Perfilar: 1 o ?perfilar=1. Es un middleware ASGI puro: sin ellas la petición pasa
+# directa a la aplicación, sin las colas y tareas que añade un @app.middleware("http").
+def admin_de_peticion(autorizacion: str):
+    esquema, _, token = autorizacion.partition(" ")
+    db = SessionLocal()
+    try:
+        return admin_desde_token(db, token if esquema.lower() == "bearer" else None)
+    finally:
+        db.close()
+
+class PerfilarPeticion:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not solicita_perfil(scope):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            admin = await bd.ejecutar(admin_de_peticion, Headers(scope=scope).get("authorization", ""))
+        except Exception:
+            admin = None
+        sesion = perfilador.iniciar(scope["method"], scope["path"], admin.id_usuario) if admin else None
+        if sesion is None:
+            await self.app(scope, receive, send)
+            return
+
+        # El perfil termina al enviar las cabeceras de la respuesta, que llevan su id
+        terminado = False
+
+        async def enviar(mensaje):
+            nonlocal terminado
+            if mensaje["type"] == "http.response.start" and not terminado:
+                terminado = True
+                id_perfil = await run_in_threadpool(sesion.terminar, mensaje["status"])
+                mensaje = {**mensaje, "headers": [*mensaje.get("headers", []), (b"x-perfil-id", id_perfil.encode())]}
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            if not terminado:
+                await run_in_threadpool(sesion.terminar, 500)
+
+app.add_middleware(PerfilarPeticion)
 
 app.add_middleware(
     CORSMiddleware,
@@ -10,8 +121,26 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Perfil-Id", "X-Siguiente-Cursor"],
 )
 
+# Peticiones por ruta y estado (la más externa: cuenta también los 413 y las respuestas CORS).
+# Se etiqueta con la plantilla de la ruta para no crear una serie por cada id.
+# En respuestas en streaming (NDJSON, SSE) la duración llega hasta el envío de las cabeceras.
+@app.middleware("http")
+async def medir_peticiones(request: Request, call_next):
+    inicio = perf_counter()
+    estado = 500
+    try:
+        respuesta = await call_next(request)
+        estado = respuesta.status_code
+        return respuesta
+    finally:
+        ruta = request.scope.get("route")
+        plantilla = ruta.path if ruta is not None else (request.url.path if request.url.path in RUTAS_SUBIDA else "sin_ruta")
+        peticiones_http.incrementar(plantilla, request.method, str(estado))
+        duracion_http.observar(perf_counter() - inicio, plantilla, request.method)
+
 @app.get("/")
 def read_root():
     return {"message": "Backend de Tesis de Aves funcionando"}
@@ -20,8 +149,16 @@ def read_root():
 def health():
     return {"status": "ok"}
 
+@app.get("/metrics", include_in_schema=False)
+def metricas():
+    # Formato de texto de Prometheus (servicios/metricas.py)
+    if not METRICAS_HABILITADAS:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(exportar(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 app.include_router(estado_procesos.router)
 app.include_router(usuarios.router)
 app.include_router(inferencias.router)
+app.include_router(trabajos.router)
 app.include_router(admin.router)
 
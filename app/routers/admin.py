@@ -1,13 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.responses import FileResponse, StreamingResponse
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime
+from datetime import date, datetime
 
 from db import modelos
 from servicios.hist_inferencias import obtener_inferencias_admin
 # IMPORTANTE: Agregamos 'actualizar_usuario' a los imports
-from servicios.prediccion import obtener_imagen_ave
+from servicios.catalogo_especies import catalogo
+from servicios.exportacion import FORMATOS_EXPORTACION, ParquetNoDisponible, comprobar_formato, exportar
+from servicios.paginacion import CABECERA_CURSOR, PAGINA_DEFECTO, tamano_pagina
+from servicios.perfilado import perfilador
+from servicios.prediccion import obtener_imagen_ave, registro
+from servicios.registro_modelos import VersionDesconocida
 from servicios.sesiones import actualizar_usuario, obtener_sesiones_admin, obtener_usuario_nombre, obtener_usuarios, obtener_usuarios_inactivos_nombre
 from db.database import get_db
 from servicios.seguridad import get_current_user, require_admin
@@ -54,6 +60,9 @@ def listar_logs_error(
 
 @router.get("/listar_usuarios")
 def listar_usuarios(
+    response: Response,
+    cursor: Optional[str] = None,
+    limite: int = PAGINA_DEFECTO,
     db: Session = Depends(get_db),
     usuario = Depends(get_current_user)
 ):
@@ -64,7 +73,9 @@ def listar_usuarios(
             detail="Acceso denegado, solo administradores pueden acceder a esta información."
         )
 
-    usuarios = obtener_usuarios(db)
+    usuarios, siguiente = obtener_usuarios(db, cursor, tamano_pagina(limite))
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
 
     return [
         {
@@ -72,7 +83,7 @@ def listar_usuarios(
             "id_usuario": u.id_usuario,
             "Nombre completo": u.nombre_completo,
             "email": u.email,
-            "fecha_creacion": u.fecha_creacion.strftime("%d-%m-%Y %H:%M:%S"),
+            "fecha_creacion": u.fecha_creacion.strftime("%d-%m-%Y %H:%M:%S") if u.fecha_creacion else None,
             "usuario_activo": u.usuario_activo
         }
         for u in usuarios
@@ -81,6 +92,9 @@ def listar_usuarios(
 
 @router.get("/Listar_sesiones")
 def listar_sesiones(
+    response: Response,
+    cursor: Optional[str] = None,
+    limite: int = PAGINA_DEFECTO,
     db: Session = Depends(get_db),
     usuario = Depends(get_current_user)
 ):
@@ -91,14 +105,16 @@ def listar_sesiones(
             detail="Acceso denegado, solo administradores pueden acceder a esta información."
         )
     
-    sesiones = obtener_sesiones_admin(db, usuario)
+    sesiones, siguiente = obtener_sesiones_admin(db, usuario, cursor, tamano_pagina(limite))
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
 
     return [
         {
             "usuario": {
-                "id": s.usuario.id_usuario,
-                "email": s.usuario.email,
-                "rol": "admin" if s.usuario.role_id == 0 else "usuario",
+                "id": s.id_usuario,
+                "email": s.email,
+                "rol": "admin" if s.role_id == 0 else "usuario",
             },
             "fecha_ingreso": s.fecha_ingreso,
             "ip_origen": s.ip_origen,
@@ -111,11 +127,16 @@ def listar_sesiones(
 
 @router.get("/historial")
 def listar_inferencias(
+    response: Response,
+    cursor: Optional[str] = None,
+    limite: int = PAGINA_DEFECTO,
     db: Session = Depends(get_db),
     usuario = Depends(get_current_user)
 
 ):
-    inferencias = obtener_inferencias_admin(db)
+    inferencias, siguiente = obtener_inferencias_admin(db, cursor, tamano_pagina(limite))
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
 
     return [
         {
@@ -124,16 +145,39 @@ def listar_inferencias(
             "confianza": i.confianza,
             "tiempo_ejecucion": i.tiempo_ejecucion,
             "fecha": i.fecha_ejecuta,
-            "usuario": db.query(modelos.Usuario).filter(modelos.Usuario.id_usuario == i.id_usuario).first().nombre_completo if i.id_usuario else "Anónimo",
-            "ubicacion": i.meta_audio.localizacion if i.meta_audio else "No disponible",
-            "url_imagen": obtener_imagen_ave(db, i.prediccion_especie),
-            "latitud": i.meta_audio.latitud if i.meta_audio else None,
-            "longitud": i.meta_audio.longitud if i.meta_audio else None,
+            "usuario": i.nombre_completo or "Anónimo",
+            "ubicacion": i.localizacion or "No disponible",
+            # Catálogo en memoria: no consulta la BD por fila
+            "url_imagen": obtener_imagen_ave(i.prediccion_especie),
+            "latitud": i.latitud,
+            "longitud": i.longitud,
             "top_5": i.top_5
         }
         for i in inferencias
     ]
 
+@router.get("/exportar")
+def exportar_inferencias(
+    formato: str = "csv",
+    desde: Optional[date] = None,
+    hasta: Optional[date] = None,
+    especie: Optional[list[str]] = Query(None),
+    admin = Depends(require_admin)
+):
+    # Historial completo (inferencias + metadatos) en streaming para análisis; ver servicios/exportacion.py
+    try:
+        comprobar_formato(formato)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ParquetNoDisponible as e:
+        raise HTTPException(status_code=501, detail=str(e))
+
+    return StreamingResponse(
+        exportar(formato, desde, hasta, especie),
+        media_type=FORMATOS_EXPORTACION[formato],
+        headers={"Content-Disposition": f'attachment; filename="inferencias.{formato}"'}
+    )
+
 @router.get("/usuarios_inactivos/buscar")
 def buscar_usuarios_inactivos(
     nombre: str,
@@ -218,3 +262,104 @@ def reactivar_usuario(
     return {
         "mensaje": f"Usuario {usuario.nombre_completo} reactivado correctamente"
     }
+
+# ---------------------------------------------------------
+# CATÁLOGO DE ESPECIES EN MEMORIA
+# ---------------------------------------------------------
+
+@router.post("/catalogo_especies/recargar")
+def recargar_catalogo_especies(
+    admin = Depends(require_admin)
+):
+    # Tras editar la tabla `aves` no hace falta esperar al TTL
+    try:
+        catalogo.cargar()
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"No se pudo recargar el catálogo: {str(e)}")
+
+    return {
+        "mensaje": "Catálogo de especies recargado correctamente",
+        **catalogo.estadisticas()
+    }
+
+# ---------------------------------------------------------
+# VERSIONES DEL MODELO (CAMBIO EN CALIENTE Y SOMBRA)
+# ---------------------------------------------------------
+class ConfiguracionSombra(BaseModel):
+    version: Optional[str] = None  # None desactiva la sombra
+    fraccion: float = 0.1
+
+@router.get("/modelos")
+def listar_versiones_modelo(
+    admin = Depends(require_admin)
+):
+    return {
+        "versiones": registro.versiones(),
+        **registro.estadisticas()
+    }
+
+@router.post("/modelos/{version}/activar", status_code=202)
+def activar_version_modelo(
+    version: str,
+    admin = Depends(require_admin)
+):
+    # La carga y el calentamiento van en segundo plano; el modelo actual sigue atendiendo
+    try:
+        registro.activar(version)
+    except VersionDesconocida:
+        raise HTTPException(status_code=404, detail=f"Versión de modelo no encontrada: {version}")
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    return {
+        "mensaje": f"Cargando la versión {version}; consulte /v1/estado_procesos/modelo",
+        "version_activa": registro.version_activa
+    }
+
+@router.put("/modelos/sombra")
+def configurar_modelo_sombra(
+    datos: ConfiguracionSombra,
+    admin = Depends(require_admin)
+):
+    if not 0.0 <= datos.fraccion <= 1.0:
+        raise HTTPException(status_code=400, detail="La fracción debe estar entre 0 y 1")
+    try:
+        registro.configurar_sombra(datos.version, datos.fraccion)
+    except VersionDesconocida:
+        raise HTTPException(status_code=404, detail=f"Versión de modelo no encontrada: {datos.version}")
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"No se pudo cargar el modelo sombra: {str(e)}")
+
+    return registro.estadisticas()
+
+# ---------------------------------------------------------
+# PERFILES DE PETICIONES (X-Perfilar: 1 / ?perfilar=1)
+# ---------------------------------------------------------
+
+@router.get("/perfiles")
+def listar_perfiles(
+    admin = Depends(require_admin)
+):
+    # Más recientes primero; las asignaciones de memoria están en el detalle de cada perfil
+    return perfilador.listar()
+
+@router.get("/perfiles/{id_perfil}")
+def detalle_perfil(
+    id_perfil: str,
+    admin = Depends(require_admin)
+):
+    resumen = perfilador.resumen(id_perfil)
+    if resumen is None:
+        raise HTTPException(status_code=404, detail=f"Perfil no encontrado: {id_perfil}")
+    return {**resumen, "url_pilas": f"/v1/admin/logs/perfiles/{id_perfil}/pilas"}
+
+@router.get("/perfiles/{id_perfil}/pilas")
+def descargar_pilas_perfil(
+    id_perfil: str,
+    admin = Depends(require_admin)
+):
+    # Pilas colapsadas: flamegraph.pl, speedscope o inferno las convierten en flame graph
+    ruta = perfilador.ruta_pilas(id_perfil)
+    if ruta is None:
+        raise HTTPException(status_code=404, detail=f"Perfil no encontrado: {id_perfil}")
+    return FileResponse(ruta, media_type="text/plain; charset=utf-8", filename=f"{id_perfil}.folded")
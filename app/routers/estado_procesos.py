@@ -2,9 +2,16 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from servicios import prediccion
+from servicios.decodificacion import estadisticas_decodificacion
+from servicios import ejecucion
+from servicios.almacen_logmel import almacen
+from servicios.auditoria_sesiones import auditoria
+from servicios.cache_predicciones import cache
+from servicios.catalogo_especies import catalogo
+from servicios.compuerta_actividad import compuerta
 from db.database import get_db
-import librosa
-import tensorflow as tf
+import soundfile
+import soxr
 
 router = APIRouter(
     prefix="/v1/estado_procesos",
@@ -29,7 +36,7 @@ def health_check(db: Session = Depends(get_db)):
 
     #Verificar modelo IA
     try:
-        model = prediccion.model
+        model = prediccion.registro.activo
         if model is not None:
             estado["MODELO DE INFERENCIA (IA)"] = "MODELO CARGADO"
     except Exception:
@@ -37,8 +44,8 @@ def health_check(db: Session = Depends(get_db)):
 
     #Verificar librerías de audio
     try:
-        _ = librosa.__version__
-        _ = tf.__version__
+        _ = soundfile.__version__
+        _ = soxr.__version__
         estado["LIBRERÍAS DE AUDIO"] = "OPERATIVO"
     except Exception:
         estado["LIBRERÍAS DE AUDIO"] = "NO OPERATIVO"
@@ -51,5 +58,62 @@ def health_check(db: Session = Depends(get_db)):
 
     return {
         "ESTADO_SERVIDOR": estado_global,
-        "COMPONENTES": estado
+        "COMPONENTES": estado,
+        "BACKEND_INFERENCIA": prediccion.registro.nombre,
+        "VERSION_MODELO": prediccion.registro.version_activa
     }
+
+@router.get("/modelo")
+def estado_modelo():
+    # Versión activa, última carga en caliente y comparación con el modelo sombra
+    return prediccion.registro.estadisticas()
+
+@router.get("/planificador")
+def estado_planificador():
+    # Tamaños de lote alcanzados por el micro-batching, para ajustar la configuración
+    return prediccion.planificador.estadisticas()
+
+@router.get("/decodificacion")
+def estado_decodificacion():
+    # Tiempos de decodificación por formato ("remuestreo" es la parte soxr de WAV/FLAC,
+    # incluida también en su formato)
+    return estadisticas_decodificacion()
+
+@router.get("/catalogo")
+def estado_catalogo():
+    # Especies en memoria y antigüedad de la última carga desde `aves`
+    return catalogo.estadisticas()
+
+@router.get("/cache_predicciones")
+def estado_cache_predicciones():
+    # Aciertos/fallos de la caché por contenido del audio
+    return cache.estadisticas()
+
+@router.get("/compuerta_actividad")
+def estado_compuerta_actividad():
+    # Fracción de ventanas que no llegaron al modelo por silencio o ruido
+    return compuerta.estadisticas()
+
+@router.get("/almacen_logmel")
+def estado_almacen_logmel():
+    # Inferencias con su log-mel guardado por este proceso
+    return almacen.estadisticas()
+
+@router.get("/ejecucion")
+def estado_ejecucion():
+    # Profundidad de las colas de cada ejecutor; "rechazadas_saturacion" son respuestas 503
+    planificador = prediccion.planificador.estadisticas()
+    return {
+        "preproceso": ejecucion.preproceso.estadisticas(),
+        "bd": ejecucion.bd.estadisticas(),
+        "modelo": {
+            "pendientes": planificador["cola_actual"],
+            "max_pendientes": planificador["cola_max"],
+            "rechazadas_saturacion": planificador["rechazadas_cola_llena"],
+        }
+    }
+
+@router.get("/auditoria_sesiones")
+def estado_auditoria_sesiones():
+    # Registros de login pendientes de escribir y descartados (cola llena o BD caída)
+    return auditoria.estadisticas()
@@ -1,26 +1,221 @@
+import asyncio
+import json
+import os
+import zipfile
 from time import perf_counter
-from fastapi import APIRouter, Form, UploadFile, File, Depends, HTTPException
-import librosa
+from fastapi import APIRouter, Form, UploadFile, File, Depends, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.exc import TimeoutError as PoolAgotado
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from servicios.sesiones import obtener_aves, obtener_predicciones_mas_frecuentes, obtener_predicciones_mas_frecuentes_usuario
-from db import modelos
-from db.modelos import EjecucionInferencia
-from servicios.log_errores import registrar_error_sistema
-from servicios.hist_inferencias import obtener_inferencias, registrar_inferencia, registrar_metadata_audio
-from servicios.seguridad import get_current_user
-from servicios.prediccion import TARGET_SR, obtener_imagen_ave, predecir_audio
-from db.database import get_db
-import io
-import subprocess
+from servicios.sesiones import obtener_predicciones_mas_frecuentes, obtener_predicciones_mas_frecuentes_usuario
+from db.modelos import LogErrorSistema
+from servicios.log_errores import registrar_error_sistema, registrar_error_sistema_async
+from servicios.hist_inferencias import obtener_inferencias_async, registrar_inferencia_con_metadata_async, registrar_inferencias_lote
+from servicios.seguridad import get_current_user, get_current_user_async
+from servicios.decodificacion import FORMATOS, registrar_tiempos
+from servicios.almacen_logmel import ALMACEN_LOGMEL, almacen
+from servicios.cache_predicciones import cache, clave_prediccion
+from servicios.catalogo_especies import catalogo
+from servicios.compuerta_actividad import compuerta
+from servicios.ejecucion import ServidorSaturado, bd, preproceso
+from servicios.metricas import TiemposEtapas
+from servicios.paginacion import CABECERA_CURSOR, PAGINA_DEFECTO, tamano_pagina
+from servicios.planificador import ColaInferenciaLlena
+from servicios.recepcion import ArchivoDemasiadoGrande, DuracionInvalida, es_zip, extraer_zip, recibir_audio
+from servicios.preprocesado import AGREGACIONES, MODOS, SALTO_VENTANA, TARGET_FRAMES, decodificar_y_preprocesar, parametros_preprocesado
+from servicios.prediccion import combinar_probabilidades, obtener_imagen_ave, planificador, registro, resultados_top_n
+from db.database import SessionLocal, get_db, get_db_async
 
 
 router = APIRouter(prefix="/v1/inferencia", tags=["Inferencia"])
 
-ALLOWED_TYPES = ["audio/wav", "audio/mpeg", "audio/webm", "audio/mp3", "audio/webm", "video/webm"]
+ALLOWED_TYPES = list(FORMATOS)
 MAX_SIZE_MB = 100
 MIN_DURACION = 1.0
 MAX_DURACION = 60.0
-FFMPEG_PATH = "ffmpeg"
+
+# Procesamiento por lotes
+LOTE_MAX_ARCHIVOS = int(os.getenv("LOTE_MAX_ARCHIVOS", "50"))
+LOTE_MAX_MB = int(os.getenv("LOTE_MAX_MB", "500"))
+
+# Registro de errores desde el endpoint asíncrono: la escritura va al ejecutor de BD.
+# Si ese ejecutor está saturado el error no se registra (no se añade más carga).
+async def registrar_error(db: Session, mensaje_error: str, fuente: str, id_usuario: int):
+    try:
+        await bd.ejecutar(registrar_error_sistema, db, mensaje_error=mensaje_error, fuente=fuente, id_usuario=id_usuario)
+    except ServidorSaturado:
+        pass
+
+# Igual desde las rutas con sesión async; con el pool agotado el error no se registra
+async def registrar_error_async(db: AsyncSession, mensaje_error: str, fuente: str, id_usuario: int):
+    try:
+        await registrar_error_sistema_async(db, mensaje_error=mensaje_error, fuente=fuente, id_usuario=id_usuario)
+    except PoolAgotado:
+        pass
+
+# Persistencia del resultado con la sesión async de la petición
+async def guardar_inferencia(
+    db: AsyncSession,
+    *,
+    id_usuario: int,
+    resultados: list,
+    tiempo: float,
+    formato: str,
+    latitud: float,
+    longitud: float,
+    localizacion: str,
+    version_modelo: str = None,
+    caracteristicas=None,
+    tiempos_etapas: dict = None
+):
+    # Inferencia y metadatos en una transacción: log_id sale del INSERT ... RETURNING
+    log_id = await registrar_inferencia_con_metadata_async(
+        db,
+        inferencia={
+            "id_usuario": id_usuario,
+            "prediccion_especie": resultados[0]["nombre_cientifico"],
+            "confianza": resultados[0]["probabilidad"],
+            "top_5": resultados,
+            "tiempo_ejecucion": tiempo,
+            "version_modelo": version_modelo,
+            "tiempos_etapas": tiempos_etapas
+        },
+        metadata={
+            "origen": "Carga_desde_API",
+            "formato": formato,
+            "id_usuario": id_usuario,
+            "latitud": latitud if latitud else 0.0,
+            "longitud": longitud if longitud else 0.0,
+            "localizacion": localizacion if localizacion else 'No especificada'
+        }
+    )
+
+    # Log-mel de entrada al modelo, para re-evaluar modelos nuevos sin decodificar otra vez
+    if ALMACEN_LOGMEL and caracteristicas is not None:
+        await run_in_threadpool(almacen.guardar, log_id, caracteristicas)
+
+    return log_id
+
+def servidor_saturado():
+    return HTTPException(
+        status_code=503,
+        detail="El servidor está procesando demasiadas inferencias, intente de nuevo en unos segundos.",
+        headers={"Retry-After": "1"}
+    )
+
+# Etapas medidas dentro del pool; el resto del tiempo de la llamada es espera en la cola del pool
+def registrar_etapas_pool(etapas: TiemposEtapas, etapas_pool: dict, total: float):
+    for etapa, segundos in etapas_pool.items():
+        etapas.agregar(etapa, segundos)
+    etapas.agregar("espera_preproceso", max(0.0, total - sum(etapas_pool.values())))
+
+# Pasos 4-6: preprocesado en el pool y modelo en el planificador. Devuelve (top-5, duración, tensor).
+async def preprocesar_e_inferir(
+    audio,
+    content_type: str,
+    modo: str,
+    salto_ventana: int,
+    agregacion: str,
+    db: AsyncSession,
+    usuario,
+    etapas: TiemposEtapas
+):
+    # 4-5. Decodificar, validar duración y calcular el log-mel en el pool de preprocesado.
+    try:
+        inicio = perf_counter()
+        X, duracion, tiempos, omitidas, etapas_pool = await preproceso.ejecutar(
+            decodificar_y_preprocesar,
+            audio.fuente,
+            content_type,
+            modo=modo,
+            salto_ventana=salto_ventana,
+            min_duracion=MIN_DURACION,
+            max_duracion=MAX_DURACION
+        )
+        registrar_tiempos(tiempos)
+        registrar_etapas_pool(etapas, etapas_pool, perf_counter() - inicio)
+        if X is not None:
+            compuerta.registrar(len(X) + omitidas, omitidas)
+    except ServidorSaturado as e:
+        await registrar_error_async(
+            db,
+            mensaje_error=str(e),
+            fuente="cola_preprocesado_llena",
+            id_usuario=usuario.id_usuario
+        )
+        raise servidor_saturado()
+    except Exception as e:
+        await registrar_error_async(
+            db,
+            mensaje_error=str(e),
+            fuente="carga_audio",
+            id_usuario=usuario.id_usuario
+        )
+        raise HTTPException(status_code=400, detail="No se pudo cargar el archivo de audio, intente de nuevo.")
+
+    if X is None:
+        await registrar_error_async(
+            db,
+            mensaje_error=f"Duración inválida: {duracion:.2f}s",
+            fuente="valida_duracion_audio",
+            id_usuario=usuario.id_usuario
+        )
+        raise HTTPException(status_code=400, detail="Duración de audio no válida, debe ser entre 1 y 60 segundos.")
+
+    # 6. Inferencia: el planificador agrupa peticiones concurrentes; se espera sin bloquear el loop
+    try:
+        with etapas.medir("modelo"):
+            P = await asyncio.wrap_future(planificador.enviar(X))
+
+        with etapas.medir("top_n"):
+            probs = P[0] if len(P) == 1 else combinar_probabilidades(P, agregacion)
+            resultados = resultados_top_n(probs, top_n=5)
+    except (ColaInferenciaLlena, ServidorSaturado) as e:
+        await registrar_error_async(
+            db,
+            mensaje_error=str(e),
+            fuente="cola_inferencia_llena",
+            id_usuario=usuario.id_usuario
+        )
+        raise servidor_saturado()
+    except Exception as e:
+        await registrar_error_async(
+            db,
+            mensaje_error=str(e),
+            fuente="proceso_inferencia_modelo",
+            id_usuario=usuario.id_usuario
+        )
+        raise HTTPException(status_code=500, detail="Error durante la inferencia, intente de nuevo más tarde.")
+
+    return resultados, duracion, X
+
+# Caché de predicciones: con copia en BD las consultas van al ejecutor de BD con una sesión
+# síncrona propia (la de la petición es async); saturado = fallo de caché
+def con_sesion(funcion, *args):
+    db = SessionLocal()
+    try:
+        return funcion(*args, db)
+    finally:
+        db.close()
+
+async def consultar_cache(clave: str):
+    if not cache.persistir:
+        return cache.obtener(clave)
+    try:
+        return await bd.ejecutar(con_sesion, cache.obtener, clave)
+    except ServidorSaturado:
+        return None
+
+async def guardar_en_cache(clave: str, resultados: list, duracion: float, version_modelo: str):
+    if not cache.persistir:
+        cache.guardar(clave, resultados, duracion, version_modelo)
+        return
+    try:
+        await bd.ejecutar(con_sesion, cache.guardar, clave, resultados, duracion, version_modelo)
+    except ServidorSaturado:
+        cache.guardar(clave, resultados, duracion, version_modelo)
 
 @router.post("/procesar_inferencia")
 async def upload_audio(
@@ -28,26 +223,31 @@ async def upload_audio(
     latitud: float = Form(None),
     longitud: float = Form(None),
     localizacion: str = Form(None),
-    db: Session = Depends(get_db),
-    usuario=Depends(get_current_user)
+    modo: str = Form("centro"),
+    salto_ventana: int = Form(SALTO_VENTANA),
+    agregacion: str = Form("media"),
+    db: AsyncSession = Depends(get_db_async),
+    usuario=Depends(get_current_user_async)
 ):
-    
-    # 1. Leer archivo
-    try:
-        audio_bytes = await file.read()
-    except Exception as e:
-        registrar_error_sistema(
+    # El trabajo pesado sale del event loop: decodificación y log-mel en el pool de procesos,
+    # el modelo en el planificador; la BD va por la sesión async (sin salto al ejecutor de BD).
+
+    # 0. Validar parámetros del modo de análisis
+    if modo not in MODOS or agregacion not in AGREGACIONES or not 1 <= salto_ventana <= TARGET_FRAMES:
+        await registrar_error_async(
             db,
-            mensaje_error=str(e),
-            fuente="lectura_archivo",
+            mensaje_error=f"Parámetros inválidos: modo={modo}, salto_ventana={salto_ventana}, agregacion={agregacion}",
+            fuente="valida_parametros_inferencia",
             id_usuario=usuario.id_usuario
         )
-        raise HTTPException(status_code=400, detail="No se pudo leer el archivo, intente de nuevo.")
+        raise HTTPException(
+            status_code=400,
+            detail=f"Parámetros no válidos: modo debe ser {MODOS}, agregacion {AGREGACIONES} y salto_ventana entre 1 y {TARGET_FRAMES}."
+        )
 
-    # 2. Validar tipo MIME
+    # 1. Validar tipo MIME antes de leer nada
     if file.content_type not in ALLOWED_TYPES:
-        print(file.content_type)
-        registrar_error_sistema(
+        await registrar_error_async(
             db,
             mensaje_error=f"Tipo no permitido: {file.content_type}",
             fuente="valida_tipo_archivo",
@@ -55,94 +255,93 @@ async def upload_audio(
         )
         raise HTTPException(status_code=400, detail="Formato de archivo no soportado, asegurse de subir un archivo de audio válido.")
 
-    # 3. Validar tamaño
-    if len(audio_bytes) > MAX_SIZE_MB * 1024 * 1024:
-        registrar_error_sistema(
-            db,
-            mensaje_error=f"Tamaño excedido: {len(audio_bytes)} bytes",
-            fuente="valida_tamano_archivo",
-            id_usuario=usuario.id_usuario
-        )
-        raise HTTPException(status_code=413, detail="Archivo demasiado grande, el tamaño máximo es 100 MB.")
-
-    # 4. Cargar audio con librosa, convertir a wav si es necesario
+    # 2-3. Copiar por bloques validando tamaño y, por cabecera, duración (el cuerpo ya está
+    # recibido: el rechazo antes de recibirlo es el middleware de Content-Length de app/main.py)
+    etapas = TiemposEtapas()
     try:
-        if file.content_type in ("audio/webm", "video/webm"):
-            audio_bytes_2 = convertir_webm_a_wav(audio_bytes)
-
-            y, sr = librosa.load(
-                io.BytesIO(audio_bytes_2),
-                sr=TARGET_SR,
-                mono=True
-            )
-        else:   
-            y, sr = librosa.load(
-                io.BytesIO(audio_bytes),
-                sr=TARGET_SR,
-                mono=True
+        with etapas.medir("recepcion"):
+            audio = await recibir_audio(
+                file,
+                max_bytes=MAX_SIZE_MB * 1024 * 1024,
+                min_duracion=MIN_DURACION,
+                max_duracion=MAX_DURACION
             )
-    except Exception as e:
-        registrar_error_sistema(
+    except ArchivoDemasiadoGrande as e:
+        await registrar_error_async(
             db,
             mensaje_error=str(e),
-            fuente="carga_audio",
+            fuente="valida_tamano_archivo",
             id_usuario=usuario.id_usuario
         )
-        raise HTTPException(status_code=400, detail="No se pudo cargar el archivo de audio, intente de nuevo.")
-
-    # 5. Validar duración
-    duracion = len(y) / sr
-    if duracion < MIN_DURACION or duracion > MAX_DURACION:
-        registrar_error_sistema(
+        raise HTTPException(status_code=413, detail="Archivo demasiado grande, el tamaño máximo es 100 MB.")
+    except DuracionInvalida as e:
+        await registrar_error_async(
             db,
-            mensaje_error=f"Duración inválida: {duracion:.2f}s",
+            mensaje_error=str(e),
             fuente="valida_duracion_audio",
             id_usuario=usuario.id_usuario
         )
         raise HTTPException(status_code=400, detail="Duración de audio no válida, debe ser entre 1 y 60 segundos.")
-
-    # 6. Inferencia
-    inicio = perf_counter()
-    try:
-        resultados = predecir_audio(
-            y, 
-            sr,
-            db=db,
-            top_n=5
-        )
     except Exception as e:
-        registrar_error_sistema(
+        await registrar_error_async(
             db,
             mensaje_error=str(e),
-            fuente="proceso_inferencia_modelo",
+            fuente="lectura_archivo",
             id_usuario=usuario.id_usuario
         )
-        raise HTTPException(status_code=500, detail="Error durante la inferencia, intente de nuevo más tarde.")
+        raise HTTPException(status_code=400, detail="No se pudo leer el archivo, intente de nuevo.")
+
+    # Caché por contenido: la misma grabación con el mismo modelo y parámetros no se vuelve a procesar
+    # (la versión se fija aquí: un cambio de modelo en caliente no mezcla versiones en la misma petición)
+    inicio = perf_counter()
+    version_modelo = registro.version
+    clave = clave_prediccion(
+        audio.huella,
+        version_modelo=version_modelo,
+        parametros=parametros_preprocesado(modo, salto_ventana, agregacion)
+    )
+    with etapas.medir("cache"):
+        cacheada = await consultar_cache(clave)
+
+    try:
+        X = None
+        if cacheada is not None:
+            resultados, duracion = cacheada
+        else:
+            resultados, duracion, X = await preprocesar_e_inferir(
+                audio, file.content_type, modo, salto_ventana, agregacion, db, usuario, etapas
+            )
+            with etapas.medir("cache"):
+                await guardar_en_cache(clave, resultados, duracion, version_modelo)
+    finally:
+        # El archivo temporal ya no hace falta una vez decodificado
+        audio.cerrar()
 
     tiempo = perf_counter() - inicio
     prediccion_principal = resultados[0]["nombre_cientifico"]
     confianza = resultados[0]["probabilidad"]
-    imagen_url = obtener_imagen_ave(db, prediccion_principal)
-
-    registrar_inferencia(
-       db=db,
-       id_usuario=usuario.id_usuario,
-       prediccion_especie=prediccion_principal,
-       confianza=confianza,
-       top_5=resultados,
-       tiempo_ejecucion=tiempo
-)
-    
-    registrar_metadata_audio(
-        db=db,
-        origen="Carga_desde_API",
-        formato=file.content_type,
-        id_usuario=usuario.id_usuario,
-        id_inferencia=db.query(EjecucionInferencia).order_by(EjecucionInferencia.log_id.desc()).first().log_id,
-        latitud=latitud if latitud else 0.0,
-        longitud=longitud if longitud else 0.0,
-        localizacion=localizacion if localizacion else 'No especificada'
-    )
+
+    # 7. Registro del historial. La persistencia solo va al histograma de etapas:
+    # el desglose se guarda en la misma fila que se está escribiendo.
+    imagen_url = obtener_imagen_ave(prediccion_principal)
+    try:
+        inicio_persistencia = perf_counter()
+        await guardar_inferencia(
+            db,
+            id_usuario=usuario.id_usuario,
+            resultados=resultados,
+            tiempo=tiempo,
+            formato=file.content_type,
+            latitud=latitud,
+            longitud=longitud,
+            localizacion=localizacion,
+            version_modelo=version_modelo,
+            caracteristicas=X,
+            tiempos_etapas=etapas.como_dict()
+        )
+        etapas.agregar("persistencia", perf_counter() - inicio_persistencia)
+    except PoolAgotado:
+        raise servidor_saturado()
 
     return {
     "prediccion_principal": {
@@ -152,21 +351,261 @@ async def upload_audio(
         "tiempo_ejecucion": f"{tiempo:.2f} segundos.",
         "especie": prediccion_principal,
         "probabilidad": confianza,
-        "url_imagen": imagen_url
+        "url_imagen": imagen_url,
+        "desde_cache": cacheada is not None
     },
     "top_5_predicciones": resultados
 }
 
+#--------------------------------------------------
+# PROCESAR LOTE DE ARCHIVOS (NDJSON)
+#--------------------------------------------------
+
+# Línea NDJSON de un archivo del lote
+def linea_ndjson(datos: dict) -> str:
+    return json.dumps(datos, ensure_ascii=False) + "\n"
+
+# Inferencia de un archivo del lote; los errores se devuelven en la línea del archivo
+async def inferir_archivo_lote(indice: int, nombre: str, content_type: str, audio, error: str | None,
+                               modo: str, salto_ventana: int, agregacion: str, limite: asyncio.Semaphore):
+    resultado = {"indice": indice, "archivo": nombre}
+    if error is not None:
+        return {**resultado, "estado": "error", "detalle": error}, None
+
+    inicio = perf_counter()
+    etapas = TiemposEtapas()
+    try:
+        # Limita cuántos archivos del lote ocupan a la vez el pool de preprocesado
+        async with limite:
+            try:
+                inicio_pool = perf_counter()
+                futuro = preproceso.enviar(
+                    decodificar_y_preprocesar,
+                    audio.fuente,
+                    content_type,
+                    modo=modo,
+                    salto_ventana=salto_ventana,
+                    min_duracion=MIN_DURACION,
+                    max_duracion=MAX_DURACION
+                )
+                # Si se cancela la tarea el pool puede seguir leyendo el temporal:
+                # cerrar() lo borra cuando termine
+                audio.usar_en(futuro)
+                X, duracion, tiempos, omitidas, etapas_pool = await asyncio.wrap_future(futuro)
+            finally:
+                audio.cerrar()
+        registrar_tiempos(tiempos)
+        registrar_etapas_pool(etapas, etapas_pool, perf_counter() - inicio_pool)
+
+        if X is None:
+            return {**resultado, "estado": "error", "detalle": f"Duración inválida: {duracion:.2f}s"}, None
+        compuerta.registrar(len(X) + omitidas, omitidas)
+
+        version_modelo = registro.version
+        with etapas.medir("modelo"):
+            P = await asyncio.wrap_future(planificador.enviar(X))
+        with etapas.medir("top_n"):
+            probs = P[0] if len(P) == 1 else combinar_probabilidades(P, agregacion)
+            resultados = resultados_top_n(probs, top_n=5)
+    except (ColaInferenciaLlena, ServidorSaturado):
+        return {**resultado, "estado": "error", "detalle": "Servidor saturado, reintente este archivo."}, None
+    except Exception as e:
+        return {**resultado, "estado": "error", "detalle": f"No se pudo procesar el archivo: {e}"}, None
+
+    resultado.update({
+        "estado": "ok",
+        "duracion_audio": round(duracion, 2),
+        "tiempo_ejecucion": round(perf_counter() - inicio, 3),
+        "especie": resultados[0]["nombre_cientifico"],
+        "probabilidad": resultados[0]["probabilidad"],
+        "url_imagen": obtener_imagen_ave(resultados[0]["nombre_cientifico"]),
+        "version_modelo": version_modelo,
+        "tiempos_etapas": etapas.como_dict(),
+        "top_5_predicciones": resultados
+    })
+    return resultado, X
+
+# Escritura del lote completo: inserciones masivas en una sesión propia
+# (la sesión de la dependencia ya está cerrada cuando se transmite la respuesta)
+def guardar_lote(id_usuario: int, completados: list, errores: list, metadata: dict):
+    db = SessionLocal()
+    try:
+        log_ids = registrar_inferencias_lote(
+            db,
+            inferencias=[
+                {
+                    "id_usuario": id_usuario,
+                    "prediccion_especie": r["especie"],
+                    "confianza": r["probabilidad"],
+                    "top_5": r["top_5_predicciones"],
+                    "tiempo_ejecucion": r["tiempo_ejecucion"],
+                    "version_modelo": r["version_modelo"],
+                    "tiempos_etapas": r["tiempos_etapas"]
+                }
+                for r, _, _ in completados
+            ],
+            metadatos=[{**metadata, "formato": content_type, "id_usuario": id_usuario} for _, _, content_type in completados]
+        )
+
+        if errores:
+            db.add_all([
+                LogErrorSistema(mensaje_error=f"{r['archivo']}: {r['detalle']}", fuente="procesar_lote", id_usuario=id_usuario)
+                for r in errores
+            ])
+            db.commit()
+    finally:
+        db.close()
+
+    if ALMACEN_LOGMEL:
+        for log_id, (_, X, _) in zip(log_ids, completados):
+            almacen.guardar(log_id, X)
+
+    return log_ids
+
+async def transmitir_lote(archivos: list, id_usuario: int, modo: str, salto_ventana: int, agregacion: str, metadata: dict):
+    limite = asyncio.Semaphore(max(1, 2 * preproceso.trabajadores))
+    tareas = [
+        asyncio.create_task(inferir_archivo_lote(i, nombre, content_type, audio, error, modo, salto_ventana, agregacion, limite))
+        for i, (nombre, content_type, audio, error) in enumerate(archivos)
+    ]
+    completados = []
+    errores = []
+
+    try:
+        # Cada archivo se envía en cuanto termina, en orden de finalización
+        for tarea in asyncio.as_completed(tareas):
+            resultado, X = await tarea
+            if X is not None:
+                completados.append((resultado, X, archivos[resultado["indice"]][1]))
+            else:
+                errores.append(resultado)
+            yield linea_ndjson(resultado)
+    finally:
+        # Cliente desconectado: se cancela lo pendiente y se liberan los temporales
+        # (los que aún lee el pool de preprocesado se borran cuando termina, ver AudioRecibido.usar_en)
+        for tarea in tareas:
+            tarea.cancel()
+        for _, _, audio, _ in archivos:
+            if audio is not None:
+                audio.cerrar()
+
+    # Orden de llegada en el historial
+    completados.sort(key=lambda c: c[0]["indice"])
+    try:
+        log_ids = await bd.ejecutar(guardar_lote, id_usuario, completados, errores, metadata)
+    except Exception as e:
+        yield linea_ndjson({"resumen": True, "estado": "error", "detalle": f"No se pudo registrar el lote: {e}"})
+        return
+
+    yield linea_ndjson({
+        "resumen": True,
+        "estado": "ok",
+        "archivos": len(archivos),
+        "procesados": len(completados),
+        "con_error": len(errores),
+        "log_ids": {str(r["indice"]): log_id for (r, _, _), log_id in zip(completados, log_ids)}
+    })
+
+@router.post("/procesar_lote")
+async def procesar_lote(
+    files: list[UploadFile] = File(...),
+    latitud: float = Form(None),
+    longitud: float = Form(None),
+    localizacion: str = Form(None),
+    modo: str = Form("centro"),
+    salto_ventana: int = Form(SALTO_VENTANA),
+    agregacion: str = Form("media"),
+    db: Session = Depends(get_db),
+    usuario=Depends(get_current_user)
+):
+    # Varios audios (o uno o más .zip) en una sola petición. La respuesta es NDJSON:
+    # una línea por archivo en cuanto termina y una línea final de resumen con los log_id.
+
+    if modo not in MODOS or agregacion not in AGREGACIONES or not 1 <= salto_ventana <= TARGET_FRAMES:
+        await registrar_error(
+            db,
+            mensaje_error=f"Parámetros inválidos: modo={modo}, salto_ventana={salto_ventana}, agregacion={agregacion}",
+            fuente="valida_parametros_inferencia",
+            id_usuario=usuario.id_usuario
+        )
+        raise HTTPException(
+            status_code=400,
+            detail=f"Parámetros no válidos: modo debe ser {MODOS}, agregacion {AGREGACIONES} y salto_ventana entre 1 y {TARGET_FRAMES}."
+        )
+
+    # 1. Recepción por bloques de cada archivo; los errores de un archivo no detienen el lote
+    archivos = []
+    try:
+        for file in files:
+            if es_zip(file.content_type, file.filename):
+                contenedor = await recibir_audio(file, max_bytes=LOTE_MAX_MB * 1024 * 1024, min_duracion=0.0, max_duracion=float("inf"))
+                try:
+                    archivos += await run_in_threadpool(
+                        extraer_zip,
+                        contenedor.fuente,
+                        max_archivos=LOTE_MAX_ARCHIVOS,
+                        max_bytes_archivo=MAX_SIZE_MB * 1024 * 1024
+                    )
+                finally:
+                    contenedor.cerrar()
+            elif file.content_type not in ALLOWED_TYPES:
+                archivos.append((file.filename, None, None, f"Tipo no permitido: {file.content_type}"))
+            else:
+                try:
+                    audio = await recibir_audio(
+                        file,
+                        max_bytes=MAX_SIZE_MB * 1024 * 1024,
+                        min_duracion=MIN_DURACION,
+                        max_duracion=MAX_DURACION
+                    )
+                    archivos.append((file.filename, file.content_type, audio, None))
+                except (ArchivoDemasiadoGrande, DuracionInvalida) as e:
+                    archivos.append((file.filename, file.content_type, None, str(e)))
+
+            if len(archivos) > LOTE_MAX_ARCHIVOS:
+                raise HTTPException(status_code=400, detail=f"El lote supera el máximo de {LOTE_MAX_ARCHIVOS} archivos.")
+    except BaseException as e:
+        for _, _, audio, _ in archivos:
+            if audio is not None:
+                audio.cerrar()
+        if isinstance(e, HTTPException):
+            raise
+        if isinstance(e, ArchivoDemasiadoGrande):
+            raise HTTPException(status_code=413, detail=f"Archivo demasiado grande, el tamaño máximo del lote es {LOTE_MAX_MB} MB.")
+        if isinstance(e, (zipfile.BadZipFile, ValueError)):
+            raise HTTPException(status_code=400, detail=f"Archivo zip no válido: {e}")
+        raise
+
+    if not archivos:
+        raise HTTPException(status_code=400, detail="El lote no contiene archivos de audio.")
+
+    metadata = {
+        "origen": "Carga_lote_desde_API",
+        "latitud": latitud if latitud else 0.0,
+        "longitud": longitud if longitud else 0.0,
+        "localizacion": localizacion if localizacion else 'No especificada'
+    }
+
+    return StreamingResponse(
+        transmitir_lote(archivos, usuario.id_usuario, modo, salto_ventana, agregacion, metadata),
+        media_type="application/x-ndjson"
+    )
+
 #--------------------------------------------------
 # LISTAR HISTORIAL DE INFERENCIAS
 #--------------------------------------------------
 
 @router.get("/historial")
-def listar_inferencias(
-    db: Session = Depends(get_db),
-    usuario = Depends(get_current_user)
+async def listar_inferencias(
+    response: Response,
+    cursor: str | None = None,
+    limite: int = PAGINA_DEFECTO,
+    db: AsyncSession = Depends(get_db_async),
+    usuario = Depends(get_current_user_async)
 ):
-    inferencias = obtener_inferencias(db, usuario)
+    inferencias, siguiente = await obtener_inferencias_async(db, usuario, cursor, tamano_pagina(limite))
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
 
     return [
         {
@@ -175,49 +614,16 @@ def listar_inferencias(
             "confianza": i.confianza,
             "tiempo_ejecucion": i.tiempo_ejecucion,
             "fecha": i.fecha_ejecuta,
-            "usuario": db.query(modelos.Usuario).filter(modelos.Usuario.id_usuario == i.id_usuario).first().nombre_completo if i.id_usuario else "Anónimo",
-            "ubicacion": i.meta_audio.localizacion if i.meta_audio else "No disponible",
-            "url_imagen": obtener_imagen_ave(db, i.prediccion_especie),
-            "latitud": i.meta_audio.latitud if i.meta_audio else None,
-            "longitud": i.meta_audio.longitud if i.meta_audio else None,
+            # Todas las inferencias son del propio usuario (obtener_inferencias_async filtra por id_usuario)
+            "usuario": usuario.nombre_completo,
+            "ubicacion": i.localizacion or "No disponible",
+            "url_imagen": obtener_imagen_ave(i.prediccion_especie),
+            "latitud": i.latitud,
+            "longitud": i.longitud,
             "top_5": i.top_5
         }
         for i in inferencias
     ]
-#--------------------------------------------------
-# FUNCION CONVERSION WEBM A WAV (FFMPEG IN-MEMORY)
-#--------------------------------------------------
-def convertir_webm_a_wav(audio_bytes: bytes) -> bytes:
-
-#Convierte audio WEBM (Opus) a WAV PCM 16kHz mono usando FFmpeg (in-memory)
-
-    try:
-        proceso = subprocess.Popen(
-            [
-                FFMPEG_PATH,
-                "-loglevel", "error",
-                "-i", "pipe:0",
-                "-ar", "16000",
-                "-ac", "1",
-                "-f", "wav",
-                "pipe:1"
-            ],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE
-        )
-
-        wav_bytes, stderr = proceso.communicate(audio_bytes)
-
-        if proceso.returncode != 0:
-            raise RuntimeError(stderr.decode())
-
-        return wav_bytes
-
-    except Exception as e:
-        raise RuntimeError(f"Error convirtiendo WEBM a WAV: {str(e)}")
-
-
 #--------------------------------------------------
 # LISTAR AVES REGISTRADAS EN SISTEMA
 #--------------------------------------------------
@@ -227,7 +633,7 @@ def listar_aves(
     usuario = Depends(get_current_user)
 ):
 
-    aves = obtener_aves(db)
+    aves = catalogo.especies()
 
     return [
         {
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+from time import monotonic
+from fastapi import APIRouter, Form, UploadFile, File, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+from app.routers.inferencias import ALLOWED_TYPES, MAX_DURACION, MAX_SIZE_MB, MIN_DURACION, registrar_error
+from db.database import SessionLocal, get_db
+from servicios.ejecucion import ServidorSaturado, bd
+from servicios.grabaciones_largas import LARGAS_SALTO, LARGAS_UMBRAL
+from servicios.preprocesado import AGREGACIONES, MODOS, SALTO_VENTANA, TARGET_FRAMES
+from servicios.recepcion import ArchivoDemasiadoGrande, DuracionInvalida, recibir_audio
+from servicios.seguridad import ADMIN_ROLE_ID, get_current_user
+from servicios.trabajos import (
+    ESTADOS_FINALES, TIPO_GRABACION_LARGA, crear_trabajo, estado_trabajo, guardar_audio_trabajo, obtener_trabajo
+)
+
+#--------------------------------------------------
+# INFERENCIA ASÍNCRONA: ENVIAR Y CONSULTAR TRABAJOS
+#--------------------------------------------------
+
+router = APIRouter(prefix="/v1/trabajos", tags=["Trabajos_Inferencia"])
+
+TRABAJOS_SONDEO_S = float(os.getenv("TRABAJOS_SONDEO_S", "1"))
+TRABAJOS_SSE_MAX_S = float(os.getenv("TRABAJOS_SSE_MAX_S", "600"))
+LATIDO_SSE_S = 15
+
+# Grabaciones largas: solo por la cola de trabajos (minutos u horas de audio)
+LARGAS_MAX_MB = int(os.getenv("LARGAS_MAX_MB", "1024"))
+LARGAS_MAX_DURACION_S = float(os.getenv("LARGAS_MAX_DURACION_S", str(6 * 3600)))
+
+# Trabajo del usuario (o cualquiera para admin); 404 si no existe o es ajeno
+def trabajo_del_usuario(db: Session, id_trabajo: int, usuario):
+    trabajo = obtener_trabajo(db, id_trabajo)
+    if trabajo is None or (trabajo.id_usuario != usuario.id_usuario and usuario.role_id != ADMIN_ROLE_ID):
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return trabajo
+
+@router.post("/inferencia", status_code=202)
+async def enviar_trabajo(
+    file: UploadFile = File(...),
+    latitud: float = Form(None),
+    longitud: float = Form(None),
+    localizacion: str = Form(None),
+    modo: str = Form("centro"),
+    salto_ventana: int = Form(SALTO_VENTANA),
+    agregacion: str = Form("media"),
+    db: Session = Depends(get_db),
+    usuario=Depends(get_current_user)
+):
+    # Misma validación que /v1/inferencia/procesar_inferencia; la respuesta no espera a la inferencia
+
+    if modo not in MODOS or agregacion not in AGREGACIONES or not 1 <= salto_ventana <= TARGET_FRAMES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Parámetros no válidos: modo debe ser {MODOS}, agregacion {AGREGACIONES} y salto_ventana entre 1 y {TARGET_FRAMES}."
+        )
+
+    if file.content_type not in ALLOWED_TYPES:
+        await registrar_error(
+            db,
+            mensaje_error=f"Tipo no permitido: {file.content_type}",
+            fuente="valida_tipo_archivo",
+            id_usuario=usuario.id_usuario
+        )
+        raise HTTPException(status_code=400, detail="Formato de archivo no soportado, asegurse de subir un archivo de audio válido.")
+
+    try:
+        audio = await recibir_audio(
+            file,
+            max_bytes=MAX_SIZE_MB * 1024 * 1024,
+            min_duracion=MIN_DURACION,
+            max_duracion=MAX_DURACION
+        )
+    except ArchivoDemasiadoGrande:
+        raise HTTPException(status_code=413, detail="Archivo demasiado grande, el tamaño máximo es 100 MB.")
+    except DuracionInvalida:
+        raise HTTPException(status_code=400, detail="Duración de audio no válida, debe ser entre 1 y 60 segundos.")
+
+    parametros = {
+        "archivo": file.filename,
+        "content_type": file.content_type,
+        "modo": modo,
+        "salto_ventana": salto_ventana,
+        "agregacion": agregacion,
+        "min_duracion": MIN_DURACION,
+        "max_duracion": MAX_DURACION,
+        "latitud": latitud,
+        "longitud": longitud,
+        "localizacion": localizacion
+    }
+
+    try:
+        ruta = await run_in_threadpool(guardar_audio_trabajo, audio)
+        trabajo = await bd.ejecutar(crear_trabajo, db, usuario.id_usuario, ruta, parametros)
+    except ServidorSaturado:
+        raise HTTPException(
+            status_code=503,
+            detail="El servidor está procesando demasiadas solicitudes, intente de nuevo en unos segundos.",
+            headers={"Retry-After": "1"}
+        )
+    finally:
+        audio.cerrar()
+
+    return {
+        "id_trabajo": trabajo.id_trabajo,
+        "estado": trabajo.estado,
+        "url_estado": f"{router.prefix}/{trabajo.id_trabajo}",
+        "url_eventos": f"{router.prefix}/{trabajo.id_trabajo}/eventos"
+    }
+
+@router.post("/grabacion_larga", status_code=202)
+async def enviar_grabacion_larga(
+    file: UploadFile = File(...),
+    latitud: float = Form(None),
+    longitud: float = Form(None),
+    localizacion: str = Form(None),
+    salto_ventana: int = Form(LARGAS_SALTO),
+    umbral: float = Form(LARGAS_UMBRAL),
+    db: Session = Depends(get_db),
+    usuario=Depends(get_current_user)
+):
+    # El resultado es una línea de tiempo (inicio, fin, especie, probabilidad) y el factor de tiempo real.
+    # Lo procesan los procesos de herramientas.trabajador_inferencia, no los hilos de la API.
+
+    if not 1 <= salto_ventana <= TARGET_FRAMES or not 0.0 <= umbral <= 1.0:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Parámetros no válidos: salto_ventana debe estar entre 1 y {TARGET_FRAMES} y umbral entre 0 y 1."
+        )
+
+    if file.content_type not in ALLOWED_TYPES:
+        await registrar_error(
+            db,
+            mensaje_error=f"Tipo no permitido: {file.content_type}",
+            fuente="valida_tipo_archivo",
+            id_usuario=usuario.id_usuario
+        )
+        raise HTTPException(status_code=400, detail="Formato de archivo no soportado, asegurse de subir un archivo de audio válido.")
+
+    try:
+        audio = await recibir_audio(
+            file,
+            max_bytes=LARGAS_MAX_MB * 1024 * 1024,
+            min_duracion=MIN_DURACION,
+            max_duracion=LARGAS_MAX_DURACION_S
+        )
+    except ArchivoDemasiadoGrande:
+        raise HTTPException(status_code=413, detail=f"Archivo demasiado grande, el tamaño máximo es {LARGAS_MAX_MB} MB.")
+    except DuracionInvalida:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Duración de audio no válida, debe ser entre {MIN_DURACION:.0f} y {LARGAS_MAX_DURACION_S:.0f} segundos."
+        )
+
+    parametros = {
+        "tipo": TIPO_GRABACION_LARGA,
+        "archivo": file.filename,
+        "content_type": file.content_type,
+        "salto_ventana": salto_ventana,
+        "umbral": umbral,
+        "min_duracion": MIN_DURACION,
+        "max_duracion": LARGAS_MAX_DURACION_S,
+        "latitud": latitud,
+        "longitud": longitud,
+        "localizacion": localizacion
+    }
+
+    try:
+        ruta = await run_in_threadpool(guardar_audio_trabajo, audio)
+        trabajo = await bd.ejecutar(crear_trabajo, db, usuario.id_usuario, ruta, parametros)
+    except ServidorSaturado:
+        raise HTTPException(
+            status_code=503,
+            detail="El servidor está procesando demasiadas solicitudes, intente de nuevo en unos segundos.",
+            headers={"Retry-After": "1"}
+        )
+    finally:
+        audio.cerrar()
+
+    return {
+        "id_trabajo": trabajo.id_trabajo,
+        "estado": trabajo.estado,
+        "url_estado": f"{router.prefix}/{trabajo.id_trabajo}",
+        "url_eventos": f"{router.prefix}/{trabajo.id_trabajo}/eventos"
+    }
+
+@router.get("/{id_trabajo}")
+def consultar_trabajo(
+    id_trabajo: int,
+    db: Session = Depends(get_db),
+    usuario=Depends(get_current_user)
+):
+    return estado_trabajo(trabajo_del_usuario(db, id_trabajo, usuario))
+
+# Lectura con sesión propia: la de la dependencia se cierra antes de transmitir la respuesta
+def leer_estado_trabajo(id_trabajo: int) -> dict:
+    db = SessionLocal()
+    try:
+        return estado_trabajo(obtener_trabajo(db, id_trabajo))
+    finally:
+        db.close()
+
+@router.get("/{id_trabajo}/eventos")
+def eventos_trabajo(
+    id_trabajo: int,
+    db: Session = Depends(get_db),
+    usuario=Depends(get_current_user)
+):
+    # Server-Sent Events: un evento "estado" por cada cambio, hasta completado/error
+    trabajo_del_usuario(db, id_trabajo, usuario)
+
+    async def eventos():
+        ultimo = None
+        ultimo_envio = monotonic()
+        fin = monotonic() + TRABAJOS_SSE_MAX_S
+
+        while monotonic() < fin:
+            try:
+                estado = await bd.ejecutar(leer_estado_trabajo, id_trabajo)
+            except ServidorSaturado:
+                estado = ultimo
+
+            if estado is not None and estado != ultimo:
+                ultimo = estado
+                ultimo_envio = monotonic()
+                yield f"event: estado\ndata: {json.dumps(estado, ensure_ascii=False)}\n\n"
+                if estado["estado"] in ESTADOS_FINALES:
+                    return
+            elif monotonic() - ultimo_envio >= LATIDO_SSE_S:
+                # Comentario SSE para que el proxy no cierre la conexión
+                ultimo_envio = monotonic()
+                yield ": latido\n\n"
+
+            await asyncio.sleep(TRABAJOS_SONDEO_S)
+
+        yield "event: tiempo_agotado\ndata: {}\n\n"
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from servicios.sesiones import actualizar_usuario, obtener_aves, obtener_predicciones_mas_frecuentes, obtener_predicciones_mas_frecuentes_usuario, obtener_sesiones, obtener_usuario_nombre, obtener_usuarios, registrar_sesion_usuario_exito, registrar_sesion_usuario_fallido
-from db.database import get_db
+from servicios.sesiones import actualizar_usuario, obtener_aves, obtener_predicciones_mas_frecuentes, obtener_predicciones_mas_frecuentes_usuario, obtener_sesiones, obtener_usuario_nombre, obtener_usuarios
+from db.database import get_db, get_db_async
 from servicios import esquema
+from servicios.auditoria_sesiones import auditoria
+from servicios.paginacion import CABECERA_CURSOR, PAGINA_DEFECTO, tamano_pagina
 from db import modelos
 from servicios.seguridad import get_current_user, hash_password
 from servicios.seguridad import verify_password, create_access_token
@@ -38,14 +43,14 @@ def register(user: esquema.UserCreate, db: Session = Depends(get_db)):
 # LOGIN DEL SISTEMA.
 #--------------------------------------------------
 @router.post("/login")
-def login(
+async def login(
     request: Request,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db_async)
 ):
-    usuario = db.query(modelos.Usuario).filter(
+    usuario = await db.scalar(select(modelos.Usuario).filter(
         modelos.Usuario.email == form_data.username
-    ).first()
+    ))
 
     if not usuario:
         raise HTTPException(
@@ -53,8 +58,7 @@ def login(
             detail="Credenciales inválidas, intente de nuevo."
         )
     if not usuario.usuario_activo:
-        registrar_sesion_usuario_fallido(
-            db=db,
+        auditoria.registrar(
             id_usuario=usuario.id_usuario,
             estado="FALLIDO",
             ip=request.client.host,
@@ -66,21 +70,23 @@ def login(
             detail="Usuario inactivo. Contacte al administrador."
         )
 
-    if not verify_password(form_data.password, usuario.contraseña_hash):
+    # bcrypt es CPU puro (~250 ms): fuera del event loop
+    if not await run_in_threadpool(verify_password, form_data.password, usuario.contraseña_hash):
         #registrar intento fallido
-        registrar_sesion_usuario_fallido(
-            db=db,
+        auditoria.registrar(
             id_usuario=usuario.id_usuario,
             estado="FALLIDO",
             ip=request.client.host,
             agente=request.headers.get("user-agent"),
             observacion="Contraseña incorrecta"
         )
-
+        raise HTTPException(
+            status_code=401,
+            detail="Credenciales inválidas, intente de nuevo."
+        )
 
     # SOLO SI TODO FUE CORRECTO
-    registrar_sesion_usuario_exito(
-        db=db,
+    auditoria.registrar(
         id_usuario=usuario.id_usuario,
         estado="EXITOSO",
         ip=request.client.host,
@@ -107,17 +113,22 @@ def login(
 #--------------------------------------------------
 @router.get("/Listar_sesiones")
 def listar_sesiones(
+    response: Response,
+    cursor: str | None = None,
+    limite: int = PAGINA_DEFECTO,
     db: Session = Depends(get_db),
     usuario = Depends(get_current_user)
 ):
-    sesiones = obtener_sesiones(db, usuario)
+    sesiones, siguiente = obtener_sesiones(db, usuario, cursor, tamano_pagina(limite))
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
 
     return [
         {
             "usuario": {
-                "id": s.usuario.id_usuario,
-                "email": s.usuario.email,
-                "rol": "admin" if s.usuario.role_id == 0 else "usuario",
+                "id": s.id_usuario,
+                "email": s.email,
+                "rol": "admin" if s.role_id == 0 else "usuario",
             },
             "fecha_ingreso": s.fecha_ingreso,
             "ip_origen": s.ip_origen,
@@ -135,10 +146,15 @@ def listar_sesiones(
 @router.get("/buscar_usuarios")
 def buscar_usuarios(
     nombre: str,
+    response: Response,
+    cursor: str | None = None,
+    limite: int = PAGINA_DEFECTO,
     db: Session = Depends(get_db),
     usuario = Depends(get_current_user)
 ):
-    usuarios = obtener_usuario_nombre(db, nombre)
+    usuarios, siguiente = obtener_usuario_nombre(db, nombre, cursor, tamano_pagina(limite))
+    if siguiente:
+        response.headers[CABECERA_CURSOR] = siguiente
 
     return [
         {
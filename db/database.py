@@ -1,5 +1,7 @@
 import os
+import threading
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, declarative_base
 from dotenv import load_dotenv
 
@@ -16,8 +18,35 @@ if not DATABASE_URL:
 if DATABASE_URL.startswith("postgres://"):
     DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
 
+# ---------------- POOLS DE CONEXIONES ----------------
+# BD_CONEXIONES_MAX es el presupuesto de toda la aplicación, repartido entre los
+# WEB_CONCURRENCY procesos de uvicorn. En cada proceso el pool síncrono cubre los hilos
+# del ejecutor de BD y los trabajadores de la cola (una conexión por hilo) y el resto
+# va al pool asíncrono. Sin desborde: al agotarse se espera BD_POOL_ESPERA_S y se falla.
+WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+BD_CONEXIONES_MAX = int(os.getenv("BD_CONEXIONES_MAX", "40"))
+CONEXIONES_POR_PROCESO = max(4, BD_CONEXIONES_MAX // WORKERS)
+
+_HILOS_SINCRONOS = int(os.getenv("POOL_BD_HILOS", "8")) + int(os.getenv("TRABAJOS_TRABAJADORES", "1")) + 1
+BD_POOL_SYNC = int(os.getenv("BD_POOL_SYNC", str(min(_HILOS_SINCRONOS, CONEXIONES_POR_PROCESO - 2))))
+BD_POOL_ASYNC = int(os.getenv("BD_POOL_ASYNC", str(max(2, CONEXIONES_POR_PROCESO - BD_POOL_SYNC))))
+BD_POOL_ESPERA_S = float(os.getenv("BD_POOL_ESPERA_S", "10"))
+# Conexiones inactivas que el servidor o un proxy podrían haber cerrado
+BD_POOL_RECICLAR_S = int(os.getenv("BD_POOL_RECICLAR_S", "1800"))
+
+def _opciones_pool(tamano: int) -> dict:
+    if DATABASE_URL.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": tamano,
+        "max_overflow": 0,
+        "pool_timeout": BD_POOL_ESPERA_S,
+        "pool_recycle": BD_POOL_RECICLAR_S,
+        "pool_pre_ping": True,
+    }
+
 # Configuración de SQLAlchemy
-engine = create_engine(DATABASE_URL)
+engine = create_engine(DATABASE_URL, **_opciones_pool(BD_POOL_SYNC))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
@@ -27,4 +56,50 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# ------------------------------------------------------------------
+# MOTOR ASÍNCRONO (asyncpg)
+# ------------------------------------------------------------------
+# Para las rutas async: las consultas no bloquean el event loop ni pasan por el
+# ejecutor de BD. Se crea en el primer uso, así las herramientas que solo usan el
+# motor síncrono no necesitan asyncpg.
+
+def url_asincrona(url: str):
+    """URL equivalente con driver async; sslmode pasa a connect_args (asyncpg no lo acepta en la URL)."""
+    url = make_url(url)
+    connect_args = {}
+
+    if url.drivername.startswith("sqlite"):
+        return url.set(drivername="sqlite+aiosqlite"), connect_args
+
+    consulta = dict(url.query)
+    sslmode = consulta.pop("sslmode", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = sslmode
+    return url.set(drivername="postgresql+asyncpg", query=consulta), connect_args
+
+_engine_async = None
+_SessionAsync = None
+_lock_async = threading.Lock()
+
+def obtener_sesion_async():
+    global _engine_async, _SessionAsync
+    if _SessionAsync is None:
+        with _lock_async:
+            if _SessionAsync is None:
+                from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+                url, connect_args = url_asincrona(DATABASE_URL)
+                _engine_async = create_async_engine(url, connect_args=connect_args, **_opciones_pool(BD_POOL_ASYNC))
+                # expire_on_commit=False: los objetos siguen legibles tras el commit sin otra consulta
+                _SessionAsync = async_sessionmaker(_engine_async, autoflush=False, expire_on_commit=False)
+    return _SessionAsync()
+
+async def get_db_async():
+    async with obtener_sesion_async() as db:
+        yield db
+
+async def cerrar_engine_async():
+    if _engine_async is not None:
+        await _engine_async.dispose()
\ No newline at end of file
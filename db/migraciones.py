@@ -0,0 +1,40 @@
+# db/migraciones.py
+# Cambios de esquema idempotentes que se aplican al arrancar la aplicación.
+# Las tablas originales se crearon a mano en la BD; aquí solo entran las nuevas.
+from sqlalchemy import text
+
+from db.database import Base, engine
+from db import modelos
+
+TABLAS_NUEVAS = [
+    modelos.CachePrediccion.__table__,
+    modelos.TrabajoInferencia.__table__,
+]
+
+
+# Columnas nuevas en tablas existentes (PostgreSQL: ADD COLUMN IF NOT EXISTS es idempotente)
+COLUMNAS_NUEVAS = [
+    "ALTER TABLE ejecuciones_inferencias ADD COLUMN IF NOT EXISTS version_modelo VARCHAR",
+    "ALTER TABLE ejecuciones_inferencias ADD COLUMN IF NOT EXISTS tiempos_etapas JSONB",
+]
+
+
+# Los índices de la paginación de los listados no se crean aquí: en las tablas grandes
+# bloquearían las escrituras mientras se construyen. Se crean una vez al desplegar con
+# CREATE INDEX CONCURRENTLY (python -m herramientas.crear_indices).
+
+# Clave del cerrojo que pone en fila a los workers que arrancan a la vez
+CERROJO_MIGRACIONES = 4_611_317
+
+
+def aplicar_migraciones():
+    with engine.begin() as conexion:
+        if conexion.dialect.name == "postgresql":
+            # Se libera con la transacción: el primer worker aplica los cambios y los
+            # demás, al entrar, ya no encuentran nada que hacer
+            conexion.execute(text("SELECT pg_advisory_xact_lock(:clave)"), {"clave": CERROJO_MIGRACIONES})
+
+        # checkfirst: no toca las tablas que ya existen
+        Base.metadata.create_all(conexion, tables=TABLAS_NUEVAS, checkfirst=True)
+        for sentencia in COLUMNAS_NUEVAS:
+            conexion.execute(text(sentencia))
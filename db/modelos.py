@@ -50,6 +50,10 @@ class EjecucionInferencia(Base):
     confianza = Column(Float)
     top_5 = Column(JSONB)
     tiempo_ejecucion = Column(Float)
+    # Huella del modelo que produjo la predicción (servicios/registro_modelos.py)
+    version_modelo = Column(String, nullable=True)
+    # Milisegundos por etapa (recepción, decodificación, log-mel, modelo...; servicios/metricas.py)
+    tiempos_etapas = Column(JSONB, nullable=True)
     fecha_ejecuta = Column(DateTime(timezone=True), server_default=func.now())
     meta_audio = relationship("MetadatoAudio", back_populates="id_inferencia_rel", uselist=False)
 
@@ -76,3 +80,27 @@ class MetadatoAudio(Base):
     id_inferencia = Column(Integer, ForeignKey("ejecuciones_inferencias.log_id"), nullable=True)
 
     id_inferencia_rel = relationship("EjecucionInferencia", back_populates="meta_audio")
+
+class CachePrediccion(Base):
+    __tablename__ = "cache_predicciones"
+    clave = Column(String(64), primary_key=True)
+    version_modelo = Column(String, nullable=False)
+    resultados = Column(JSONB, nullable=False)
+    duracion = Column(Float, nullable=False)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
+class TrabajoInferencia(Base):
+    __tablename__ = "trabajos_inferencia"
+    id_trabajo = Column(Integer, primary_key=True, index=True)
+    id_usuario = Column(Integer, ForeignKey("usuarios.id_usuario"), nullable=False)
+    estado = Column(String, nullable=False, default="pendiente", index=True)
+    intentos = Column(Integer, nullable=False, default=0)
+    ruta_audio = Column(String, nullable=True)
+    parametros = Column(JSONB, nullable=False)
+    resultado = Column(JSONB, nullable=True)
+    error = Column(String, nullable=True)
+    trabajador = Column(String, nullable=True)
+    bloqueado_hasta = Column(DateTime(timezone=True), nullable=True)
+    log_id = Column(Integer, ForeignKey("ejecuciones_inferencias.log_id"), nullable=True)
+    fecha_creacion = Column(DateTime(timezone=True), server_default=func.now())
+    fecha_actualizacion = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,59 @@
+# herramientas/analizar_grabacion.py
+# Uso: python -m herramientas.analizar_grabacion grabacion.flac [--backend keras] [--salto 108]
+#                                                [--umbral 0.5] [--lote 32] [--sin-compuerta] [--csv linea.csv]
+#
+# Línea de tiempo de detecciones de una grabación larga sin pasar por la API (los
+# nombres de especie salen del catálogo, que lee la tabla `aves`). Informa el factor
+# de tiempo real: tiempo de proceso / duración del audio.
+import argparse
+import csv
+import os
+
+from servicios.backends import BACKENDS, cargar_backend
+from servicios.compuerta_actividad import CompuertaActividad, compuerta
+from servicios.grabaciones_largas import LARGAS_LOTE, LARGAS_SALTO, LARGAS_UMBRAL, analizar_grabacion
+from servicios.recepcion import EXTENSIONES_AUDIO
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Detecciones a lo largo de una grabación larga.")
+    parser.add_argument("archivo")
+    parser.add_argument("--backend", default="keras", choices=list(BACKENDS))
+    parser.add_argument("--salto", type=int, default=LARGAS_SALTO, help="Salto entre ventanas en tramas")
+    parser.add_argument("--umbral", type=float, default=LARGAS_UMBRAL)
+    parser.add_argument("--lote", type=int, default=LARGAS_LOTE)
+    parser.add_argument("--sin-compuerta", action="store_true", help="Pasar todas las ventanas por el modelo")
+    parser.add_argument("--csv", help="Guardar la línea de tiempo en este archivo")
+    args = parser.parse_args()
+
+    content_type = EXTENSIONES_AUDIO.get(os.path.splitext(args.archivo)[1].lower(), "application/octet-stream")
+    backend = cargar_backend(args.backend)
+
+    analisis = analizar_grabacion(
+        args.archivo,
+        content_type,
+        backend.predecir,
+        salto=args.salto,
+        umbral=args.umbral,
+        lote=args.lote,
+        compuerta=CompuertaActividad(activa=False) if args.sin_compuerta else compuerta
+    )
+
+    for d in analisis["linea_tiempo"]:
+        print(f"{d['inicio']:9.2f}s - {d['fin']:9.2f}s  {d['nombre_cientifico']:<35} {d['probabilidad']:.3f}")
+
+    print(f"duración: {analisis['duracion_audio']:.1f}s  ventanas: {analisis['ventanas']} "
+          f"(omitidas {analisis['ventanas_omitidas']})  "
+          f"tiempo: {analisis['tiempo_ejecucion']:.1f}s (modelo {analisis['tiempo_modelo']:.1f}s)  "
+          f"RTF: {analisis['factor_tiempo_real']:.4f}")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["inicio", "fin", "id_ave", "nombre_cientifico", "probabilidad", "ventanas"])
+            for d in analisis["linea_tiempo"]:
+                escritor.writerow([d["inicio"], d["fin"], d["id_ave"], d["nombre_cientifico"], d["probabilidad"], d["ventanas"]])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+# herramientas/benchmark_etapas.py
+# Uso: python -m herramientas.benchmark_etapas [--repeticiones 30] [--duracion 10] [--fixtures clips/]
+#                                              [--backend tflite | --sin-modelo] [--bd sqlite:///bench.db]
+#                                              [--json resultados.json] [--base base.json] [--tolerancia 0.25]
+#
+# Microbenchmarks por etapa de la inferencia, sin servidor: recepción (tipo MIME,
+# tamaño, sondeo de cabecera y huella), decodificación por formato (incluido el
+# remuestreo 48 kHz -> 44.1 kHz), limpieza, log-mel, modelo con lotes de 1/8/32,
+# top-N y escrituras en la BD (SQLite temporal por defecto o un Postgres local).
+# Por etapa: percentiles de latencia y pico de memoria (tracemalloc, en una pasada aparte).
+# Con --base compara la mediana con un resultado guardado y sale con código 1 si
+# alguna etapa empeora más que --tolerancia.
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from time import perf_counter
+
+import numpy as np
+
+LOTES_MODELO = (1, 8, 32)
+
+# ------------------------------------------------------------------
+# MEDICIÓN
+# ------------------------------------------------------------------
+
+def medir(funcion, repeticiones: int, calentamiento: int = 2) -> dict:
+    for _ in range(calentamiento):
+        funcion()
+
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = perf_counter()
+        funcion()
+        tiempos.append(perf_counter() - inicio)
+
+    # Memoria en una pasada aparte: tracemalloc distorsiona los tiempos
+    tracemalloc.start()
+    funcion()
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    t = np.array(tiempos) * 1000
+    return {
+        "repeticiones": repeticiones,
+        "media_ms": float(t.mean()),
+        "p50_ms": float(np.percentile(t, 50)),
+        "p95_ms": float(np.percentile(t, 95)),
+        "p99_ms": float(np.percentile(t, 99)),
+        "pico_memoria_kb": pico / 1024,
+    }
+
+# ------------------------------------------------------------------
+# AUDIO SINTÉTICO
+# ------------------------------------------------------------------
+
+def audio_sintetico(duracion: float, sr: int, semilla: int = 0) -> np.ndarray:
+    """Canto modulado en frecuencia a tramos sobre ruido de fondo, reproducible."""
+    rng = np.random.default_rng(semilla)
+    t = np.arange(int(duracion * sr)) / sr
+    frecuencia = 3000 + 1000 * np.sin(2 * np.pi * 8 * t)
+    canto = np.sin(2 * np.pi * np.cumsum(frecuencia) / sr) * (np.sin(2 * np.pi * 0.5 * t) > 0.3)
+    return (0.5 * canto + 0.02 * rng.standard_normal(len(t))).astype(np.float32)
+
+
+def codificar(y: np.ndarray, sr: int, formato: str) -> bytes:
+    import soundfile as sf
+
+    buffer = io.BytesIO()
+    sf.write(buffer, y, sr, format=formato)
+    return buffer.getvalue()
+
+
+def codificar_ffmpeg(datos_wav: bytes, formato: str) -> bytes | None:
+    import subprocess
+    from servicios.decodificacion import FFMPEG_PATH
+
+    if shutil.which(FFMPEG_PATH) is None:
+        return None
+    proceso = subprocess.run(
+        [FFMPEG_PATH, "-loglevel", "error", "-i", "pipe:0", "-f", formato, "pipe:1"],
+        input=datos_wav, capture_output=True
+    )
+    return proceso.stdout if proceso.returncode == 0 else None
+
+# ------------------------------------------------------------------
+# BASE DE DATOS
+# ------------------------------------------------------------------
+
+def preparar_sqlite():
+    """Esquema en SQLite: JSONB se guarda como JSON y las fechas por defecto se adaptan."""
+    from sqlalchemy import DefaultClause, text
+    from sqlalchemy.dialects.postgresql import JSONB
+    from sqlalchemy.ext.compiler import compiles
+
+    @compiles(JSONB, "sqlite")
+    def _jsonb_sqlite(tipo, compilador, **kw):
+        return "JSON"
+
+    from db.database import Base, SessionLocal, engine
+    from db import modelos
+
+    modelos.MetadatoAudio.__table__.c.fecha_registro.server_default = DefaultClause(text("CURRENT_DATE"))
+    Base.metadata.create_all(engine)
+
+    with open(os.path.join("modelo_cnn", "idx2label.json"), encoding="utf-8") as f:
+        etiquetas = json.load(f)
+
+    db = SessionLocal()
+    try:
+        if db.query(modelos.Ave).count() == 0:
+            db.add_all([modelos.Ave(id_ave=int(i), nombre_cientifico=n) for i, n in etiquetas.items()])
+            db.commit()
+    finally:
+        db.close()
+
+
+def medir_escrituras(repeticiones: int, id_usuario: int) -> dict:
+    from db.database import SessionLocal
+    from db.modelos import EjecucionInferencia, MetadatoAudio
+    from servicios.hist_inferencias import registrar_inferencia, registrar_metadata_audio
+
+    top_5 = [{"id_ave": i, "nombre_cientifico": f"bench_{i}", "nombre": "bench", "probabilidad": 0.1} for i in range(5)]
+    creados = []
+    db = SessionLocal()
+
+    def inferencia():
+        log = registrar_inferencia(db, id_usuario, "bench_0", 0.1, top_5, 0.01, version_modelo="benchmark")
+        creados.append(log.log_id)
+        return log
+
+    def metadata():
+        registrar_metadata_audio(
+            db, origen="Benchmark", formato="audio/wav", id_usuario=id_usuario,
+            id_inferencia=creados[-1], localizacion="benchmark", latitud=0.0, longitud=0.0
+        )
+
+    try:
+        resultados = {
+            "bd_registrar_inferencia": medir(inferencia, repeticiones),
+            "bd_registrar_metadata_audio": medir(metadata, repeticiones),
+        }
+    finally:
+        # Las filas del benchmark no se quedan en la BD
+        db.rollback()
+        db.query(MetadatoAudio).filter(MetadatoAudio.id_inferencia.in_(creados)).delete(synchronize_session=False)
+        db.query(EjecucionInferencia).filter(EjecucionInferencia.log_id.in_(creados)).delete(synchronize_session=False)
+        db.commit()
+        db.close()
+
+    return resultados
+
+# ------------------------------------------------------------------
+# ETAPAS
+# ------------------------------------------------------------------
+
+def medir_recepcion(datos: bytes, content_type: str, repeticiones: int) -> dict:
+    from fastapi import UploadFile
+    from servicios.recepcion import recibir_audio
+
+    bucle = asyncio.new_event_loop()
+
+    def recibir():
+        subida = UploadFile(io.BytesIO(datos), size=len(datos), filename="bench", headers={"content-type": content_type})
+        audio = bucle.run_until_complete(recibir_audio(subida, max_bytes=100 * 1024 * 1024, min_duracion=1, max_duracion=3600))
+        audio.cerrar()
+
+    try:
+        return medir(recibir, repeticiones)
+    finally:
+        bucle.close()
+
+
+def etapas_audio(args) -> dict:
+    from servicios.decodificacion import TARGET_SR, decodificar_audio
+    from servicios.preprocesado import audio_a_logmel, decodificar_y_preprocesar, limpiar_audio, preprocesar_audio
+
+    r = args.repeticiones
+    resultados = {}
+
+    y_44 = audio_sintetico(args.duracion, TARGET_SR)
+    wav_44 = codificar(y_44, TARGET_SR, "WAV")
+    wav_48 = codificar(audio_sintetico(args.duracion, 48000), 48000, "WAV")
+
+    entradas = {
+        "wav_44k": ("audio/wav", wav_44),
+        "wav_48k_remuestreo": ("audio/wav", wav_48),
+        "flac_44k": ("audio/flac", codificar(y_44, TARGET_SR, "FLAC")),
+    }
+    for formato, content_type in (("mp3", "audio/mpeg"), ("webm", "audio/webm")):
+        datos = codificar_ffmpeg(wav_48, formato)
+        if datos is None:
+            print(f"aviso: sin ffmpeg, se omite la decodificación {formato}")
+        else:
+            entradas[f"{formato}_48k"] = (content_type, datos)
+
+    for ruta in sorted(os.listdir(args.fixtures)) if args.fixtures else []:
+        from servicios.recepcion import EXTENSIONES_AUDIO
+        content_type = EXTENSIONES_AUDIO.get(os.path.splitext(ruta)[1].lower())
+        if content_type:
+            with open(os.path.join(args.fixtures, ruta), "rb") as f:
+                entradas[f"fixture_{ruta}"] = (content_type, f.read())
+
+    resultados["recepcion_wav_44k"] = medir_recepcion(wav_44, "audio/wav", r)
+
+    for nombre, (content_type, datos) in entradas.items():
+        resultados[f"decodificacion_{nombre}"] = medir(lambda: decodificar_audio(datos, content_type), r)
+
+    resultados["limpiar_audio"] = medir(lambda: limpiar_audio(y_44), r)
+    y_limpio = limpiar_audio(y_44)
+    resultados["audio_a_logmel"] = medir(lambda: audio_a_logmel(y_limpio, TARGET_SR), r)
+    resultados["preprocesado_ventanas"] = medir(lambda: preprocesar_audio(y_44, TARGET_SR, modo="ventanas"), r)
+    resultados["preprocesado_centro"] = medir(lambda: decodificar_y_preprocesar(wav_44, "audio/wav"), r)
+
+    return resultados
+
+
+def etapas_modelo(args) -> dict:
+    # Importar servicios.prediccion carga el modelo activo del registro (con cascada si está configurada)
+    os.environ["INFERENCIA_BACKEND"] = args.backend
+    from servicios.prediccion import registro, resultados_top_n
+    from servicios.preprocesado import N_MELS, TARGET_FRAMES
+
+    rng = np.random.default_rng(0)
+    resultados = {}
+    for n in LOTES_MODELO:
+        X = rng.random((n, N_MELS, TARGET_FRAMES, 1), dtype=np.float32)
+        resultados[f"modelo_lote_{n}"] = medir(lambda: registro.activo.predecir(X), args.repeticiones)
+
+    probs = registro.activo.predecir(rng.random((1, N_MELS, TARGET_FRAMES, 1), dtype=np.float32))[0]
+    resultados["top_n"] = medir(lambda: resultados_top_n(probs, top_n=5), args.repeticiones)
+    return resultados
+
+# ------------------------------------------------------------------
+# COMPARACIÓN CON LA BASE
+# ------------------------------------------------------------------
+
+def comparar(actual: dict, base: dict, tolerancia: float) -> list:
+    regresiones = []
+    print(f"\n{'etapa':40s} {'base p50':>10s} {'actual p50':>11s} {'cambio':>8s}")
+    for etapa, fila in actual.items():
+        anterior = base.get(etapa)
+        if anterior is None:
+            continue
+        cambio = fila["p50_ms"] / anterior["p50_ms"] - 1 if anterior["p50_ms"] else 0.0
+        marca = "  REGRESIÓN" if cambio > tolerancia else ""
+        print(f"{etapa:40s} {anterior['p50_ms']:10.3f} {fila['p50_ms']:11.3f} {cambio:+8.1%}{marca}")
+        if cambio > tolerancia:
+            regresiones.append(etapa)
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks por etapa del pipeline de inferencia.")
+    parser.add_argument("--repeticiones", type=int, default=30)
+    parser.add_argument("--duracion", type=float, default=10.0, help="Segundos del audio sintético")
+    parser.add_argument("--fixtures", help="Carpeta con audios reales para la etapa de decodificación")
+    parser.add_argument("--backend", default=os.getenv("INFERENCIA_BACKEND", "keras"))
+    parser.add_argument("--sin-modelo", action="store_true", help="Omitir el modelo y el top-N")
+    parser.add_argument("--bd", help="URL de la BD de pruebas (por defecto SQLite temporal); 'no' omite las escrituras")
+    parser.add_argument("--id-usuario", type=int, default=1)
+    parser.add_argument("--json", help="Guardar los resultados en este archivo")
+    parser.add_argument("--base", help="Resultados anteriores (JSON) con los que comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="Empeoramiento máximo de la mediana (0.25 = 25 %%)")
+    args = parser.parse_args()
+
+    # La URL se fija antes de importar db.database (crea el engine al importarse)
+    temporal = None
+    if args.bd != "no":
+        if args.bd is None:
+            temporal = tempfile.mkdtemp(prefix="benchmark_")
+            args.bd = f"sqlite:///{os.path.join(temporal, 'benchmark.db')}"
+        os.environ["DATABASE_URL"] = args.bd
+        if args.bd.startswith("sqlite"):
+            preparar_sqlite()
+
+    try:
+        etapas = etapas_audio(args)
+        if not args.sin_modelo:
+            etapas.update(etapas_modelo(args))
+        if args.bd != "no":
+            etapas.update(medir_escrituras(args.repeticiones, args.id_usuario))
+    finally:
+        if temporal:
+            shutil.rmtree(temporal, ignore_errors=True)
+
+    print(f"{'etapa':40s} {'p50 ms':>9s} {'p95 ms':>9s} {'p99 ms':>9s} {'memoria KB':>11s}")
+    for etapa, fila in etapas.items():
+        print(f"{etapa:40s} {fila['p50_ms']:9.3f} {fila['p95_ms']:9.3f} {fila['p99_ms']:9.3f} {fila['pico_memoria_kb']:11.0f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({
+                "fecha": datetime.now(timezone.utc).isoformat(),
+                "python": sys.version.split()[0],
+                "plataforma": platform.platform(),
+                "duracion_audio_s": args.duracion,
+                "etapas": etapas,
+            }, f, indent=2)
+
+    if args.base:
+        with open(args.base) as f:
+            base = json.load(f)["etapas"]
+        regresiones = comparar(etapas, base, args.tolerancia)
+        if regresiones:
+            print(f"\n{len(regresiones)} etapa(s) más lentas que la base (tolerancia {args.tolerancia:.0%}): {', '.join(regresiones)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
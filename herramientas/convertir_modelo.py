@@ -0,0 +1,29 @@
+# herramientas/convertir_modelo.py
+# Uso: python -m herramientas.convertir_modelo [--variantes tflite tflite_dinamico tflite_float16]
+import argparse
+import os
+
+from servicios.backends import BACKENDS, MODEL_DIR, MODEL_PATH, convertir_a_tflite, ruta_modelo
+
+VARIANTES = [nombre for nombre in BACKENDS if nombre != "keras"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convierte best_model.keras a variantes TFLite.")
+    parser.add_argument("--modelo", default=MODEL_PATH, help="Ruta del modelo Keras de origen")
+    parser.add_argument("--destino", default=MODEL_DIR, help="Directorio donde se escriben los .tflite")
+    parser.add_argument("--variantes", nargs="+", choices=VARIANTES, default=VARIANTES)
+    args = parser.parse_args()
+
+    for variante in args.variantes:
+        ruta = ruta_modelo(variante, args.destino)
+        contenido = convertir_a_tflite(args.modelo, variante)
+
+        with open(ruta, "wb") as f:
+            f.write(contenido)
+
+        print(f"{variante:16s} -> {ruta} ({os.path.getsize(ruta) / 1024 / 1024:.2f} MB)")
+
+
+if __name__ == "__main__":
+    main()
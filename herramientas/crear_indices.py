@@ -0,0 +1,57 @@
+# herramientas/crear_indices.py
+# Uso: python -m herramientas.crear_indices
+#
+# Crea en la BD de DATABASE_URL los índices de la paginación por clave de los
+# listados (servicios/paginacion.py): cada página es un recorrido del índice desde
+# el cursor, sin ordenar la tabla entera. Se ejecuta una vez al desplegar, no desde
+# el arranque de la aplicación: con CREATE INDEX CONCURRENTLY las tablas siguen
+# aceptando escrituras mientras se construye cada índice, y eso exige autocommit
+# (una sentencia por transacción). Se puede repetir: los índices que ya existen se
+# saltan y los que quedaron inválidos por una construcción interrumpida se borran
+# y se vuelven a crear.
+import sys
+from time import perf_counter
+
+from sqlalchemy import text
+
+from db.database import engine
+
+# (nombre, tabla, columnas)
+INDICES = [
+    ("ix_inferencias_fecha_log", "ejecuciones_inferencias", "fecha_ejecuta DESC, log_id DESC"),
+    ("ix_inferencias_usuario_fecha_log", "ejecuciones_inferencias", "id_usuario, fecha_ejecuta DESC, log_id DESC"),
+    ("ix_metadata_audio_inferencia", "metadata_audio", "id_inferencia"),
+    ("ix_sesiones_fecha_id", "sesiones_usuarios", "fecha_ingreso DESC, id_sesion DESC"),
+    ("ix_sesiones_usuario_fecha_id", "sesiones_usuarios", "id_usuario, fecha_ingreso DESC, id_sesion DESC"),
+    ("ix_usuarios_fecha_id", "usuarios", "fecha_creacion DESC, id_usuario DESC"),
+]
+
+
+def indice_valido(conexion, nombre: str) -> bool | None:
+    """None si el índice no existe; si existe, si terminó de construirse."""
+    return conexion.execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:nombre)"),
+        {"nombre": nombre}
+    ).scalar()
+
+
+def main():
+    if engine.dialect.name != "postgresql":
+        sys.exit(f"CREATE INDEX CONCURRENTLY necesita PostgreSQL (la BD es {engine.dialect.name}).")
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conexion:
+        for nombre, tabla, columnas in INDICES:
+            valido = indice_valido(conexion, nombre)
+            if valido:
+                print(f"{nombre:<34} ya existe")
+                continue
+            if valido is False:
+                conexion.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {nombre}"))
+
+            inicio = perf_counter()
+            conexion.execute(text(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {nombre} ON {tabla} ({columnas})"))
+            print(f"{nombre:<34} {'recreado' if valido is False else 'creado'} en {perf_counter() - inicio:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
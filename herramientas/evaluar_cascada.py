@@ -0,0 +1,106 @@
+# herramientas/evaluar_cascada.py
+# Uso: python -m herramientas.evaluar_cascada --carpeta etiquetados/ [--primera tflite_dinamico] [--completa keras]
+#                                             [--umbrales-prob 0.5 0.7 0.8 0.9 0.95] [--umbrales-margen 0 0.2 0.5]
+#                                             [--json informe.json]
+#
+# Compromiso exactitud/latencia de la cascada (servicios/cascada.py) para varios umbrales.
+# Misma estructura de carpetas que herramientas.evaluar_compuerta (una subcarpeta por
+# especie; "fondo/" se ignora). Ambos modelos se ejecutan una vez por clip sobre el
+# tensor del modo centro; cada combinación de umbrales se simula sobre esas salidas.
+import argparse
+import json
+from time import perf_counter
+
+import numpy as np
+
+from servicios.backends import BACKENDS, cargar_backend
+from servicios.cascada import ventanas_a_escalar
+from servicios.decodificacion import decodificar_audio
+from servicios.preprocesado import TARGET_SR, preprocesar_audio
+from servicios.registro_modelos import calentar
+from herramientas.evaluar_compuerta import clips_etiquetados
+
+
+def medir(backend, X):
+    inicio = perf_counter()
+    P = np.asarray(backend.predecir(X))
+    return P[0], perf_counter() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalúa umbrales de la cascada de modelos.")
+    parser.add_argument("--carpeta", required=True)
+    parser.add_argument("--primera", default="tflite_dinamico", choices=list(BACKENDS))
+    parser.add_argument("--completa", default="keras", choices=list(BACKENDS))
+    parser.add_argument("--umbrales-prob", type=float, nargs="+", default=[0.5, 0.7, 0.8, 0.9, 0.95])
+    parser.add_argument("--umbrales-margen", type=float, nargs="+", default=[0.0, 0.2, 0.5])
+    parser.add_argument("--json", help="Guardar el informe en este archivo")
+    args = parser.parse_args()
+
+    primera = cargar_backend(args.primera)
+    completa = cargar_backend(args.completa)
+    calentar(primera)
+    calentar(completa)
+
+    P1, Pc, etiquetas, t1, tc = [], [], [], [], []
+    for ruta, content_type, indice in clips_etiquetados(args.carpeta):
+        if indice is None:
+            continue
+        X = preprocesar_audio(decodificar_audio(ruta, content_type), TARGET_SR).astype(np.float32)
+        p, t = medir(primera, X)
+        P1.append(p)
+        t1.append(t)
+        p, t = medir(completa, X)
+        Pc.append(p)
+        tc.append(t)
+        etiquetas.append(indice)
+
+    if not etiquetas:
+        raise SystemExit(f"No se encontraron clips etiquetados en {args.carpeta}")
+
+    P1, Pc, etiquetas = np.stack(P1), np.stack(Pc), np.array(etiquetas)
+    t1, tc = np.array(t1), np.array(tc)
+    top1_primera = P1.argmax(axis=1)
+    top1_completa = Pc.argmax(axis=1)
+
+    informe = {
+        "clips": len(etiquetas),
+        "primera": {"backend": args.primera, "exactitud_top1": float(np.mean(top1_primera == etiquetas)),
+                    "latencia_media_ms": float(t1.mean() * 1000)},
+        "completa": {"backend": args.completa, "exactitud_top1": float(np.mean(top1_completa == etiquetas)),
+                     "latencia_media_ms": float(tc.mean() * 1000)},
+        "umbrales": [],
+    }
+
+    for umbral_prob in args.umbrales_prob:
+        for umbral_margen in args.umbrales_margen:
+            escalar = ventanas_a_escalar(P1, umbral_prob, umbral_margen)
+            top1 = np.where(escalar, top1_completa, top1_primera)
+            # Latencia esperada: la primera etapa siempre, la completa solo al escalar
+            latencia = t1 + np.where(escalar, tc, 0.0)
+            informe["umbrales"].append({
+                "umbral_prob": umbral_prob,
+                "umbral_margen": umbral_margen,
+                "tasa_escalado": float(escalar.mean()),
+                "exactitud_top1": float(np.mean(top1 == etiquetas)),
+                "acuerdo_con_completa": float(np.mean(top1 == top1_completa)),
+                "latencia_media_ms": float(latencia.mean() * 1000),
+                "aceleracion": float(tc.mean() / latencia.mean()),
+            })
+
+    print(f"clips: {informe['clips']}")
+    for nombre in ("primera", "completa"):
+        fila = informe[nombre]
+        print(f"{nombre:9s} {fila['backend']:16s} exactitud {fila['exactitud_top1']:.3f}  {fila['latencia_media_ms']:.2f} ms")
+    print(f"{'prob':>6s} {'margen':>7s} {'escala':>7s} {'exact.':>7s} {'acuerdo':>8s} {'ms':>8s} {'x':>6s}")
+    for f in informe["umbrales"]:
+        print(f"{f['umbral_prob']:6.2f} {f['umbral_margen']:7.2f} {f['tasa_escalado']:7.3f} {f['exactitud_top1']:7.3f} "
+              f"{f['acuerdo_con_completa']:8.3f} {f['latencia_media_ms']:8.2f} {f['aceleracion']:6.2f}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(informe, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# herramientas/evaluar_compuerta.py
+# Uso: python -m herramientas.evaluar_compuerta --carpeta etiquetados/ [--backend keras] [--agregacion media]
+#                                               [--energia-min-db -60] [--planitud-max 0.15]
+#                                               [--contraste-min-db 3] [--json informe.json]
+#
+# Exhaustividad perdida por la compuerta de actividad en un conjunto etiquetado local:
+# una subcarpeta por especie (nombre científico de idx2label.json) y, opcionalmente,
+# "fondo/" con clips sin aves. El modelo se ejecuta una vez por clip sobre todas las
+# ventanas; la predicción "con compuerta" combina solo las ventanas activas.
+import argparse
+import json
+import os
+
+import numpy as np
+
+from servicios.backends import BACKENDS, cargar_backend
+from servicios.catalogo_especies import RUTA_ETIQUETAS
+from servicios.compuerta_actividad import (
+    COMPUERTA_CONTRASTE_MIN_DB, COMPUERTA_ENERGIA_MIN_DB, COMPUERTA_PLANITUD_MAX, CompuertaActividad
+)
+from servicios.decodificacion import decodificar_audio
+from servicios.preprocesado import AGREGACIONES, SALTO_VENTANA, frontend, limpiar_audio, ventanas_logmel
+from servicios.recepcion import EXTENSIONES_AUDIO
+from herramientas.reevaluar_logmel import combinar
+
+CARPETA_FONDO = "fondo"
+
+
+def clips_etiquetados(carpeta: str):
+    with open(RUTA_ETIQUETAS, encoding="utf-8") as f:
+        indices = {nombre: int(idx) for idx, nombre in json.load(f).items()}
+
+    for etiqueta in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, etiqueta)
+        if not os.path.isdir(ruta):
+            continue
+        if etiqueta != CARPETA_FONDO and etiqueta not in indices:
+            print(f"aviso: {etiqueta} no está en {RUTA_ETIQUETAS}, se omite")
+            continue
+
+        for nombre in sorted(os.listdir(ruta)):
+            content_type = EXTENSIONES_AUDIO.get(os.path.splitext(nombre)[1].lower())
+            if content_type:
+                yield os.path.join(ruta, nombre), content_type, indices.get(etiqueta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evalúa la compuerta de actividad sobre clips etiquetados.")
+    parser.add_argument("--carpeta", required=True)
+    parser.add_argument("--backend", default="keras", choices=list(BACKENDS))
+    parser.add_argument("--agregacion", default="media", choices=AGREGACIONES)
+    parser.add_argument("--salto", type=int, default=SALTO_VENTANA)
+    parser.add_argument("--energia-min-db", type=float, default=COMPUERTA_ENERGIA_MIN_DB)
+    parser.add_argument("--planitud-max", type=float, default=COMPUERTA_PLANITUD_MAX)
+    parser.add_argument("--contraste-min-db", type=float, default=COMPUERTA_CONTRASTE_MIN_DB)
+    parser.add_argument("--json", help="Guardar el informe en este archivo")
+    args = parser.parse_args()
+
+    compuerta = CompuertaActividad(args.energia_min_db, args.planitud_max, args.contraste_min_db, activa=True)
+    backend = cargar_backend(args.backend)
+
+    aves = {"clips": 0, "ventanas": 0, "omitidas": 0, "sin_actividad": 0,
+            "top1_sin": 0, "top1_con": 0, "top5_sin": 0, "top5_con": 0}
+    fondo = {"clips": 0, "ventanas": 0, "omitidas": 0, "sin_actividad": 0}
+
+    for ruta, content_type, indice in clips_etiquetados(args.carpeta):
+        y = limpiar_audio(decodificar_audio(ruta, content_type))
+        P = frontend.potencia_mel(y)
+        V = ventanas_logmel(frontend.normalizar(frontend.potencia_a_db(P)), args.salto)
+        activas = compuerta.evaluar(ventanas_logmel(P, args.salto))
+
+        # Mismo criterio que preprocesado.ventanas_activas: sin actividad se conserva la ventana de más energía
+        sin_actividad = not activas.any()
+        if sin_actividad:
+            activas[np.argmax(ventanas_logmel(P, args.salto).mean(axis=(1, 2)))] = True
+
+        grupo = fondo if indice is None else aves
+        grupo["clips"] += 1
+        grupo["ventanas"] += len(V)
+        grupo["omitidas"] += int(len(V) - activas.sum())
+        grupo["sin_actividad"] += int(sin_actividad)
+
+        if indice is None:
+            continue
+
+        probs = backend.predecir(V[..., np.newaxis].astype(np.float32))
+        for sufijo, p in (("sin", combinar(probs, args.agregacion)), ("con", combinar(probs[activas], args.agregacion))):
+            top5 = np.argsort(p)[::-1][:5]
+            aves[f"top1_{sufijo}"] += int(top5[0] == indice)
+            aves[f"top5_{sufijo}"] += int(indice in top5)
+
+    if aves["clips"] + fondo["clips"] == 0:
+        raise SystemExit(f"No se encontraron clips etiquetados en {args.carpeta}")
+
+    informe = {"parametros": compuerta.parametros(), "aves": dict(aves), "fondo": dict(fondo)}
+    for nombre, grupo in (("aves", aves), ("fondo", fondo)):
+        fila = informe[nombre]
+        fila["fraccion_omitida"] = grupo["omitidas"] / grupo["ventanas"] if grupo["ventanas"] else 0.0
+        if nombre == "aves" and grupo["clips"]:
+            for k in ("top1", "top5"):
+                fila[f"exhaustividad_{k}_sin"] = grupo[f"{k}_sin"] / grupo["clips"]
+                fila[f"exhaustividad_{k}_con"] = grupo[f"{k}_con"] / grupo["clips"]
+                fila[f"perdida_{k}"] = fila[f"exhaustividad_{k}_sin"] - fila[f"exhaustividad_{k}_con"]
+
+    a = informe["aves"]
+    print(f"aves:  {aves['clips']} clips  ventanas omitidas {a['fraccion_omitida']:.3f}  "
+          f"clips sin actividad {aves['sin_actividad']}")
+    if aves["clips"]:
+        print(f"       top-1 {a['exhaustividad_top1_sin']:.3f} -> {a['exhaustividad_top1_con']:.3f} "
+              f"(pérdida {a['perdida_top1']:+.3f})  top-5 {a['exhaustividad_top5_sin']:.3f} -> "
+              f"{a['exhaustividad_top5_con']:.3f} (pérdida {a['perdida_top5']:+.3f})")
+    print(f"fondo: {fondo['clips']} clips  ventanas omitidas {informe['fondo']['fraccion_omitida']:.3f}  "
+          f"clips sin actividad {fondo['sin_actividad']}")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(informe, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
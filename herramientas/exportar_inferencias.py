@@ -0,0 +1,51 @@
+# herramientas/exportar_inferencias.py
+# Uso: python -m herramientas.exportar_inferencias --salida inferencias.parquet [--formato parquet]
+#          [--desde 2026-01-01] [--hasta 2026-03-31] [--especie Turdus_fuscater --especie ...]
+#
+# Exporta el historial de inferencias + metadatos de DATABASE_URL a CSV o Parquet,
+# igual que GET /v1/admin/logs/exportar pero directo a un archivo: se lee con un
+# cursor del lado del servidor y se escribe por lotes (servicios/exportacion.py),
+# con memoria constante aunque la tabla tenga millones de filas.
+# Si no se indica --formato se deduce de la extensión de --salida.
+import argparse
+import os
+import sys
+import tracemalloc
+from datetime import date
+from time import perf_counter
+
+from servicios.exportacion import FORMATOS_EXPORTACION, ParquetNoDisponible, comprobar_formato, exportar
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta el historial de inferencias a CSV o Parquet.")
+    parser.add_argument("--salida", required=True, help="Archivo de destino")
+    parser.add_argument("--formato", choices=sorted(FORMATOS_EXPORTACION), default=None)
+    parser.add_argument("--desde", type=date.fromisoformat, default=None, help="Fecha inicial inclusiva (AAAA-MM-DD, UTC)")
+    parser.add_argument("--hasta", type=date.fromisoformat, default=None, help="Fecha final inclusiva (AAAA-MM-DD, UTC)")
+    parser.add_argument("--especie", action="append", default=None, help="Filtra por especie predicha (repetible)")
+    args = parser.parse_args()
+
+    formato = args.formato or os.path.splitext(args.salida)[1].lstrip(".").lower()
+    try:
+        comprobar_formato(formato)
+    except (ValueError, ParquetNoDisponible) as e:
+        sys.exit(str(e))
+
+    tracemalloc.start()
+    inicio = perf_counter()
+    tamano = 0
+    with open(args.salida, "wb") as f:
+        for trozo in exportar(formato, args.desde, args.hasta, args.especie):
+            f.write(trozo)
+            tamano += len(trozo)
+    transcurrido = perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print(f"{args.salida}: {tamano / 1024 / 1024:.1f} MB ({formato}) en {transcurrido:.1f}s, "
+          f"pico de memoria Python {pico / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
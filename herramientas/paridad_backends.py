@@ -0,0 +1,105 @@
+# herramientas/paridad_backends.py
+# Uso: python -m herramientas.paridad_backends --carpeta clips/ [--backends tflite tflite_dinamico] [--json salida.json]
+import argparse
+import json
+import os
+from time import perf_counter
+
+import librosa
+import numpy as np
+
+from servicios.backends import BACKENDS, cargar_backend
+from servicios.preprocesado import TARGET_SR, audio_a_logmel, limpiar_audio
+
+EXTENSIONES = (".wav", ".mp3", ".flac", ".ogg", ".webm")
+
+
+def cargar_tensores(carpeta: str):
+    nombres = sorted(f for f in os.listdir(carpeta) if f.lower().endswith(EXTENSIONES))
+
+    for nombre in nombres:
+        y, sr = librosa.load(os.path.join(carpeta, nombre), sr=TARGET_SR, mono=True)
+        S = audio_a_logmel(limpiar_audio(y), sr)
+        yield nombre, S[np.newaxis, ..., np.newaxis].astype(np.float32)
+
+
+def medir(backend, X):
+    inicio = perf_counter()
+    probs = backend.predecir(X)[0]
+    return probs, (perf_counter() - inicio) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara backends de inferencia contra el modelo Keras.")
+    parser.add_argument("--carpeta", required=True, help="Carpeta local con clips de audio")
+    parser.add_argument("--backends", nargs="+", default=[b for b in BACKENDS if b != "keras"], choices=list(BACKENDS))
+    parser.add_argument("--json", help="Guardar el informe en este archivo")
+    args = parser.parse_args()
+
+    referencia = cargar_backend("keras")
+    candidatos = {nombre: cargar_backend(nombre) for nombre in args.backends}
+
+    nombres_medidos = ["keras"] + list(candidatos)
+    latencias = {nombre: [] for nombre in nombres_medidos}
+    top1 = {nombre: 0 for nombre in candidatos}
+    top5 = {nombre: 0 for nombre in candidatos}
+    solape_top5 = {nombre: 0.0 for nombre in candidatos}
+    dif_max = {nombre: 0.0 for nombre in candidatos}
+    clips = 0
+
+    for nombre_clip, X in cargar_tensores(args.carpeta):
+        # Calentamiento por forma del tensor, fuera de la medición
+        if clips == 0:
+            for backend in [referencia, *candidatos.values()]:
+                backend.predecir(X)
+
+        p_ref, ms = medir(referencia, X)
+        latencias["keras"].append(ms)
+        ref_top5 = np.argsort(p_ref)[::-1][:5]
+
+        for nombre, backend in candidatos.items():
+            p, ms = medir(backend, X)
+            latencias[nombre].append(ms)
+            cand_top5 = np.argsort(p)[::-1][:5]
+
+            top1[nombre] += int(cand_top5[0] == ref_top5[0])
+            top5[nombre] += int(set(cand_top5) == set(ref_top5))
+            solape_top5[nombre] += len(set(cand_top5) & set(ref_top5)) / 5
+            dif_max[nombre] = max(dif_max[nombre], float(np.max(np.abs(p - p_ref))))
+
+        clips += 1
+
+    if clips == 0:
+        raise SystemExit(f"No se encontraron clips {EXTENSIONES} en {args.carpeta}")
+
+    informe = {"clips": clips, "backends": {}}
+    for nombre in nombres_medidos:
+        lat = np.array(latencias[nombre])
+        fila = {
+            "ruta": (referencia if nombre == "keras" else candidatos[nombre]).ruta,
+            "latencia_p50_ms": float(np.percentile(lat, 50)),
+            "latencia_p95_ms": float(np.percentile(lat, 95)),
+        }
+        if nombre in candidatos:
+            fila.update({
+                "acuerdo_top1": top1[nombre] / clips,
+                "acuerdo_top5": top5[nombre] / clips,
+                "solape_medio_top5": solape_top5[nombre] / clips,
+                "dif_max_probabilidad": dif_max[nombre],
+            })
+        informe["backends"][nombre] = fila
+
+    print(f"{'backend':16s} {'top1':>7s} {'top5':>7s} {'solape5':>8s} {'p50 ms':>8s} {'p95 ms':>8s}")
+    for nombre, fila in informe["backends"].items():
+        print(
+            f"{nombre:16s} {fila.get('acuerdo_top1', 1.0):7.3f} {fila.get('acuerdo_top5', 1.0):7.3f} "
+            f"{fila.get('solape_medio_top5', 1.0):8.3f} {fila['latencia_p50_ms']:8.2f} {fila['latencia_p95_ms']:8.2f}"
+        )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(informe, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+# herramientas/reevaluar_logmel.py
+# Uso: python -m herramientas.reevaluar_logmel --backend tflite [--directorio almacen_logmel] [--lote 256]
+#                                              [--agregacion media] [--comparar] [--csv salida.csv]
+#
+# Re-evalúa con otro modelo las inferencias guardadas por servicios/almacen_logmel.py,
+# sin decodificar audio ni calcular STFT.
+import argparse
+import csv
+from collections import defaultdict
+from time import perf_counter
+
+import numpy as np
+
+from servicios.almacen_logmel import ALMACEN_LOGMEL_DIR, LectorLogMel
+from servicios.backends import BACKENDS, cargar_backend
+from servicios.preprocesado import AGREGACIONES, TOPK_VENTANAS
+
+
+def combinar(P: np.ndarray, agregacion: str) -> np.ndarray:
+    if agregacion == "max":
+        return P.max(axis=0)
+    if agregacion == "topk":
+        k = min(TOPK_VENTANAS, len(P))
+        return np.sort(P, axis=0)[-k:].mean(axis=0)
+    return P.mean(axis=0)
+
+
+def predicciones_guardadas(log_ids) -> dict:
+    # Solo con --comparar: la BD no hace falta para re-evaluar
+    from db.database import SessionLocal
+    from db.modelos import EjecucionInferencia
+
+    db = SessionLocal()
+    try:
+        filas = (
+            db.query(EjecucionInferencia.log_id, EjecucionInferencia.top_5)
+            .filter(EjecucionInferencia.log_id.in_(list(log_ids)))
+            .all()
+        )
+    finally:
+        db.close()
+
+    return {log_id: top_5[0]["id_ave"] for log_id, top_5 in filas if top_5}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-evalúa log-mel guardados con otro backend.")
+    parser.add_argument("--backend", default="keras", choices=list(BACKENDS))
+    parser.add_argument("--directorio", default=ALMACEN_LOGMEL_DIR)
+    parser.add_argument("--lote", type=int, default=256)
+    parser.add_argument("--agregacion", default="media", choices=AGREGACIONES)
+    parser.add_argument("--comparar", action="store_true", help="Acuerdo top-1 con la predicción registrada en la BD")
+    parser.add_argument("--csv", help="Guardar log_id, top-1 y probabilidad en este archivo")
+    args = parser.parse_args()
+
+    lector = LectorLogMel(args.directorio)
+    if len(lector) == 0:
+        raise SystemExit(f"No hay log-mel guardados en {args.directorio}")
+
+    backend = cargar_backend(args.backend)
+
+    # Ventanas por inferencia (en modo ventanas una inferencia ocupa varias filas)
+    probabilidades = defaultdict(list)
+    ventanas = 0
+    inicio = perf_counter()
+
+    for log_ids, X in lector.lotes(args.lote):
+        P = backend.predecir(X.astype(np.float32))
+        for log_id, p in zip(log_ids, P):
+            probabilidades[int(log_id)].append(p)
+        ventanas += len(X)
+
+    transcurrido = perf_counter() - inicio
+    top1 = {log_id: int(np.argmax(combinar(np.stack(P), args.agregacion))) for log_id, P in probabilidades.items()}
+
+    print(f"inferencias: {len(top1)}  ventanas: {ventanas}  tiempo: {transcurrido:.1f}s  "
+          f"({ventanas / transcurrido:.0f} ventanas/s)")
+
+    if args.comparar:
+        guardadas = predicciones_guardadas(top1)
+        comunes = [log_id for log_id in top1 if log_id in guardadas]
+        if comunes:
+            acuerdo = np.mean([top1[log_id] == guardadas[log_id] for log_id in comunes])
+            print(f"acuerdo top-1 con la BD: {acuerdo:.3f} ({len(comunes)} inferencias)")
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["log_id", "id_ave", "probabilidad"])
+            for log_id, P in sorted(probabilidades.items()):
+                p = combinar(np.stack(P), args.agregacion)
+                escritor.writerow([log_id, top1[log_id], float(p[top1[log_id]])])
+
+
+if __name__ == "__main__":
+    main()
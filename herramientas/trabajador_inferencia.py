@@ -0,0 +1,43 @@
+# herramientas/trabajador_inferencia.py
+# Uso: python -m herramientas.trabajador_inferencia [--procesos 2]
+#
+# Procesos trabajadores fuera de la API para la cola trabajos_inferencia. Cada
+# proceso carga su propio modelo (INFERENCIA_BACKEND) y reclama trabajos con
+# FOR UPDATE SKIP LOCKED, así que pueden convivir con los hilos de la API.
+# Son los únicos que procesan las grabaciones largas (POST /v1/trabajos/grabacion_larga):
+# sin al menos un proceso en marcha esos trabajos se quedan pendientes.
+import argparse
+import multiprocessing
+import os
+import socket
+
+from servicios.trabajos import ejecutar_trabajador
+
+
+def proceso_trabajador(indice: int):
+    ejecutar_trabajador(f"{socket.gethostname()}:{os.getpid()}:cli{indice}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Procesa trabajos de inferencia asíncrona.")
+    parser.add_argument("--procesos", type=int, default=int(os.getenv("TRABAJOS_PROCESOS", "1")))
+    args = parser.parse_args()
+
+    if args.procesos <= 1:
+        proceso_trabajador(0)
+        return
+
+    contexto = multiprocessing.get_context("spawn")
+    procesos = [contexto.Process(target=proceso_trabajador, args=(i,), daemon=False) for i in range(args.procesos)]
+    for p in procesos:
+        p.start()
+    try:
+        for p in procesos:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procesos:
+            p.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+# herramientas/verificar_frontend.py
+# Uso: python -m herramientas.verificar_frontend [--carpeta clips/]
+# Comprueba que FrontendLogMel equivale a la ruta librosa original y compara tiempos.
+import argparse
+import os
+import sys
+from time import perf_counter
+
+import librosa
+import numpy as np
+
+from servicios.frontend_logmel import FrontendLogMel
+from servicios.preprocesado import FMAX, FMIN, HOP_LENGTH, N_FFT, N_MELS, TARGET_SR
+
+TOLERANCIA = 1e-4
+
+
+def logmel_librosa(y):
+    y = y / (np.max(np.abs(y)) + 1e-9)
+    y = librosa.effects.preemphasis(y, coef=0.97)
+    S = librosa.feature.melspectrogram(
+        y=y, sr=TARGET_SR, n_fft=N_FFT, hop_length=HOP_LENGTH,
+        n_mels=N_MELS, fmin=FMIN, fmax=FMAX
+    )
+    S_db = librosa.power_to_db(S, ref=np.max)
+    return (S_db - S_db.min()) / (S_db.max() - S_db.min() + 1e-9)
+
+
+def senales_sinteticas():
+    rng = np.random.default_rng(0)
+    t = np.arange(int(5 * TARGET_SR)) / TARGET_SR
+
+    yield "ruido_blanco_5s", rng.standard_normal(len(t)).astype(np.float32) * 0.1
+    yield "tono_3khz_5s", (0.5 * np.sin(2 * np.pi * 3000 * t)).astype(np.float32)
+    yield "chirp_5s", librosa.chirp(fmin=500, fmax=11025, sr=TARGET_SR, duration=5).astype(np.float32)
+    yield "ruido_1s", rng.standard_normal(TARGET_SR).astype(np.float32) * 0.01
+    yield "ruido_60s", rng.standard_normal(60 * TARGET_SR).astype(np.float32) * 0.1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verifica FrontendLogMel contra librosa.")
+    parser.add_argument("--carpeta", help="Clips reales adicionales")
+    args = parser.parse_args()
+
+    frontend = FrontendLogMel(TARGET_SR, N_FFT, HOP_LENGTH, N_MELS, FMIN, FMAX)
+
+    senales = list(senales_sinteticas())
+    if args.carpeta:
+        for nombre in sorted(os.listdir(args.carpeta)):
+            ruta = os.path.join(args.carpeta, nombre)
+            if os.path.isfile(ruta):
+                y, _ = librosa.load(ruta, sr=TARGET_SR, mono=True)
+                senales.append((nombre, y))
+
+    # Calentamiento (JIT de numba en librosa) fuera de la medición
+    logmel_librosa(senales[0][1])
+
+    fallos = 0
+    print(f"{'señal':24s} {'dif_max':>10s} {'librosa ms':>11s} {'frontend ms':>12s}")
+    for nombre, y in senales:
+        inicio = perf_counter()
+        esperado = logmel_librosa(y)
+        t_librosa = perf_counter() - inicio
+
+        inicio = perf_counter()
+        obtenido = frontend.logmel(y, limpiar=True)
+        t_frontend = perf_counter() - inicio
+
+        dif = float(np.max(np.abs(esperado - obtenido)))
+        fallos += dif > TOLERANCIA
+        print(f"{nombre[:24]:24s} {dif:10.2e} {t_librosa * 1000:11.1f} {t_frontend * 1000:12.1f}")
+
+    # El lote debe dar lo mismo que cada señal por separado
+    lote = np.stack([y for nombre, y in senales if len(y) == 5 * TARGET_SR])
+    por_lote = frontend.logmel(lote, limpiar=True)
+    dif_lote = max(float(np.max(np.abs(por_lote[i] - logmel_librosa(y)))) for i, y in enumerate(lote))
+    fallos += dif_lote > TOLERANCIA
+    print(f"{'lote de ' + str(len(lote)):24s} {dif_lote:10.2e}")
+
+    if fallos:
+        print(f"{fallos} comparaciones superan la tolerancia {TOLERANCIA}")
+        sys.exit(1)
+    print(f"Equivalente a librosa (tolerancia {TOLERANCIA})")
+
+
+if __name__ == "__main__":
+    main()
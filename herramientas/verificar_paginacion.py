@@ -0,0 +1,176 @@
+# herramientas/verificar_paginacion.py
+# Uso: python -m herramientas.verificar_paginacion [--limite 50] [--paginas 20] [--nombre a]
+#
+# Recorre con el cursor las páginas de cada listado paginado contra la BD de
+# DATABASE_URL y cuenta las sentencias SQL que ejecuta cada página. Comprueba que
+# cada página cuesta exactamente una consulta (sin N+1 por fila ni cargas
+# perezosas), que ninguna página supera el límite y que no se repiten filas entre
+# páginas. En PostgreSQL además pide el EXPLAIN de la primera página cuyo cursor
+# lleva fecha: el cursor tiene que aparecer como Index Cond sobre la columna de
+# fecha (el recorrido del índice empieza en el cursor); si solo es un Filter, la
+# página N lee N páginas. El plan se pide con enable_seqscan = off para que una BD
+# de pruebas pequeña no elija un recorrido secuencial. Solo lee. Sale con código 1
+# si algún listado no cumple.
+import argparse
+import asyncio
+import inspect
+import sys
+
+from sqlalchemy import event, text
+
+from db.database import SessionLocal, cerrar_engine_async, engine, obtener_sesion_async
+from servicios.catalogo_especies import catalogo
+from servicios.hist_inferencias import obtener_inferencias_admin, obtener_inferencias_async
+from servicios.paginacion import decodificar_cursor
+from servicios.sesiones import ADMIN_ROLE_ID, obtener_sesiones, obtener_sesiones_admin, obtener_usuario_nombre, obtener_usuarios
+
+CONSULTAS_POR_PAGINA = 1
+
+
+class ContadorConsultas:
+    def __init__(self, motor):
+        self.total = 0
+        self.ultima = None
+        event.listen(motor, "before_cursor_execute", self._contar)
+
+    def _contar(self, conexion, cursor, sentencia, parametros, *args):
+        self.total += 1
+        self.ultima = (sentencia, parametros)
+
+
+def explicar(conexion, sentencia: str, parametros) -> list:
+    # Dentro de una transacción propia: SET LOCAL no sale de ella
+    with conexion.begin():
+        conexion.execute(text("SET LOCAL enable_seqscan = off"))
+        return [fila[0] for fila in conexion.exec_driver_sql("EXPLAIN " + sentencia, parametros)]
+
+
+def limitado_por_indice(plan: list, columna_fecha: str) -> bool:
+    return any("Index Cond" in linea and columna_fecha in linea for linea in plan)
+
+
+class Usuario:
+    # Lo único que leen los listados del usuario autenticado
+    def __init__(self, id_usuario: int, role_id: int):
+        self.id_usuario = id_usuario
+        self.role_id = role_id
+
+
+async def recorrer(nombre: str, pagina, contador: ContadorConsultas, clave, limite: int, max_paginas: int,
+                   columna_fecha: str, plan=None) -> list:
+    errores = []
+    plan_comprobado = False
+    vistas = set()
+    cursor = None
+    paginas = filas_totales = 0
+
+    while paginas < max_paginas:
+        antes = contador.total
+        # El plan se comprueba en la primera página cuyo cursor tiene fecha (las
+        # filas sin fecha van primero y se recorren con un filtro, ver servicios/paginacion.py)
+        explicar_pagina = plan is not None and cursor is not None and decodificar_cursor(cursor)[0] is not None
+        resultado = pagina(cursor)
+        filas, cursor = await resultado if inspect.isawaitable(resultado) else resultado
+        consultas = contador.total - antes
+        sentencia = contador.ultima
+        paginas += 1
+        filas_totales += len(filas)
+
+        if consultas != CONSULTAS_POR_PAGINA:
+            errores.append(f"{nombre}: página {paginas} ejecutó {consultas} consultas")
+        if len(filas) > limite:
+            errores.append(f"{nombre}: página {paginas} con {len(filas)} filas (límite {limite})")
+        for fila in filas:
+            if clave(fila) in vistas:
+                errores.append(f"{nombre}: fila {clave(fila)} repetida en la página {paginas}")
+            vistas.add(clave(fila))
+
+        if explicar_pagina:
+            plan_comprobado = True
+            resultado = plan(*sentencia)
+            lineas = await resultado if inspect.isawaitable(resultado) else resultado
+            if not limitado_por_indice(lineas, columna_fecha):
+                errores.append(f"{nombre}: el cursor no limita el recorrido del índice sobre {columna_fecha}:\n    "
+                               + "\n    ".join(lineas))
+            plan = None
+        if cursor is None:
+            break
+
+    print(f"{nombre:<28} {paginas:>4} páginas  {filas_totales:>6} filas  "
+          f"{'plan comprobado  ' if plan_comprobado else ''}{'OK' if not errores else f'{len(errores)} errores'}")
+    return errores
+
+
+async def verificar(limite: int, max_paginas: int, nombre_buscado: str) -> int:
+    # El catálogo de especies se carga antes para no contar su consulta en la primera página
+    catalogo.cargar()
+
+    db = SessionLocal()
+    contador = ContadorConsultas(engine)
+    admin = Usuario(None, ADMIN_ROLE_ID)
+    postgres = engine.dialect.name == "postgresql"
+    if not postgres:
+        print(f"Plan de consultas no comprobado: la BD es {engine.dialect.name}, no PostgreSQL")
+
+    def sincrona(funcion, *args):
+        return lambda cursor: funcion(db, *args, cursor, limite)
+
+    def plan_sincrono(sentencia, parametros):
+        with engine.connect() as conexion:
+            return explicar(conexion, sentencia, parametros)
+
+    plan = plan_sincrono if postgres else None
+
+    errores = []
+    try:
+        errores += await recorrer("admin/historial", sincrona(obtener_inferencias_admin), contador,
+                                  lambda f: f.log_id, limite, max_paginas, "fecha_ejecuta", plan)
+        errores += await recorrer("admin/Listar_sesiones", sincrona(obtener_sesiones_admin, admin), contador,
+                                  lambda f: f.id_sesion, limite, max_paginas, "fecha_ingreso", plan)
+        errores += await recorrer("admin/listar_usuarios", sincrona(obtener_usuarios), contador,
+                                  lambda f: f.id_usuario, limite, max_paginas, "fecha_creacion", plan)
+        errores += await recorrer("usuarios/buscar_usuarios", sincrona(obtener_usuario_nombre, nombre_buscado), contador,
+                                  lambda f: f.id_usuario, limite, max_paginas, "fecha_creacion", plan)
+
+        # Listados de un usuario: el primero que aparezca en la primera página de usuarios
+        usuarios, _ = obtener_usuarios(db, None, 1)
+        if usuarios:
+            propio = Usuario(usuarios[0].id_usuario, usuarios[0].role_id)
+            errores += await recorrer("usuarios/Listar_sesiones", sincrona(obtener_sesiones, propio), contador,
+                                      lambda f: f.id_sesion, limite, max_paginas, "fecha_ingreso", plan)
+
+            async with obtener_sesion_async() as db_async:
+                contador_async = ContadorConsultas(db_async.bind.sync_engine)
+
+                async def plan_async(sentencia, parametros):
+                    async with db_async.bind.connect() as conexion:
+                        return await conexion.run_sync(explicar, sentencia, parametros)
+
+                errores += await recorrer(
+                    "inferencia/historial",
+                    lambda cursor: obtener_inferencias_async(db_async, propio, cursor, limite),
+                    contador_async, lambda f: f.log_id, limite, max_paginas,
+                    "fecha_ejecuta", plan_async if postgres else None
+                )
+    finally:
+        db.close()
+        await cerrar_engine_async()
+
+    for error in errores[:20]:
+        print("  " + error)
+    return len(errores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consultas por página de los listados paginados.")
+    parser.add_argument("--limite", type=int, default=50, help="Filas por página")
+    parser.add_argument("--paginas", type=int, default=20, help="Máximo de páginas recorridas por listado")
+    parser.add_argument("--nombre", default="a", help="Texto para buscar_usuarios")
+    args = parser.parse_args()
+
+    if asyncio.run(verificar(args.limite, args.paginas, args.nombre)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# herramientas/verificar_persistencia.py
+# Uso: python -m herramientas.verificar_persistencia [--inferencias 500] [--concurrencia 32] [--id-usuario 1]
+#
+# Prueba de concurrencia de registrar_inferencia_con_metadata_async contra la BD de
+# DATABASE_URL (un Postgres local de pruebas): muchas sesiones async independientes,
+# como peticiones simultáneas, insertan cada una su inferencia y sus metadatos.
+# Comprueba que cada fila de metadata_audio apunta a su propia inferencia y que no
+# falta ni sobra ninguna. Las filas creadas se borran al terminar. Sale con código 1
+# si alguna fila quedó mal enlazada.
+import argparse
+import asyncio
+import secrets
+import sys
+from time import perf_counter
+
+from sqlalchemy import delete, select
+
+from db.database import cerrar_engine_async, obtener_sesion_async
+from db.modelos import EjecucionInferencia, MetadatoAudio
+from servicios.hist_inferencias import registrar_inferencia_con_metadata_async
+
+
+async def insertar(marca: str, id_usuario: int, limite: asyncio.Semaphore) -> tuple:
+    async with limite:
+        async with obtener_sesion_async() as db:
+            log_id = await registrar_inferencia_con_metadata_async(
+                db,
+                inferencia={
+                    "id_usuario": id_usuario,
+                    "prediccion_especie": marca,
+                    "confianza": 0.0,
+                    "top_5": [],
+                    "tiempo_ejecucion": 0.0,
+                    "version_modelo": "verificacion"
+                },
+                metadata={
+                    "origen": "Verificacion_persistencia",
+                    "formato": "audio/wav",
+                    "id_usuario": id_usuario,
+                    "localizacion": marca
+                }
+            )
+    return marca, log_id
+
+
+async def verificar(inferencias: int, concurrencia: int, id_usuario: int) -> int:
+    prefijo = f"verificacion_{secrets.token_hex(4)}_"
+    limite = asyncio.Semaphore(concurrencia)
+
+    inicio = perf_counter()
+    resultados = await asyncio.gather(*(insertar(f"{prefijo}{i}", id_usuario, limite) for i in range(inferencias)))
+    transcurrido = perf_counter() - inicio
+    devueltos = dict(resultados)
+
+    async with obtener_sesion_async() as db:
+        filas = (await db.execute(
+            select(MetadatoAudio.localizacion, MetadatoAudio.id_inferencia, EjecucionInferencia.prediccion_especie)
+            .outerjoin(EjecucionInferencia, EjecucionInferencia.log_id == MetadatoAudio.id_inferencia)
+            .where(MetadatoAudio.origen == "Verificacion_persistencia", MetadatoAudio.localizacion.startswith(prefijo))
+        )).all()
+
+        errores = []
+        vistas = set()
+        for marca, id_inferencia, especie in filas:
+            vistas.add(marca)
+            if especie != marca:
+                errores.append(f"{marca}: metadata enlazada a log_id={id_inferencia} ({especie})")
+            elif devueltos.get(marca) != id_inferencia:
+                errores.append(f"{marca}: log_id devuelto {devueltos.get(marca)} != enlazado {id_inferencia}")
+        errores += [f"{marca}: sin fila de metadata" for marca in devueltos.keys() - vistas]
+
+        # Limpieza: metadatos primero por la clave foránea
+        await db.execute(delete(MetadatoAudio).where(MetadatoAudio.id_inferencia.in_(devueltos.values())))
+        await db.execute(delete(EjecucionInferencia).where(EjecucionInferencia.log_id.in_(devueltos.values())))
+        await db.commit()
+
+    await cerrar_engine_async()
+
+    print(f"{inferencias} inferencias con concurrencia {concurrencia} en {transcurrido:.2f}s "
+          f"({inferencias / transcurrido:.0f}/s)")
+    print(f"metadatos enlazados: {len(filas)}, errores: {len(errores)}")
+    for error in errores[:20]:
+        print("  " + error)
+    return len(errores)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrencia de la persistencia inferencia + metadatos.")
+    parser.add_argument("--inferencias", type=int, default=500)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--id-usuario", type=int, default=1, help="Usuario existente al que se asignan las filas")
+    args = parser.parse_args()
+
+    if asyncio.run(verificar(args.inferencias, args.concurrencia, args.id_usuario)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# servicios/almacen_logmel.py
+# Almacén de log-mel para re-evaluar modelos sin volver a decodificar el audio.
+#
+# Cada proceso escribe sus propios fragmentos (solo se añaden datos al final):
+#   fragmento_<prefijo>_<n>.f16  registros float16 de N_MELS x TARGET_FRAMES seguidos
+#   indice_<prefijo>.csv         log_id,fragmento,fila,n_ventanas
+# La fila del índice se escribe después de los datos, así un lector nunca ve
+# un registro a medias.
+import glob
+import os
+import threading
+import time
+
+import numpy as np
+
+from servicios.preprocesado import N_MELS, TARGET_FRAMES
+
+# ---------------- CONFIGURACIÓN ----------------
+ALMACEN_LOGMEL = os.getenv("ALMACEN_LOGMEL", "0") == "1"
+ALMACEN_LOGMEL_DIR = os.getenv("ALMACEN_LOGMEL_DIR", "almacen_logmel")
+# Registros por fragmento (2048 x 128 x 216 x 2 bytes ≈ 113 MB)
+ALMACEN_LOGMEL_FRAGMENTO = int(os.getenv("ALMACEN_LOGMEL_FRAGMENTO", "2048"))
+
+FORMA_REGISTRO = (N_MELS, TARGET_FRAMES)
+BYTES_REGISTRO = N_MELS * TARGET_FRAMES * np.dtype(np.float16).itemsize
+
+# ------------------------------------------------------------------
+# ESCRITURA
+# ------------------------------------------------------------------
+
+class AlmacenLogMel:
+    def __init__(self, directorio: str = ALMACEN_LOGMEL_DIR, registros_fragmento: int = ALMACEN_LOGMEL_FRAGMENTO):
+        self.directorio = directorio
+        self.registros_fragmento = registros_fragmento
+
+        self._lock = threading.Lock()
+        self._prefijo = None
+        self._secuencia = 0
+        self._filas = 0
+        self._guardados = 0
+
+    def _ruta_fragmento(self) -> str:
+        return os.path.join(self.directorio, f"fragmento_{self._prefijo}_{self._secuencia:04d}.f16")
+
+    def _ruta_indice(self) -> str:
+        return os.path.join(self.directorio, f"indice_{self._prefijo}.csv")
+
+    def guardar(self, log_id: int, X: np.ndarray):
+        """Añade el tensor de entrada (ventanas, 128, 216[, 1]) de la inferencia `log_id`."""
+        registros = np.ascontiguousarray(np.asarray(X).reshape(-1, *FORMA_REGISTRO), dtype=np.float16)
+
+        with self._lock:
+            if self._prefijo is None:
+                # Un prefijo por proceso: varios workers escriben sin coordinarse
+                os.makedirs(self.directorio, exist_ok=True)
+                self._prefijo = f"{int(time.time())}_{os.getpid()}"
+
+            if self._filas + len(registros) > self.registros_fragmento and self._filas > 0:
+                self._secuencia += 1
+                self._filas = 0
+
+            fragmento = self._ruta_fragmento()
+            with open(fragmento, "ab") as f:
+                f.write(registros.tobytes())
+
+            with open(self._ruta_indice(), "a") as f:
+                f.write(f"{int(log_id)},{os.path.basename(fragmento)},{self._filas},{len(registros)}\n")
+
+            self._filas += len(registros)
+            self._guardados += 1
+
+    def estadisticas(self) -> dict:
+        return {
+            "activo": ALMACEN_LOGMEL,
+            "directorio": self.directorio,
+            "inferencias_guardadas": self._guardados,
+            "fragmento_actual": os.path.basename(self._ruta_fragmento()) if self._prefijo else None,
+        }
+
+
+almacen = AlmacenLogMel()
+
+# ------------------------------------------------------------------
+# LECTURA EN BLOQUE
+# ------------------------------------------------------------------
+
+class LectorLogMel:
+    """
+    Lee los fragmentos con np.memmap. `lotes` entrega vistas del archivo
+    mapeado (sin copia) de hasta `tamano_lote` ventanas, junto con el log_id
+    de cada ventana.
+    """
+
+    def __init__(self, directorio: str = ALMACEN_LOGMEL_DIR):
+        self.directorio = directorio
+        # fragmento -> lista de (log_id, fila, n_ventanas)
+        self.indice = {}
+
+        for ruta in sorted(glob.glob(os.path.join(directorio, "indice_*.csv"))):
+            with open(ruta) as f:
+                for linea in f:
+                    partes = linea.strip().split(",")
+                    if len(partes) != 4:
+                        continue  # línea a medio escribir
+                    log_id, fragmento, fila, n = partes
+                    self.indice.setdefault(fragmento, []).append((int(log_id), int(fila), int(n)))
+
+    def __len__(self):
+        return sum(len(entradas) for entradas in self.indice.values())
+
+    def _mapear(self, fragmento: str):
+        ruta = os.path.join(self.directorio, fragmento)
+        filas = os.path.getsize(ruta) // BYTES_REGISTRO
+        return np.memmap(ruta, dtype=np.float16, mode="r", shape=(filas, *FORMA_REGISTRO))
+
+    def lotes(self, tamano_lote: int = 256, log_ids=None):
+        """
+        Genera (log_ids_por_ventana, X) con X de forma (b, 128, 216, 1) en float16.
+        Con `log_ids` solo se incluyen esas inferencias (la selección sí copia).
+        """
+        seleccion = set(log_ids) if log_ids is not None else None
+
+        for fragmento, entradas in sorted(self.indice.items()):
+            datos = self._mapear(fragmento)
+
+            # log_id de cada fila del fragmento (-1 = sin índice)
+            propietario = np.full(len(datos), -1, dtype=np.int64)
+            for log_id, fila, n in entradas:
+                if fila + n <= len(datos) and (seleccion is None or log_id in seleccion):
+                    propietario[fila:fila + n] = log_id
+
+            validas = propietario >= 0
+            if validas.all():
+                for i in range(0, len(datos), tamano_lote):
+                    yield propietario[i:i + tamano_lote], datos[i:i + tamano_lote, ..., np.newaxis]
+                continue
+
+            filas = np.flatnonzero(validas)
+            for i in range(0, len(filas), tamano_lote):
+                bloque = filas[i:i + tamano_lote]
+                yield propietario[bloque], datos[bloque][..., np.newaxis]
+
+    def leer(self, log_id: int) -> np.ndarray | None:
+        for fragmento, entradas in self.indice.items():
+            for id_, fila, n in entradas:
+                if id_ == log_id:
+                    return self._mapear(fragmento)[fila:fila + n, ..., np.newaxis]
+        return None
@@ -0,0 +1,188 @@
+# servicios/auditoria_sesiones.py
+# Escritura diferida (write-behind) de la auditoría de inicios de sesión.
+#
+# El login encola el registro de SesionUsuario y responde sin esperar a la BD.
+# Un hilo agrupa los registros y los inserta en una sola sentencia multi-fila
+# cuando hay AUDITORIA_LOTE pendientes o el más antiguo lleva AUDITORIA_ESPERA_S
+# en la cola. La cola está acotada: si se llena (BD caída durante una avalancha
+# de logins) los registros nuevos se descartan y se cuentan, el login no se frena.
+# Al apagar la aplicación se vacía la cola antes de cerrar.
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import insert
+
+from db.database import SessionLocal
+from db.modelos import SesionUsuario
+from servicios.metricas import cronometrar_bd, medidor
+
+# ---------------- CONFIGURACIÓN ----------------
+AUDITORIA_COLA_MAX = int(os.getenv("AUDITORIA_COLA_MAX", "10000"))
+AUDITORIA_LOTE = int(os.getenv("AUDITORIA_LOTE", "200"))
+AUDITORIA_ESPERA_S = float(os.getenv("AUDITORIA_ESPERA_S", "1"))
+AUDITORIA_REINTENTOS = int(os.getenv("AUDITORIA_REINTENTOS", "3"))
+AUDITORIA_DRENAJE_S = float(os.getenv("AUDITORIA_DRENAJE_S", "10"))
+
+
+@cronometrar_bd("registrar_sesiones_lote")
+def insertar_sesiones(registros: list):
+    db = SessionLocal()
+    try:
+        db.execute(insert(SesionUsuario), registros)
+        db.commit()
+    finally:
+        db.close()
+
+
+class AuditoriaSesiones:
+    def __init__(
+        self,
+        cola_max: int = AUDITORIA_COLA_MAX,
+        lote: int = AUDITORIA_LOTE,
+        espera_s: float = AUDITORIA_ESPERA_S,
+        reintentos: int = AUDITORIA_REINTENTOS,
+        escribir=insertar_sesiones
+    ):
+        self.lote = lote
+        self.espera_s = espera_s
+        self.reintentos = reintentos
+        self.escribir = escribir
+        self.cola = queue.Queue(maxsize=cola_max)
+
+        self._hilo = None
+        self._detener = threading.Event()
+        self._lock = threading.Lock()
+        self._encolados = 0
+        self._escritos = 0
+        self._lotes = 0
+        self._descartados_cola_llena = 0
+        self._descartados_error = 0
+
+    # ---------------- API ----------------
+
+    def registrar(
+        self,
+        id_usuario: int | None,
+        estado: str,
+        ip: str = None,
+        agente: str = None,
+        observacion: str = None
+    ):
+        """Encola un registro de SesionUsuario; nunca bloquea."""
+        if id_usuario is None:
+            return  # Igual que registrar_sesion_usuario_fallido: sin usuario no se registra
+
+        self._arrancar_hilo()
+        registro = {
+            "id_usuario": id_usuario,
+            "estado": estado,
+            "ip_origen": ip,
+            "agente": agente,
+            "observacion": observacion,
+            # Hora del intento, no la de la escritura diferida
+            "fecha_ingreso": datetime.now(timezone.utc),
+        }
+        try:
+            self.cola.put_nowait(registro)
+        except queue.Full:
+            with self._lock:
+                self._descartados_cola_llena += 1
+            return
+
+        with self._lock:
+            self._encolados += 1
+
+    def iniciar(self):
+        """Arranque explícito (lifespan): anula una detención anterior."""
+        with self._lock:
+            self._detener.clear()
+        self._arrancar_hilo()
+
+    def _arrancar_hilo(self):
+        # Arranque perezoso desde registrar(); nunca después de detener() (apagado)
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+
+        with self._lock:
+            if self._detener.is_set():
+                return
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._bucle, name="auditoria-sesiones", daemon=True)
+                self._hilo.start()
+
+    def detener(self, timeout: float = AUDITORIA_DRENAJE_S):
+        """Escribe lo pendiente y detiene el hilo."""
+        with self._lock:
+            self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join(timeout=timeout)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "cola_max": self.cola.maxsize,
+                "pendientes": self.cola.qsize(),
+                "lote": self.lote,
+                "espera_s": self.espera_s,
+                "encolados": self._encolados,
+                "escritos": self._escritos,
+                "lotes_escritos": self._lotes,
+                "descartados_cola_llena": self._descartados_cola_llena,
+                "descartados_error_bd": self._descartados_error,
+            }
+
+    # ---------------- HILO DE ESCRITURA ----------------
+
+    def _bucle(self):
+        while True:
+            try:
+                primero = self.cola.get(timeout=self.espera_s)
+            except queue.Empty:
+                if self._detener.is_set():
+                    return
+                continue
+
+            registros = [primero]
+            limite = time.monotonic() + self.espera_s
+            while len(registros) < self.lote:
+                # Al apagar no se espera: se vacía lo que haya
+                restante = 0 if self._detener.is_set() else limite - time.monotonic()
+                try:
+                    registros.append(self.cola.get(timeout=restante) if restante > 0 else self.cola.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._escribir_lote(registros)
+
+    def _escribir_lote(self, registros: list):
+        for intento in range(self.reintentos):
+            try:
+                self.escribir(registros)
+            except Exception:
+                if intento + 1 < self.reintentos and not self._detener.is_set():
+                    time.sleep(self.espera_s * (intento + 1))
+                continue
+
+            with self._lock:
+                self._escritos += len(registros)
+                self._lotes += 1
+            return
+
+        with self._lock:
+            self._descartados_error += len(registros)
+
+
+auditoria = AuditoriaSesiones()
+
+medidor("auditoria_sesiones_pendientes", "Registros de inicio de sesión esperando a escribirse.", lambda: auditoria.cola.qsize())
+medidor(
+    "auditoria_sesiones_descartadas_total", "Registros de inicio de sesión perdidos por cola llena o error de BD.",
+    lambda: {
+        ("cola_llena",): auditoria.estadisticas()["descartados_cola_llena"],
+        ("error_bd",): auditoria.estadisticas()["descartados_error_bd"],
+    },
+    ("motivo",), tipo="counter"
+)
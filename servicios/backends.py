@@ -0,0 +1,138 @@
+# servicios/backends.py
+import hashlib
+import os
+import threading
+
+import numpy as np
+
+# ---------------- CONFIGURACIÓN ----------------
+MODEL_DIR = "modelo_cnn"
+MODEL_PATH = os.path.join(MODEL_DIR, "best_model.keras")
+
+# Nombre del backend -> archivo del modelo dentro de MODEL_DIR
+BACKENDS = {
+    "keras": "best_model.keras",
+    "tflite": "best_model.tflite",
+    "tflite_dinamico": "best_model_dinamico.tflite",
+    "tflite_float16": "best_model_float16.tflite",
+}
+
+BACKEND = os.getenv("INFERENCIA_BACKEND", "keras")
+TFLITE_HILOS = int(os.getenv("TFLITE_HILOS", "0")) or None
+
+
+def ruta_modelo(nombre: str, directorio: str = MODEL_DIR) -> str:
+    if nombre not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {nombre}. Opciones: {list(BACKENDS)}")
+    return os.path.join(directorio, BACKENDS[nombre])
+
+
+def version_modelo(ruta: str) -> str:
+    """Huella del archivo del modelo: cambia si se reemplaza el modelo aunque conserve el nombre."""
+    h = hashlib.sha256()
+    with open(ruta, "rb") as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(bloque)
+    return h.hexdigest()[:16]
+
+# ------------------------------------------------------------------
+# BACKEND KERAS (comportamiento original)
+# ------------------------------------------------------------------
+
+class BackendKeras:
+    def __init__(self, ruta: str = MODEL_PATH):
+        import tensorflow as tf
+
+        self.nombre = "keras"
+        self.ruta = ruta
+        self.version = version_modelo(ruta)
+        self.modelo = tf.keras.models.load_model(ruta)
+
+    def predecir(self, X: np.ndarray) -> np.ndarray:
+        return np.asarray(self.modelo.predict_on_batch(X))
+
+# ------------------------------------------------------------------
+# BACKEND TFLITE (float32, rango dinámico o float16)
+# ------------------------------------------------------------------
+
+def _interprete_tflite():
+    # tflite_runtime evita cargar TensorFlow completo en el contenedor
+    try:
+        from tflite_runtime.interpreter import Interpreter
+    except ImportError:
+        import tensorflow as tf
+        Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class BackendTFLite:
+    def __init__(self, ruta: str, nombre: str = "tflite", hilos: int | None = TFLITE_HILOS):
+        Interpreter = _interprete_tflite()
+
+        self.nombre = nombre
+        self.ruta = ruta
+        self.version = version_modelo(ruta)
+        self.interprete = Interpreter(model_path=ruta, num_threads=hilos)
+        self.interprete.allocate_tensors()
+
+        self._entrada = self.interprete.get_input_details()[0]
+        self._salida = self.interprete.get_output_details()[0]
+        self._forma = tuple(self._entrada["shape"])
+        # El intérprete no es seguro entre hilos
+        self._lock = threading.Lock()
+
+    def predecir(self, X: np.ndarray) -> np.ndarray:
+        X = np.ascontiguousarray(X, dtype=self._entrada["dtype"])
+
+        with self._lock:
+            if X.shape != self._forma:
+                self.interprete.resize_tensor_input(self._entrada["index"], X.shape)
+                self.interprete.allocate_tensors()
+                self._forma = X.shape
+
+            self.interprete.set_tensor(self._entrada["index"], X)
+            self.interprete.invoke()
+            return self.interprete.get_tensor(self._salida["index"]).copy()
+
+# ------------------------------------------------------------------
+# SELECCIÓN DEL BACKEND
+# ------------------------------------------------------------------
+
+def cargar_backend(nombre: str = BACKEND, directorio: str = MODEL_DIR):
+    ruta = ruta_modelo(nombre, directorio)
+
+    if nombre == "keras":
+        return BackendKeras(ruta)
+
+    if not os.path.exists(ruta):
+        raise FileNotFoundError(
+            f"No existe {ruta}. Genérelo con: python -m herramientas.convertir_modelo --variantes {nombre}"
+        )
+
+    return BackendTFLite(ruta, nombre=nombre)
+
+# ------------------------------------------------------------------
+# CONVERSIÓN KERAS -> TFLITE
+# ------------------------------------------------------------------
+
+def convertir_a_tflite(ruta_keras: str, variante: str) -> bytes:
+    import tempfile
+    import tensorflow as tf
+
+    if variante not in BACKENDS or variante == "keras":
+        raise ValueError(f"Variante TFLite desconocida: {variante}")
+
+    modelo = tf.keras.models.load_model(ruta_keras)
+
+    # Keras 3 convierte de forma fiable a través de un SavedModel con lote dinámico
+    with tempfile.TemporaryDirectory() as tmp:
+        modelo.export(tmp)
+        converter = tf.lite.TFLiteConverter.from_saved_model(tmp)
+
+        if variante == "tflite_dinamico":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        elif variante == "tflite_float16":
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+            converter.target_spec.supported_types = [tf.float16]
+
+        return converter.convert()
@@ -0,0 +1,171 @@
+# servicios/cache_predicciones.py
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from time import monotonic
+from typing import NamedTuple
+
+from sqlalchemy.orm import Session
+from db.modelos import CachePrediccion
+
+# ---------------- CONFIGURACIÓN ----------------
+CACHE_PREDICCIONES_MAX = int(os.getenv("CACHE_PREDICCIONES_MAX", "1024"))
+CACHE_PREDICCIONES_TTL_S = float(os.getenv("CACHE_PREDICCIONES_TTL_S", str(24 * 3600)))
+# Copia persistente en la tabla cache_predicciones (compartida entre workers y reinicios)
+CACHE_PREDICCIONES_BD = os.getenv("CACHE_PREDICCIONES_BD", "0") == "1"
+
+
+class PrediccionCacheada(NamedTuple):
+    resultados: list
+    duracion: float
+
+
+def clave_prediccion(huella_audio: str, version_modelo: str, parametros: dict) -> str:
+    """Clave por contenido: bytes del audio + versión del modelo + parámetros de preprocesado."""
+    material = json.dumps(
+        {"audio": huella_audio, "modelo": version_modelo, "parametros": parametros},
+        sort_keys=True
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class CachePredicciones:
+    """Top-5 por clave de contenido: LRU + TTL en memoria y, opcionalmente, en la BD."""
+
+    def __init__(
+        self,
+        max_entradas: int = CACHE_PREDICCIONES_MAX,
+        ttl: float = CACHE_PREDICCIONES_TTL_S,
+        persistir: bool = CACHE_PREDICCIONES_BD
+    ):
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.persistir = persistir
+
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self._aciertos = 0
+        self._aciertos_bd = 0
+        self._fallos = 0
+        self._errores_bd = 0
+
+    # ---------------- MEMORIA ----------------
+
+    def _leer_memoria(self, clave: str):
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+
+            vence, valor = entrada
+            if monotonic() >= vence:
+                del self._entradas[clave]
+                return None
+
+            self._entradas.move_to_end(clave)
+            return valor
+
+    def _guardar_memoria(self, clave: str, valor: PrediccionCacheada):
+        if self.max_entradas <= 0:
+            return
+        with self._lock:
+            self._entradas[clave] = (monotonic() + self.ttl, valor)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+    # ---------------- BASE DE DATOS ----------------
+
+    def _leer_bd(self, db: Session, clave: str):
+        limite = datetime.now(timezone.utc) - timedelta(seconds=self.ttl)
+        fila = (
+            db.query(CachePrediccion.resultados, CachePrediccion.duracion)
+            .filter(CachePrediccion.clave == clave, CachePrediccion.fecha_creacion >= limite)
+            .first()
+        )
+        return PrediccionCacheada(fila.resultados, fila.duracion) if fila else None
+
+    def _guardar_bd(self, db: Session, clave: str, version_modelo: str, valor: PrediccionCacheada):
+        db.merge(CachePrediccion(
+            clave=clave,
+            version_modelo=version_modelo,
+            resultados=valor.resultados,
+            duracion=valor.duracion,
+            # Explícita: merge sobre una clave existente no aplica el server_default,
+            # y una fila vencida se reescribiría siempre vencida
+            fecha_creacion=datetime.now(timezone.utc)
+        ))
+        db.commit()
+
+    # ---------------- API ----------------
+
+    def obtener(self, clave: str, db: Session | None = None) -> PrediccionCacheada | None:
+        valor = self._leer_memoria(clave)
+        if valor is not None:
+            self._contar("_aciertos")
+            return valor
+
+        if self.persistir and db is not None:
+            try:
+                valor = self._leer_bd(db, clave)
+            except Exception:
+                db.rollback()
+                self._contar("_errores_bd")
+                valor = None
+
+            if valor is not None:
+                self._guardar_memoria(clave, valor)
+                self._contar("_aciertos_bd")
+                return valor
+
+        self._contar("_fallos")
+        return None
+
+    def guardar(
+        self,
+        clave: str,
+        resultados: list,
+        duracion: float,
+        version_modelo: str,
+        db: Session | None = None
+    ):
+        valor = PrediccionCacheada(resultados, duracion)
+        self._guardar_memoria(clave, valor)
+
+        if self.persistir and db is not None:
+            try:
+                self._guardar_bd(db, clave, version_modelo, valor)
+            except Exception:
+                # La caché nunca hace fallar una inferencia
+                db.rollback()
+                self._contar("_errores_bd")
+
+    def vaciar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def _contar(self, contador: str):
+        with self._lock:
+            setattr(self, contador, getattr(self, contador) + 1)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            aciertos = self._aciertos + self._aciertos_bd
+            consultas = aciertos + self._fallos
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_s": self.ttl,
+                "persistente_bd": self.persistir,
+                "aciertos_memoria": self._aciertos,
+                "aciertos_bd": self._aciertos_bd,
+                "fallos": self._fallos,
+                "tasa_aciertos": aciertos / consultas if consultas else 0.0,
+                "errores_bd": self._errores_bd,
+            }
+
+
+cache = CachePredicciones()
@@ -0,0 +1,96 @@
+# servicios/cascada.py
+# Cascada por confianza: un modelo rápido (p. ej. tflite_dinamico) clasifica primero
+# y solo las ventanas dudosas pasan al modelo completo.
+#
+# Una ventana escala si la probabilidad top-1 de la primera etapa es menor que
+# CASCADA_UMBRAL_PROB o si el margen top-1 - top-2 es menor que CASCADA_UMBRAL_MARGEN.
+# La decisión es por ventana (fila del lote), así que funciona igual con el
+# micro-batching del planificador, el modo ventanas y las grabaciones largas.
+# `python -m herramientas.evaluar_cascada` mide exactitud y latencia por umbral.
+import os
+import threading
+from collections import deque
+from time import perf_counter
+
+import numpy as np
+
+# ---------------- CONFIGURACIÓN ----------------
+# Backend de la primera etapa (vacío = sin cascada); se carga del mismo directorio de versión
+CASCADA_BACKEND = os.getenv("CASCADA_BACKEND", "")
+CASCADA_UMBRAL_PROB = float(os.getenv("CASCADA_UMBRAL_PROB", "0.9"))
+CASCADA_UMBRAL_MARGEN = float(os.getenv("CASCADA_UMBRAL_MARGEN", "0.5"))
+
+_MUESTRAS_LATENCIA = 1000
+
+
+def ventanas_a_escalar(P: np.ndarray, umbral_prob: float, umbral_margen: float) -> np.ndarray:
+    """Máscara (n,) de filas cuya predicción de primera etapa no es concluyente."""
+    dos = np.sort(P, axis=1)[:, -2:]
+    top1, top2 = dos[:, 1], dos[:, 0]
+    return (top1 < umbral_prob) | (top1 - top2 < umbral_margen)
+
+
+class ModeloCascada:
+    """Misma interfaz que los backends (predecir, nombre, version, ruta)."""
+
+    def __init__(
+        self,
+        primera,
+        completa,
+        umbral_prob: float = CASCADA_UMBRAL_PROB,
+        umbral_margen: float = CASCADA_UMBRAL_MARGEN
+    ):
+        self.primera = primera
+        self.completa = completa
+        self.umbral_prob = umbral_prob
+        self.umbral_margen = umbral_margen
+
+        self.nombre = f"cascada({primera.nombre}->{completa.nombre})"
+        self.ruta = completa.ruta
+        # Los umbrales cambian las predicciones: forman parte de la versión (y de la clave de caché)
+        self.version = f"{completa.version}+{primera.version}@{umbral_prob:g}/{umbral_margen:g}"
+
+        self._lock = threading.Lock()
+        self._ventanas = 0
+        self._escaladas = 0
+        self._latencia_primera = deque(maxlen=_MUESTRAS_LATENCIA)
+        self._latencia_completa = deque(maxlen=_MUESTRAS_LATENCIA)
+
+    def predecir(self, X: np.ndarray) -> np.ndarray:
+        inicio = perf_counter()
+        P = np.array(self.primera.predecir(X), dtype=np.float32)
+        latencia_primera = perf_counter() - inicio
+
+        escalar = ventanas_a_escalar(P, self.umbral_prob, self.umbral_margen)
+        latencia_completa = None
+        if escalar.any():
+            inicio = perf_counter()
+            P[escalar] = self.completa.predecir(X if escalar.all() else X[escalar])
+            latencia_completa = perf_counter() - inicio
+
+        with self._lock:
+            self._ventanas += len(X)
+            self._escaladas += int(escalar.sum())
+            self._latencia_primera.append(latencia_primera)
+            if latencia_completa is not None:
+                self._latencia_completa.append(latencia_completa)
+
+        return P
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            ventanas, escaladas = self._ventanas, self._escaladas
+            primera = np.array(self._latencia_primera) * 1000
+            completa = np.array(self._latencia_completa) * 1000
+
+        return {
+            "primera_etapa": self.primera.nombre,
+            "modelo_completo": self.completa.nombre,
+            "umbral_prob": self.umbral_prob,
+            "umbral_margen": self.umbral_margen,
+            "ventanas": ventanas,
+            "escaladas": escaladas,
+            "tasa_escalado": escaladas / ventanas if ventanas else 0.0,
+            "latencia_primera_p50_ms": float(np.percentile(primera, 50)) if len(primera) else None,
+            "latencia_completa_p50_ms": float(np.percentile(completa, 50)) if len(completa) else None,
+        }
@@ -0,0 +1,181 @@
+# servicios/catalogo_especies.py
+import json
+import os
+import threading
+from time import monotonic, sleep
+from typing import NamedTuple
+
+from db.database import SessionLocal
+from db.modelos import Ave
+
+# ---------------- CONFIGURACIÓN ----------------
+RUTA_ETIQUETAS = os.path.join("modelo_cnn", "idx2label.json")
+CATALOGO_TTL_S = float(os.getenv("CATALOGO_TTL_S", "600"))
+# Si la recarga falla se siguen sirviendo los datos anteriores y se reintenta tras este tiempo
+CATALOGO_REINTENTO_S = float(os.getenv("CATALOGO_REINTENTO_S", "30"))
+# Primera espera de la carga en segundo plano; se duplica hasta CATALOGO_REINTENTO_S
+CATALOGO_REINTENTO_MIN_S = 1.0
+
+
+class Especie(NamedTuple):
+    id_ave: int
+    nombre_cientifico: str
+    nombre: str | None
+    url_imagen: str | None
+    url_audio: str | None
+
+
+class CatalogoEspecies:
+    """
+    Copia en memoria de la tabla `aves` + idx2label.json, indexada por índice
+    de clase del modelo y por nombre científico. Se recarga al vencer el TTL
+    o al invalidarla desde administración.
+    """
+
+    def __init__(self, crear_sesion=SessionLocal, ruta_etiquetas: str = RUTA_ETIQUETAS, ttl: float = CATALOGO_TTL_S):
+        self.crear_sesion = crear_sesion
+        self.ruta_etiquetas = ruta_etiquetas
+        self.ttl = ttl
+
+        self._lock = threading.Lock()
+        self._por_indice = None
+        self._por_nombre = {}
+        self._etiquetas = {}
+        self._vence = 0.0
+        self._recargando = False
+        self._cargado_en = None
+        self._recargas = 0
+        self._errores = 0
+
+    # ---------------- CARGA ----------------
+
+    def _leer_etiquetas(self) -> dict:
+        if not os.path.exists(self.ruta_etiquetas):
+            return {}
+        with open(self.ruta_etiquetas, encoding="utf-8") as f:
+            return {int(k): v for k, v in json.load(f).items()}
+
+    def _leer_aves(self) -> list:
+        db = self.crear_sesion()
+        try:
+            filas = db.query(
+                Ave.id_ave, Ave.nombre_cientifico, Ave.nombre, Ave.url_imagen, Ave.url_audio
+            ).order_by(Ave.id_ave).all()
+        finally:
+            db.close()
+        return [Especie(*fila) for fila in filas]
+
+    def _cargar(self):
+        etiquetas = self._leer_etiquetas()
+        especies = self._leer_aves()
+
+        # El índice de clase del modelo coincide con aves.id_ave
+        self._por_indice = {e.id_ave: e for e in especies}
+        self._por_nombre = {e.nombre_cientifico: e for e in especies}
+        self._etiquetas = etiquetas
+        self._cargado_en = monotonic()
+        self._vence = self._cargado_en + self.ttl
+        self._recargas += 1
+
+    def _recargar(self):
+        try:
+            self._cargar()
+        except Exception:
+            self._errores += 1
+            self._vence = monotonic() + CATALOGO_REINTENTO_S
+            if self._por_indice is None:
+                raise
+        finally:
+            self._recargando = False
+
+    def _vigente(self):
+        if self._por_indice is not None and monotonic() < self._vence:
+            return
+
+        with self._lock:
+            if self._por_indice is None:
+                # Primera carga: síncrona, salvo que ya se esté cargando en segundo plano (la
+                # aplicación tras fallar al arrancar). Tras un fallo no se reintenta hasta
+                # CATALOGO_REINTENTO_S: con la BD caída cada consulta bloquearía hasta el
+                # timeout de conexión
+                if self._recargando or monotonic() < self._vence:
+                    raise RuntimeError("Catálogo de especies no disponible, se reintentará en breve.")
+                self._recargando = True
+                self._recargar()
+                return
+            if self._recargando or monotonic() < self._vence:
+                return
+            self._recargando = True
+
+        # Vencido: se siguen sirviendo los datos actuales mientras se recarga en segundo plano
+        threading.Thread(target=self._recargar, name="catalogo_especies", daemon=True).start()
+
+    def cargar(self):
+        """Carga síncrona (arranque de la aplicación)."""
+        with self._lock:
+            self._recargando = True
+            self._recargar()
+
+    def cargar_en_segundo_plano(self):
+        """
+        Primera carga en un hilo, reintentando con espera creciente hasta que la BD
+        responda (arranque de la aplicación con la BD caída). Mientras tanto las
+        consultas fallan enseguida en lugar de cargar el catálogo dentro de la petición.
+        """
+        with self._lock:
+            if self._por_indice is not None or self._recargando:
+                return
+            self._recargando = True
+        threading.Thread(target=self._reintentar_carga, name="catalogo_especies", daemon=True).start()
+
+    def _reintentar_carga(self):
+        espera = CATALOGO_REINTENTO_MIN_S
+        try:
+            while self._por_indice is None:
+                try:
+                    self._cargar()
+                except Exception:
+                    self._errores += 1
+                    sleep(espera)
+                    espera = min(espera * 2, CATALOGO_REINTENTO_S)
+        finally:
+            self._recargando = False
+
+    def invalidar(self):
+        with self._lock:
+            self._vence = 0.0
+
+    # ---------------- CONSULTAS ----------------
+
+    def por_indice(self, idx: int) -> Especie | None:
+        self._vigente()
+        especie = self._por_indice.get(int(idx))
+        if especie is None and int(idx) in self._etiquetas:
+            # Clase del modelo sin fila en `aves`: al menos el nombre de idx2label
+            return Especie(int(idx), self._etiquetas[int(idx)], None, None, None)
+        return especie
+
+    def por_nombre(self, nombre_cientifico: str) -> Especie | None:
+        self._vigente()
+        return self._por_nombre.get(nombre_cientifico)
+
+    def url_imagen(self, nombre_cientifico: str) -> str | None:
+        especie = self.por_nombre(nombre_cientifico)
+        return especie.url_imagen if especie else None
+
+    def especies(self) -> list:
+        self._vigente()
+        return list(self._por_indice.values())
+
+    def estadisticas(self) -> dict:
+        return {
+            "especies": len(self._por_indice or {}),
+            "etiquetas_modelo": len(self._etiquetas),
+            "antiguedad_s": monotonic() - self._cargado_en if self._cargado_en else None,
+            "ttl_s": self.ttl,
+            "recargas": self._recargas,
+            "errores_recarga": self._errores,
+        }
+
+
+catalogo = CatalogoEspecies()
@@ -0,0 +1,101 @@
+# servicios/compuerta_actividad.py
+# Compuerta de actividad: decide por ventana si hace falta ejecutar el modelo.
+#
+# Trabaja sobre el espectrograma mel de potencia (antes de pasar a dB), que ya
+# está limitado a la banda FMIN..FMAX del modelo. Por ventana calcula:
+#   energia_db  potencia media en dB (relativa a escala completa; en clips cortos
+#               la señal está normalizada al pico, así que es relativa al pico)
+#   planitud    planitud espectral (media geométrica / aritmética) de las tramas
+#               más tonales (percentil 10): ruido y viento ≈ 0.25-0.8, cantos < 0.15
+#   contraste   percentil 95 - mediana de la energía por trama, en dB: los cantos
+#               son transitorios, el ruido estacionario no
+# Una ventana es activa si supera la energía mínima y es tonal o transitoria.
+# `python -m herramientas.evaluar_compuerta` mide la exhaustividad perdida.
+import os
+import threading
+
+import numpy as np
+
+# ---------------- CONFIGURACIÓN ----------------
+COMPUERTA_ACTIVIDAD = os.getenv("COMPUERTA_ACTIVIDAD", "1") == "1"
+COMPUERTA_ENERGIA_MIN_DB = float(os.getenv("COMPUERTA_ENERGIA_MIN_DB", "-60"))
+COMPUERTA_PLANITUD_MAX = float(os.getenv("COMPUERTA_PLANITUD_MAX", "0.15"))
+COMPUERTA_CONTRASTE_MIN_DB = float(os.getenv("COMPUERTA_CONTRASTE_MIN_DB", "3"))
+
+AMIN = 1e-10
+
+
+class CompuertaActividad:
+    def __init__(
+        self,
+        energia_min_db: float = COMPUERTA_ENERGIA_MIN_DB,
+        planitud_max: float = COMPUERTA_PLANITUD_MAX,
+        contraste_min_db: float = COMPUERTA_CONTRASTE_MIN_DB,
+        activa: bool = COMPUERTA_ACTIVIDAD
+    ):
+        self.energia_min_db = energia_min_db
+        self.planitud_max = planitud_max
+        self.contraste_min_db = contraste_min_db
+        self.activa = activa
+
+        self._lock = threading.Lock()
+        self._evaluadas = 0
+        self._omitidas = 0
+
+    def parametros(self) -> dict:
+        """Umbrales en vigor (forman parte de la clave de la caché de predicciones)."""
+        if not self.activa:
+            return {"compuerta": False}
+        return {
+            "compuerta": True,
+            "energia_min_db": self.energia_min_db,
+            "planitud_max": self.planitud_max,
+            "contraste_min_db": self.contraste_min_db,
+        }
+
+    @staticmethod
+    def caracteristicas(P: np.ndarray) -> dict:
+        """P: potencia mel (n, n_mels, tramas) o (n_mels, tramas). Devuelve arrays (n,)."""
+        P = np.asarray(P, dtype=np.float32)
+        if P.ndim == 2:
+            P = P[np.newaxis]
+
+        energia_trama = P.mean(axis=1)                                   # (n, tramas)
+        energia_db = 10.0 * np.log10(np.maximum(AMIN, energia_trama.mean(axis=-1)))
+
+        log_p = np.log(np.maximum(AMIN, P))
+        planitud_trama = np.exp(log_p.mean(axis=1)) / np.maximum(AMIN, energia_trama)
+        planitud = np.percentile(planitud_trama, 10, axis=-1)
+
+        trama_db = 10.0 * np.log10(np.maximum(AMIN, energia_trama))
+        contraste = np.percentile(trama_db, 95, axis=-1) - np.median(trama_db, axis=-1)
+
+        return {"energia_db": energia_db, "planitud": planitud, "contraste_db": contraste}
+
+    def evaluar(self, P: np.ndarray) -> np.ndarray:
+        """Máscara booleana (n,) de ventanas que deben pasar por el modelo."""
+        c = self.caracteristicas(P)
+        if not self.activa:
+            return np.ones(len(c["energia_db"]), dtype=bool)
+
+        return (c["energia_db"] >= self.energia_min_db) & (
+            (c["planitud"] <= self.planitud_max) | (c["contraste_db"] >= self.contraste_min_db)
+        )
+
+    def registrar(self, evaluadas: int, omitidas: int):
+        with self._lock:
+            self._evaluadas += evaluadas
+            self._omitidas += omitidas
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            evaluadas, omitidas = self._evaluadas, self._omitidas
+        return {
+            **self.parametros(),
+            "ventanas_evaluadas": evaluadas,
+            "ventanas_omitidas": omitidas,
+            "fraccion_omitida": omitidas / evaluadas if evaluadas else 0.0,
+        }
+
+
+compuerta = CompuertaActividad()
@@ -0,0 +1,237 @@
+# servicios/decodificacion.py
+import io
+import os
+import subprocess
+import threading
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+import numpy as np
+import soundfile as sf
+import soxr
+
+# ---------------- CONFIGURACIÓN ----------------
+TARGET_SR = 44100
+FFMPEG_PATH = os.getenv("FFMPEG_PATH", "ffmpeg")
+
+# Tipo MIME -> formato. WAV/FLAC se leen con soundfile; MP3/WebM con ffmpeg.
+FORMATOS = {
+    "audio/wav": "wav",
+    "audio/x-wav": "wav",
+    "audio/flac": "flac",
+    "audio/mpeg": "mp3",
+    "audio/mp3": "mp3",
+    "audio/webm": "webm",
+    "video/webm": "webm",
+}
+FORMATOS_SOUNDFILE = ("wav", "flac")
+
+# ------------------------------------------------------------------
+# TIEMPOS DE DECODIFICACIÓN POR FORMATO
+# ------------------------------------------------------------------
+_MUESTRAS_TIEMPOS = 1000
+_tiempos = {}
+_lock = threading.Lock()
+
+# En los procesos del pool los tiempos se acumulan aquí y viajan de vuelta
+# al proceso principal junto con el resultado (ver tiempos_recientes).
+_en_trabajador = False
+_recientes = []
+
+
+def iniciar_trabajador():
+    global _en_trabajador
+    _en_trabajador = True
+
+
+def registrar_tiempos(tiempos):
+    with _lock:
+        for clave, transcurrido in tiempos:
+            _tiempos.setdefault(clave, deque(maxlen=_MUESTRAS_TIEMPOS)).append(transcurrido)
+
+
+def tiempos_recientes() -> list:
+    with _lock:
+        recientes = _recientes[:]
+        _recientes.clear()
+    return recientes
+
+
+@contextmanager
+def _cronometro(clave: str):
+    inicio = perf_counter()
+    yield
+    transcurrido = perf_counter() - inicio
+
+    if _en_trabajador:
+        with _lock:
+            _recientes.append((clave, transcurrido))
+    else:
+        registrar_tiempos([(clave, transcurrido)])
+
+
+def estadisticas_decodificacion() -> dict:
+    with _lock:
+        copia = {clave: np.array(valores) for clave, valores in _tiempos.items()}
+
+    return {
+        clave: {
+            "muestras": len(t),
+            "media_ms": float(t.mean() * 1000),
+            "p50_ms": float(np.percentile(t, 50) * 1000),
+            "p95_ms": float(np.percentile(t, 95) * 1000),
+        }
+        for clave, t in copia.items()
+    }
+
+# ------------------------------------------------------------------
+# DECODIFICACIÓN
+# ------------------------------------------------------------------
+
+def formato_de(content_type: str) -> str | None:
+    return FORMATOS.get(content_type)
+
+
+def _abrir(fuente):
+    # soundfile acepta rutas u objetos tipo archivo
+    return io.BytesIO(fuente) if isinstance(fuente, (bytes, bytearray, memoryview)) else fuente
+
+
+def _remuestrear(y: np.ndarray, sr: int) -> np.ndarray:
+    if sr == TARGET_SR:
+        return y
+
+    # soxr HQ, igual que librosa.resample(res_type="soxr_hq"), con la misma longitud de salida
+    n = int(np.ceil(len(y) * TARGET_SR / sr))
+    with _cronometro("remuestreo"):
+        y = soxr.resample(y, sr, TARGET_SR, quality="soxr_hq")
+    return np.pad(y, (0, max(0, n - len(y))))[:n]
+
+
+def info_soundfile(fuente):
+    """(frecuencia nativa, muestras) leídas de la cabecera, o None si soundfile no lo abre."""
+    try:
+        info = sf.info(_abrir(fuente))
+    except Exception:
+        return None
+    return info.samplerate, info.frames
+
+
+def leer_soundfile(fuente) -> np.ndarray:
+    """Mono float32 remuestreado a TARGET_SR."""
+    datos, sr = sf.read(_abrir(fuente), dtype="float32", always_2d=True)
+    return _remuestrear(datos.mean(axis=1), sr)
+
+
+def leer_ffmpeg(fuente) -> np.ndarray:
+    """ffmpeg decodifica y remuestrea en un solo paso a PCM f32le mono a TARGET_SR."""
+    entrada = "pipe:0" if isinstance(fuente, (bytes, bytearray, memoryview)) else fuente
+
+    proceso = subprocess.run(
+        [
+            FFMPEG_PATH,
+            "-loglevel", "error",
+            "-i", entrada,
+            "-f", "f32le",
+            "-ac", "1",
+            "-ar", str(TARGET_SR),
+            "pipe:1"
+        ],
+        input=fuente if entrada == "pipe:0" else None,
+        capture_output=True
+    )
+
+    if proceso.returncode != 0:
+        raise RuntimeError(f"Error decodificando con ffmpeg: {proceso.stderr.decode(errors='replace')}")
+
+    return np.frombuffer(proceso.stdout, dtype="<f4")
+
+
+def decodificar_audio(fuente, content_type: str) -> np.ndarray:
+    """Decodifica bytes o una ruta a float32 mono a TARGET_SR según el tipo MIME."""
+    formato = formato_de(content_type) or "desconocido"
+
+    with _cronometro(formato):
+        if formato in FORMATOS_SOUNDFILE:
+            try:
+                return leer_soundfile(fuente)
+            except sf.LibsndfileError:
+                # Códecs dentro de WAV que libsndfile no soporta
+                pass
+        return leer_ffmpeg(fuente)
+
+# ------------------------------------------------------------------
+# DECODIFICACIÓN POR BLOQUES (GRABACIONES LARGAS)
+# ------------------------------------------------------------------
+
+def _bloques_soundfile(fuente, muestras_bloque: int):
+    with sf.SoundFile(_abrir(fuente)) as f:
+        sr = f.samplerate
+        flujo = soxr.ResampleStream(sr, TARGET_SR, 1, dtype="float32", quality="HQ") if sr != TARGET_SR else None
+        # Bloques nativos que producen ~muestras_bloque muestras a TARGET_SR
+        nativas = max(1, int(muestras_bloque * sr / TARGET_SR))
+
+        while True:
+            datos = f.read(nativas, dtype="float32", always_2d=True)
+            ultimo = len(datos) < nativas
+            y = datos.mean(axis=1)
+
+            if flujo is not None:
+                y = flujo.resample_chunk(y, last=ultimo)
+            if len(y):
+                yield y
+            if ultimo:
+                return
+
+
+def _bloques_ffmpeg(fuente, muestras_bloque: int):
+    entrada = "pipe:0" if isinstance(fuente, (bytes, bytearray, memoryview)) else fuente
+    proceso = subprocess.Popen(
+        [FFMPEG_PATH, "-loglevel", "error", "-i", entrada, "-f", "f32le", "-ac", "1", "-ar", str(TARGET_SR), "pipe:1"],
+        stdin=subprocess.PIPE if entrada == "pipe:0" else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE
+    )
+
+    # stdin se escribe en otro hilo para no bloquear la lectura de stdout
+    escritor = None
+    if entrada == "pipe:0":
+        def escribir():
+            try:
+                proceso.stdin.write(fuente)
+            except BrokenPipeError:
+                pass
+            finally:
+                proceso.stdin.close()
+        escritor = threading.Thread(target=escribir, daemon=True)
+        escritor.start()
+
+    try:
+        while True:
+            datos = proceso.stdout.read(muestras_bloque * 4)
+            if not datos:
+                break
+            yield np.frombuffer(datos[:len(datos) // 4 * 4], dtype="<f4")
+    finally:
+        proceso.stdout.close()
+        if proceso.poll() is None:
+            proceso.kill()
+        codigo = proceso.wait()
+        error = proceso.stderr.read().decode(errors="replace")
+        proceso.stderr.close()
+        if escritor is not None:
+            escritor.join()
+
+    if codigo != 0:
+        raise RuntimeError(f"Error decodificando con ffmpeg: {error}")
+
+
+def bloques_audio(fuente, content_type: str, muestras_bloque: int = TARGET_SR * 10):
+    """Genera bloques float32 mono a TARGET_SR sin cargar la señal completa en memoria."""
+    formato = formato_de(content_type) or "desconocido"
+
+    if formato in FORMATOS_SOUNDFILE and info_soundfile(fuente) is not None:
+        yield from _bloques_soundfile(fuente, muestras_bloque)
+    else:
+        yield from _bloques_ffmpeg(fuente, muestras_bloque)
@@ -0,0 +1,142 @@
+# servicios/ejecucion.py
+import asyncio
+import functools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from servicios.decodificacion import iniciar_trabajador
+from servicios.metricas import medidor
+
+# ---------------- CONFIGURACIÓN ----------------
+# Procesos para decodificación y log-mel (0 = hilos en el proceso principal)
+POOL_PREPROCESO_PROCESOS = int(os.getenv("POOL_PREPROCESO_PROCESOS", str(min(2, os.cpu_count() or 1))))
+POOL_PREPROCESO_COLA = int(os.getenv("POOL_PREPROCESO_COLA", "16"))
+
+# Hilos para el trabajo síncrono con SQLAlchemy
+POOL_BD_HILOS = int(os.getenv("POOL_BD_HILOS", "8"))
+POOL_BD_COLA = int(os.getenv("POOL_BD_COLA", "64"))
+
+
+class ServidorSaturado(Exception):
+    """Un ejecutor alcanzó su máximo de tareas pendientes."""
+
+
+class EjecutorAcotado:
+    """
+    Ejecutor con un máximo de tareas en curso + en espera. Cuando se llena,
+    `ejecutar` falla de inmediato con ServidorSaturado en lugar de encolar
+    más latencia; el endpoint responde 503.
+    """
+
+    def __init__(self, nombre: str, crear_executor, trabajadores: int, max_pendientes: int):
+        self.nombre = nombre
+        self.trabajadores = trabajadores
+        self.max_pendientes = max_pendientes
+
+        self._crear_executor = crear_executor
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._rechazadas = 0
+        self._completadas = 0
+
+    def _obtener_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._crear_executor(self.trabajadores)
+            return self._executor
+
+    def enviar(self, fn, *args, **kwargs) -> Future:
+        """Versión síncrona (para hilos fuera del event loop): devuelve el Future del executor."""
+        with self._lock:
+            if self._pendientes >= self.max_pendientes:
+                self._rechazadas += 1
+                raise ServidorSaturado(f"Ejecutor '{self.nombre}' saturado ({self._pendientes} tareas pendientes)")
+            self._pendientes += 1
+
+        try:
+            futuro = self._obtener_executor().submit(functools.partial(fn, *args, **kwargs))
+        except BaseException as e:
+            with self._lock:
+                self._pendientes -= 1
+                if isinstance(e, BrokenProcessPool):
+                    self._executor = None
+            raise
+
+        futuro.add_done_callback(self._terminada)
+        return futuro
+
+    def _terminada(self, futuro: Future):
+        with self._lock:
+            self._pendientes -= 1
+            self._completadas += 1
+            # Un proceso murió (p. ej. por memoria): se recrea el pool para las siguientes tareas
+            if not futuro.cancelled() and isinstance(futuro.exception(), BrokenProcessPool):
+                self._executor = None
+
+    async def ejecutar(self, fn, *args, **kwargs):
+        return await asyncio.wrap_future(self.enviar(fn, *args, **kwargs))
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                "trabajadores": self.trabajadores,
+                "pendientes": self._pendientes,
+                "max_pendientes": self.max_pendientes,
+                "completadas": self._completadas,
+                "rechazadas_saturacion": self._rechazadas,
+            }
+
+    def cerrar(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+# ------------------------------------------------------------------
+# EJECUTORES DE LA APLICACIÓN
+# ------------------------------------------------------------------
+
+def _crear_pool_preproceso(trabajadores: int):
+    if POOL_PREPROCESO_PROCESOS <= 0:
+        return ThreadPoolExecutor(max_workers=max(1, os.cpu_count() or 1), thread_name_prefix="preproceso")
+
+    # spawn: los procesos hijos no heredan TensorFlow ni los hilos del proceso principal
+    return ProcessPoolExecutor(
+        max_workers=trabajadores,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=iniciar_trabajador
+    )
+
+
+preproceso = EjecutorAcotado(
+    "preproceso",
+    _crear_pool_preproceso,
+    trabajadores=max(1, POOL_PREPROCESO_PROCESOS),
+    max_pendientes=POOL_PREPROCESO_COLA
+)
+
+bd = EjecutorAcotado(
+    "bd",
+    lambda n: ThreadPoolExecutor(max_workers=n, thread_name_prefix="bd"),
+    trabajadores=POOL_BD_HILOS,
+    max_pendientes=POOL_BD_COLA
+)
+
+
+medidor(
+    "ejecutor_pendientes", "Tareas en curso + en espera por ejecutor.",
+    lambda: {(e.nombre,): e.estadisticas()["pendientes"] for e in (preproceso, bd)}, ("ejecutor",)
+)
+medidor(
+    "ejecutor_rechazadas_total", "Tareas rechazadas por saturación (respuestas 503) por ejecutor.",
+    lambda: {(e.nombre,): e.estadisticas()["rechazadas_saturacion"] for e in (preproceso, bd)}, ("ejecutor",), tipo="counter"
+)
+
+
+def cerrar_ejecutores():
+    preproceso.cerrar()
+    bd.cerrar()
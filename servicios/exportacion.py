@@ -0,0 +1,200 @@
+# servicios/exportacion.py
+# Exportación masiva del historial de inferencias (+ metadata_audio) a CSV o Parquet.
+#
+# Las filas se leen con un cursor del lado del servidor (yield_per: psycopg2 abre
+# un cursor con nombre y trae EXPORTACION_LOTE filas por viaje) y cada lote se
+# escribe y se entrega antes de pedir el siguiente, así que la memoria no depende
+# del tamaño de la tabla. El top-5 (JSONB) se aplana en columnas top{k}_especie /
+# top{k}_probabilidad. Lo usan GET /v1/admin/logs/exportar y
+# herramientas/exportar_inferencias.py.
+#
+# Parquet necesita pyarrow, que se importa solo al exportar en ese formato.
+import csv
+import io
+import os
+from datetime import date, datetime, time, timedelta, timezone
+
+from sqlalchemy import select
+
+from db.database import SessionLocal
+from db.modelos import EjecucionInferencia, MetadatoAudio
+
+# ---------------- CONFIGURACIÓN ----------------
+EXPORTACION_LOTE = int(os.getenv("EXPORTACION_LOTE", "5000"))
+TOP_EXPORTACION = 5
+
+FORMATOS_EXPORTACION = {
+    "csv": "text/csv; charset=utf-8",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+COLUMNAS_BASE = [
+    "log_id", "fecha_ejecuta", "id_usuario", "prediccion_especie", "confianza",
+    "tiempo_ejecucion", "version_modelo",
+    "origen", "formato", "localizacion", "latitud", "longitud",
+]
+COLUMNAS_TOP = [
+    columna
+    for k in range(1, TOP_EXPORTACION + 1)
+    for columna in (f"top{k}_especie", f"top{k}_probabilidad")
+]
+COLUMNAS = COLUMNAS_BASE + COLUMNAS_TOP
+
+
+class ParquetNoDisponible(Exception):
+    pass
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ParquetNoDisponible("La exportación a Parquet necesita pyarrow (pip install pyarrow).")
+    return pyarrow
+
+
+def comprobar_formato(formato: str):
+    """ValueError si el formato no existe; ParquetNoDisponible si falta pyarrow."""
+    if formato not in FORMATOS_EXPORTACION:
+        raise ValueError(f"Formato no soportado: {formato}. Use {', '.join(FORMATOS_EXPORTACION)}.")
+    if formato == "parquet":
+        _pyarrow()
+
+# ---------------- LECTURA ----------------
+
+def consulta_exportacion(desde: date = None, hasta: date = None, especies: list = None):
+    consulta = (
+        select(
+            EjecucionInferencia.log_id,
+            EjecucionInferencia.fecha_ejecuta,
+            EjecucionInferencia.id_usuario,
+            EjecucionInferencia.prediccion_especie,
+            EjecucionInferencia.confianza,
+            EjecucionInferencia.tiempo_ejecucion,
+            EjecucionInferencia.version_modelo,
+            MetadatoAudio.origen,
+            MetadatoAudio.formato,
+            MetadatoAudio.localizacion,
+            MetadatoAudio.latitud,
+            MetadatoAudio.longitud,
+            EjecucionInferencia.top_5,
+        )
+        .outerjoin(MetadatoAudio, EjecucionInferencia.log_id == MetadatoAudio.id_inferencia)
+        .order_by(EjecucionInferencia.log_id)
+    )
+
+    # Fechas inclusivas en UTC: hasta=2026-03-31 incluye todo ese día
+    if desde is not None:
+        consulta = consulta.where(EjecucionInferencia.fecha_ejecuta >= datetime.combine(desde, time.min, timezone.utc))
+    if hasta is not None:
+        consulta = consulta.where(EjecucionInferencia.fecha_ejecuta < datetime.combine(hasta + timedelta(days=1), time.min, timezone.utc))
+    if especies:
+        consulta = consulta.where(EjecucionInferencia.prediccion_especie.in_(especies))
+    return consulta
+
+
+def aplanar_top(top_5) -> dict:
+    # top_5 es la lista de resultados_top_n: [{"nombre_cientifico", "probabilidad", ...}]
+    columnas = dict.fromkeys(COLUMNAS_TOP)
+    for k, resultado in enumerate((top_5 or [])[:TOP_EXPORTACION], start=1):
+        if isinstance(resultado, dict):
+            columnas[f"top{k}_especie"] = resultado.get("nombre_cientifico")
+            columnas[f"top{k}_probabilidad"] = resultado.get("probabilidad")
+    return columnas
+
+
+def lotes_exportacion(db, desde: date = None, hasta: date = None, especies: list = None, lote: int = EXPORTACION_LOTE):
+    """Genera listas de hasta `lote` filas ya aplanadas (dict por fila)."""
+    resultado = db.execute(consulta_exportacion(desde, hasta, especies).execution_options(yield_per=lote))
+    for filas in resultado.partitions():
+        yield [
+            {**{c: fila[i] for i, c in enumerate(COLUMNAS_BASE)}, **aplanar_top(fila.top_5)}
+            for fila in filas
+        ]
+
+# ---------------- ESCRITURA ----------------
+
+def _csv(lotes):
+    buffer = io.StringIO()
+    escritor = csv.DictWriter(buffer, fieldnames=COLUMNAS, lineterminator="\n")
+    escritor.writeheader()
+    for filas in lotes:
+        escritor.writerows(filas)
+        yield buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _Sumidero(io.RawIOBase):
+    """Archivo de solo escritura que acumula lo que escribe pyarrow hasta que se recoge."""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        datos = bytes(datos)
+        self._partes.append(datos)
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def recoger(self) -> bytes:
+        datos = b"".join(self._partes)
+        self._partes.clear()
+        return datos
+
+
+def _esquema_parquet(pa):
+    tipos = {
+        "log_id": pa.int64(),
+        "fecha_ejecuta": pa.timestamp("us", tz="UTC"),
+        "id_usuario": pa.int64(),
+        "prediccion_especie": pa.string(),
+        "confianza": pa.float64(),
+        "tiempo_ejecucion": pa.float64(),
+        "version_modelo": pa.string(),
+        "origen": pa.string(),
+        "formato": pa.string(),
+        "localizacion": pa.string(),
+        "latitud": pa.float64(),
+        "longitud": pa.float64(),
+    }
+    for k in range(1, TOP_EXPORTACION + 1):
+        tipos[f"top{k}_especie"] = pa.string()
+        tipos[f"top{k}_probabilidad"] = pa.float64()
+    return pa.schema([(c, tipos[c]) for c in COLUMNAS])
+
+
+def _parquet(lotes):
+    pa = _pyarrow()
+    esquema = _esquema_parquet(pa)
+    sumidero = _Sumidero()
+
+    # Un row group por lote leído: el escritor no retiene filas entre lotes
+    with pa.parquet.ParquetWriter(sumidero, esquema, compression="zstd") as escritor:
+        for filas in lotes:
+            escritor.write_table(pa.Table.from_pylist(filas, schema=esquema))
+            yield sumidero.recoger()
+    # El pie del archivo (metadatos de los row groups) se escribe al cerrar
+    yield sumidero.recoger()
+
+
+def exportar(formato: str, desde: date = None, hasta: date = None, especies: list = None, crear_sesion=SessionLocal):
+    """Genera los bytes del archivo exportado por trozos, con su propia sesión de BD."""
+    comprobar_formato(formato)
+    escribir = _parquet if formato == "parquet" else _csv
+
+    db = crear_sesion()
+    try:
+        yield from escribir(lotes_exportacion(db, desde, hasta, especies))
+    finally:
+        db.close()
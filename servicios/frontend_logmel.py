@@ -0,0 +1,152 @@
+# servicios/frontend_logmel.py
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import fft as sp_fft
+from scipy.signal import get_window, lfilter
+
+# ------------------------------------------------------------------
+# BANCO DE FILTROS MEL (escala y normalización Slaney, como librosa.filters.mel)
+# ------------------------------------------------------------------
+_F_SP = 200.0 / 3
+_MIN_LOG_HZ = 1000.0
+_MIN_LOG_MEL = _MIN_LOG_HZ / _F_SP
+_LOGSTEP = np.log(6.4) / 27.0
+
+
+def _hz_a_mel(f):
+    f = np.asanyarray(f, dtype=np.float64)
+    lineal = f / _F_SP
+    logaritmica = _MIN_LOG_MEL + np.log(np.maximum(f, _MIN_LOG_HZ) / _MIN_LOG_HZ) / _LOGSTEP
+    return np.where(f >= _MIN_LOG_HZ, logaritmica, lineal)
+
+
+def _mel_a_hz(m):
+    m = np.asanyarray(m, dtype=np.float64)
+    lineal = _F_SP * m
+    logaritmica = _MIN_LOG_HZ * np.exp(_LOGSTEP * (m - _MIN_LOG_MEL))
+    return np.where(m >= _MIN_LOG_MEL, logaritmica, lineal)
+
+
+def banco_mel(sr: int, n_fft: int, n_mels: int, fmin: float, fmax: float) -> np.ndarray:
+    frecuencias_fft = np.fft.rfftfreq(n_fft, d=1.0 / sr)
+    frecuencias_mel = _mel_a_hz(np.linspace(_hz_a_mel(fmin), _hz_a_mel(fmax), n_mels + 2))
+
+    diferencias = np.diff(frecuencias_mel)
+    rampas = frecuencias_mel[:, np.newaxis] - frecuencias_fft[np.newaxis, :]
+
+    inferior = -rampas[:-2] / diferencias[:-1, np.newaxis]
+    superior = rampas[2:] / diferencias[1:, np.newaxis]
+    pesos = np.maximum(0, np.minimum(inferior, superior))
+
+    pesos *= (2.0 / (frecuencias_mel[2:n_mels + 2] - frecuencias_mel[:n_mels]))[:, np.newaxis]
+
+    return pesos.astype(np.float32)
+
+# ------------------------------------------------------------------
+# FRONTEND LOG-MEL
+# ------------------------------------------------------------------
+
+class FrontendLogMel:
+    """
+    Log-mel con parámetros fijos, construido una sola vez al arrancar.
+
+    Guarda el banco de filtros mel y la ventana Hann y calcula pre-énfasis,
+    STFT, proyección mel, power_to_db y normalización min-max con NumPy/SciPy.
+    Equivale a limpiar_audio + librosa.feature.melspectrogram +
+    librosa.power_to_db(ref=np.max); se verifica con
+    `python -m herramientas.verificar_frontend`.
+    """
+
+    def __init__(
+        self,
+        sr: int,
+        n_fft: int = 2048,
+        hop_length: int = 512,
+        n_mels: int = 128,
+        fmin: float = 0.0,
+        fmax: float | None = None,
+        coef_preenfasis: float = 0.97,
+        top_db: float = 80.0,
+        amin: float = 1e-10
+    ):
+        self.sr = sr
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.coef_preenfasis = coef_preenfasis
+        self.top_db = top_db
+        self.amin = amin
+
+        self.mel = banco_mel(sr, n_fft, n_mels, fmin, fmax if fmax is not None else sr / 2)
+        self.ventana = get_window("hann", n_fft, fftbins=True).astype(np.float32)
+
+        # Solo los bins FFT con peso en algún filtro (FMIN..FMAX) entran en la proyección
+        bins = np.flatnonzero(self.mel.any(axis=0))
+        self._bins = slice(int(bins[0]), int(bins[-1]) + 1)
+        self._mel_t = np.ascontiguousarray(self.mel[:, self._bins].T)
+
+    # ---------------- LIMPIEZA ----------------
+
+    def limpiar(self, y: np.ndarray) -> np.ndarray:
+        """Normalización de pico y pre-énfasis por fila: (n,) o (lote, n)."""
+        y = np.asarray(y, dtype=np.float32)
+        y = y / (np.max(np.abs(y), axis=-1, keepdims=True) + 1e-9)
+
+        # Condición inicial por extrapolación lineal, igual que librosa.effects.preemphasis
+        zi = 2 * y[..., 0:1] - y[..., 1:2]
+        b = np.asarray([1.0, -self.coef_preenfasis], dtype=y.dtype)
+        a = np.asarray([1.0], dtype=y.dtype)
+
+        y, _ = lfilter(b, a, y, axis=-1, zi=zi)
+        return y.astype(np.float32, copy=False)
+
+    # ---------------- ESPECTROGRAMA ----------------
+
+    def potencia_mel(self, y: np.ndarray, center: bool = True) -> np.ndarray:
+        """Espectrograma mel de potencia: (n,) -> (n_mels, frames), (lote, n) -> (lote, n_mels, frames)."""
+        y = np.asarray(y, dtype=np.float32)
+
+        if center:
+            relleno = [(0, 0)] * (y.ndim - 1) + [(self.n_fft // 2, self.n_fft // 2)]
+            y = np.pad(y, relleno, mode="constant")
+
+        tramas = sliding_window_view(y, self.n_fft, axis=-1)[..., ::self.hop_length, :]
+        # scipy.fft conserva float32 (numpy.fft promueve a float64)
+        espectro = sp_fft.rfft(tramas * self.ventana, axis=-1)[..., self._bins]
+        potencia = np.square(np.abs(espectro))
+
+        return np.swapaxes(potencia @ self._mel_t, -1, -2)
+
+    def potencia_a_db(self, S: np.ndarray) -> np.ndarray:
+        """power_to_db con ref=np.max y top_db, por espectrograma."""
+        referencia = np.max(S, axis=(-2, -1), keepdims=True)
+
+        S_db = 10.0 * np.log10(np.maximum(self.amin, S))
+        S_db -= 10.0 * np.log10(np.maximum(self.amin, referencia))
+
+        return np.maximum(S_db, np.max(S_db, axis=(-2, -1), keepdims=True) - self.top_db)
+
+    @staticmethod
+    def normalizar(S_db: np.ndarray) -> np.ndarray:
+        minimo = np.min(S_db, axis=(-2, -1), keepdims=True)
+        maximo = np.max(S_db, axis=(-2, -1), keepdims=True)
+        return (S_db - minimo) / (maximo - minimo + 1e-9)
+
+    def logmel(self, y: np.ndarray, center: bool = True, limpiar: bool = False) -> np.ndarray:
+        """Log-mel normalizado en [0, 1]. Acepta una señal o un lote de señales de igual longitud."""
+        if limpiar:
+            y = self.limpiar(y)
+        return self.normalizar(self.potencia_a_db(self.potencia_mel(y, center=center)))
+
+    def logmel_lote(self, senales, center: bool = True, limpiar: bool = True) -> list:
+        """Lote de señales de longitudes distintas: agrupa las de igual longitud en una sola llamada."""
+        resultados = [None] * len(senales)
+        grupos = {}
+        for i, y in enumerate(senales):
+            grupos.setdefault(len(y), []).append(i)
+
+        for indices in grupos.values():
+            S = self.logmel(np.stack([senales[i] for i in indices]), center=center, limpiar=limpiar)
+            for i, s in zip(indices, S):
+                resultados[i] = s
+
+        return resultados
@@ -0,0 +1,317 @@
+# servicios/grabaciones_largas.py
+# Grabaciones largas (horas de audio): línea de tiempo de detecciones con memoria acotada.
+#
+# El audio se decodifica por bloques (decodificacion.bloques_audio) y el log-mel se
+# calcula de forma incremental: solo se guardan las muestras que aún no completan
+# una trama STFT y las tramas mel de la ventana en curso. Las ventanas de
+# TARGET_FRAMES pasan por la compuerta de actividad (servicios/compuerta_actividad.py)
+# y las activas se agrupan en lotes de LARGAS_LOTE para el modelo.
+#
+# Diferencias con el modo ventanas de preprocesado (que normaliza el clip completo):
+#  - Sin normalización de pico: power_to_db(ref=np.max) y la min-max son invariantes a escala.
+#  - La pre-énfasis arrastra el estado del filtro entre bloques y las tramas STFT
+#    coinciden con las de center=True sobre la señal completa.
+#  - power_to_db y la min-max se aplican por ventana, como en el modo centro,
+#    porque el máximo global no se conoce hasta el final de la grabación.
+import os
+from time import perf_counter
+
+import numpy as np
+from scipy.signal import lfilter
+
+from servicios.catalogo_especies import catalogo
+from servicios.compuerta_actividad import compuerta as compuerta_actividad
+from servicios.decodificacion import TARGET_SR, bloques_audio
+from servicios.preprocesado import HOP_LENGTH, N_FFT, N_MELS, TARGET_FRAMES, frontend
+
+# ---------------- CONFIGURACIÓN ----------------
+# Salto entre ventanas en tramas (216 tramas ≈ 2,5 s a 44,1 kHz; 108 = solape del 50 %)
+LARGAS_SALTO = int(os.getenv("LARGAS_SALTO", str(TARGET_FRAMES // 2)))
+LARGAS_LOTE = int(os.getenv("LARGAS_LOTE", "32"))
+LARGAS_UMBRAL = float(os.getenv("LARGAS_UMBRAL", "0.5"))
+LARGAS_BLOQUE_S = float(os.getenv("LARGAS_BLOQUE_S", "10"))
+
+
+class DuracionExcedida(Exception):
+    def __init__(self, max_duracion: float):
+        super().__init__(f"Duración máxima excedida: más de {max_duracion:.0f}s")
+        self.max_duracion = max_duracion
+
+# ------------------------------------------------------------------
+# LOG-MEL INCREMENTAL
+# ------------------------------------------------------------------
+
+class LogMelIncremental:
+    """
+    Recibe bloques de audio a TARGET_SR y devuelve las ventanas de potencia mel
+    (inicio_trama, 128 x 216) en cuanto están completas; la compuerta de actividad
+    y el paso a log-mel normalizado se hacen fuera, por lotes.
+    """
+
+    def __init__(self, salto: int = LARGAS_SALTO):
+        self.salto = salto
+        self.muestras = 0
+
+        self._zi = None
+        # Relleno izquierdo de center=True
+        self._pendiente = np.zeros(N_FFT // 2, dtype=np.float32)
+        self._tramas = np.empty((N_MELS, 0), dtype=np.float32)
+        self._primera = 0     # índice global de self._tramas[:, 0]
+        self._siguiente = 0   # trama inicial de la próxima ventana
+        self._cubierto = 0    # fin de la última ventana emitida
+
+    @property
+    def duracion(self) -> float:
+        return self.muestras / TARGET_SR
+
+    @property
+    def tramas(self) -> int:
+        return self._primera + self._tramas.shape[1]
+
+    def _preenfasis(self, y: np.ndarray) -> np.ndarray:
+        if self._zi is None:
+            # Extrapolación lineal en la primera muestra, igual que frontend.limpiar
+            siguiente = y[1:2] if len(y) > 1 else y[0:1]
+            self._zi = 2 * y[0:1] - siguiente
+
+        b = np.asarray([1.0, -frontend.coef_preenfasis], dtype=np.float32)
+        z, self._zi = lfilter(b, np.asarray([1.0], dtype=np.float32), y, zi=self._zi)
+        return z.astype(np.float32, copy=False)
+
+    def _transformar(self, x: np.ndarray):
+        n = 0 if len(x) < N_FFT else 1 + (len(x) - N_FFT) // HOP_LENGTH
+        if n:
+            S = frontend.potencia_mel(x[:(n - 1) * HOP_LENGTH + N_FFT], center=False)
+            self._tramas = np.concatenate([self._tramas, S.astype(np.float32, copy=False)], axis=1)
+        self._pendiente = x[n * HOP_LENGTH:]
+
+    def _ventana(self, inicio: int) -> np.ndarray:
+        S = self._tramas[:, inicio - self._primera:inicio - self._primera + TARGET_FRAMES]
+        if S.shape[1] < TARGET_FRAMES:
+            S = np.pad(S, ((0, 0), (0, TARGET_FRAMES - S.shape[1])), mode="constant")
+        return S.copy()
+
+    def _emitir(self) -> list:
+        ventanas = []
+        while self._siguiente + TARGET_FRAMES <= self.tramas:
+            ventanas.append((self._siguiente, self._ventana(self._siguiente)))
+            self._cubierto = self._siguiente + TARGET_FRAMES
+            self._siguiente += self.salto
+
+        # Se conservan las tramas de la próxima ventana y las de una posible ventana final
+        conservar = max(self._primera, min(self._siguiente, self.tramas - TARGET_FRAMES))
+        if conservar > self._primera:
+            self._tramas = self._tramas[:, conservar - self._primera:].copy()
+            self._primera = conservar
+
+        return ventanas
+
+    def agregar(self, y: np.ndarray) -> list:
+        y = np.asarray(y, dtype=np.float32)
+        if len(y) == 0:
+            return []
+
+        self.muestras += len(y)
+        self._transformar(np.concatenate([self._pendiente, self._preenfasis(y)]))
+        return self._emitir()
+
+    def finalizar(self) -> list:
+        """Relleno derecho de center=True y última ventana pegada al final (como ventanas_logmel)."""
+        if self.muestras == 0:
+            return []
+
+        self._transformar(np.concatenate([self._pendiente, np.zeros(N_FFT // 2, dtype=np.float32)]))
+        ventanas = self._emitir()
+
+        if self.tramas > self._cubierto:
+            inicio = max(0, self.tramas - TARGET_FRAMES)
+            ventanas.append((inicio, self._ventana(inicio)))
+            self._cubierto = self.tramas
+
+        return ventanas
+
+# ------------------------------------------------------------------
+# LÍNEA DE TIEMPO
+# ------------------------------------------------------------------
+
+def _especie(idx: int) -> dict:
+    ave = catalogo.por_indice(idx)
+    return {
+        "id_ave": idx,
+        "nombre_cientifico": ave.nombre_cientifico if ave else "desconocido",
+        "nombre": ave.nombre if ave and ave.nombre else "desconocido",
+    }
+
+
+class LineaTiempo:
+    """Une las ventanas consecutivas con la misma especie top-1 por encima del umbral."""
+
+    def __init__(self, umbral: float = LARGAS_UMBRAL):
+        self.umbral = umbral
+        self.detecciones = []
+        self._abierta = None
+
+    def omitir(self):
+        """Ventana descartada por la compuerta: interrumpe la detección abierta."""
+        self._cerrar()
+
+    def agregar(self, inicio: float, fin: float, probs: np.ndarray):
+        idx = int(np.argmax(probs))
+        probabilidad = float(probs[idx])
+
+        if probabilidad < self.umbral:
+            self._cerrar()
+            return
+
+        abierta = self._abierta
+        if abierta is not None and abierta["id_ave"] == idx and inicio <= abierta["fin"]:
+            abierta["fin"] = fin
+            abierta["probabilidad"] = max(abierta["probabilidad"], probabilidad)
+            abierta["ventanas"] += 1
+            return
+
+        self._cerrar()
+        self._abierta = {"inicio": inicio, "fin": fin, "id_ave": idx, "probabilidad": probabilidad, "ventanas": 1}
+
+    def _cerrar(self):
+        if self._abierta is not None:
+            self.detecciones.append(self._abierta)
+            self._abierta = None
+
+    def resultado(self) -> list:
+        self._cerrar()
+        return [
+            {
+                "inicio": round(d["inicio"], 2),
+                "fin": round(d["fin"], 2),
+                **_especie(d["id_ave"]),
+                "probabilidad": d["probabilidad"],
+                "ventanas": d["ventanas"],
+            }
+            for d in self.detecciones
+        ]
+
+# ------------------------------------------------------------------
+# ANÁLISIS COMPLETO
+# ------------------------------------------------------------------
+
+def analizar_grabacion(
+    fuente,
+    content_type: str,
+    predecir,
+    salto: int = LARGAS_SALTO,
+    umbral: float = LARGAS_UMBRAL,
+    lote: int = LARGAS_LOTE,
+    max_duracion: float = float("inf"),
+    compuerta=compuerta_actividad,
+    al_avanzar=None
+) -> dict:
+    """
+    `predecir` recibe (n, 128, 216, 1) y devuelve (n, clases): planificador.predecir
+    en la API o backend.predecir en herramientas.analizar_grabacion.
+    `al_avanzar()` se llama tras cada bloque (los trabajos renuevan ahí su arrendamiento).
+    """
+    inicio = perf_counter()
+    logmel = LogMelIncremental(salto)
+    linea = LineaTiempo(umbral)
+    # (inicio_trama, log-mel normalizado | None si la compuerta la omitió), en orden
+    pendientes = []
+    activas_pendientes = 0
+    maximo = None
+    ventanas = 0
+    omitidas = 0
+    # Ventana omitida con más energía: si ninguna pasa la compuerta, el resumen sale de ella
+    mejor_omitida = (-np.inf, None)
+    tiempo_modelo = 0.0
+
+    def tiempo_ventana(trama: int):
+        return trama * HOP_LENGTH / TARGET_SR, min(logmel.duracion, (trama + TARGET_FRAMES) * HOP_LENGTH / TARGET_SR)
+
+    def predecir_lote(S):
+        nonlocal maximo, ventanas, tiempo_modelo
+        t = perf_counter()
+        P = predecir(np.stack(S)[..., np.newaxis].astype(np.float32))
+        tiempo_modelo += perf_counter() - t
+
+        # Máximo por especie en toda la grabación (resumen top-5)
+        maximo = P.max(axis=0) if maximo is None else np.maximum(maximo, P.max(axis=0))
+        ventanas += len(S)
+        return P
+
+    def clasificar(nuevas: list):
+        # Compuerta vectorizada sobre las ventanas del bloque
+        nonlocal activas_pendientes, omitidas, mejor_omitida
+        if not nuevas:
+            return
+
+        potencia = np.stack([S for _, S in nuevas])
+        activas = compuerta.evaluar(potencia)
+        S_norm = frontend.normalizar(frontend.potencia_a_db(potencia[activas]))
+
+        j = 0
+        for (trama, _), activa in zip(nuevas, activas):
+            if activa:
+                pendientes.append((trama, S_norm[j]))
+                j += 1
+            else:
+                pendientes.append((trama, None))
+
+        if not activas.all():
+            energia = potencia.mean(axis=(1, 2))
+            k = int(np.argmax(np.where(activas, -np.inf, energia)))
+            if energia[k] > mejor_omitida[0]:
+                mejor_omitida = (energia[k], potencia[k])
+
+        activas_pendientes += int(activas.sum())
+        omitidas += int(len(activas) - activas.sum())
+
+    def vaciar():
+        nonlocal activas_pendientes
+        S = [S for _, S in pendientes if S is not None]
+        P = iter(predecir_lote(S)) if S else iter(())
+
+        for trama, S in pendientes:
+            if S is None:
+                linea.omitir()
+            else:
+                linea.agregar(*tiempo_ventana(trama), next(P))
+
+        pendientes.clear()
+        activas_pendientes = 0
+
+    for bloque in bloques_audio(fuente, content_type, int(LARGAS_BLOQUE_S * TARGET_SR)):
+        clasificar(logmel.agregar(bloque))
+        if logmel.duracion > max_duracion:
+            raise DuracionExcedida(max_duracion)
+        if activas_pendientes >= lote:
+            vaciar()
+        if al_avanzar is not None:
+            al_avanzar()
+
+    clasificar(logmel.finalizar())
+    vaciar()
+
+    compuerta.registrar(ventanas + omitidas, omitidas)
+    if ventanas == 0 and mejor_omitida[1] is not None:
+        predecir_lote([frontend.normalizar(frontend.potencia_a_db(mejor_omitida[1]))])
+
+    tiempo = perf_counter() - inicio
+    duracion = logmel.duracion
+
+    resumen = []
+    if maximo is not None:
+        for idx in np.argsort(maximo)[::-1][:5]:
+            resumen.append({**_especie(int(idx)), "probabilidad": float(maximo[idx])})
+
+    return {
+        "duracion_audio": duracion,
+        "tiempo_ejecucion": tiempo,
+        "tiempo_modelo": tiempo_modelo,
+        # RTF < 1: más rápido que tiempo real
+        "factor_tiempo_real": tiempo / duracion if duracion else None,
+        "ventanas": ventanas,
+        "ventanas_omitidas": omitidas,
+        "umbral": umbral,
+        "linea_tiempo": linea.resultado(),
+        "top_5_predicciones": resumen,
+    }
@@ -1,53 +1,76 @@
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from db.modelos import EjecucionInferencia, MetadatoAudio
+from db.modelos import EjecucionInferencia, MetadatoAudio, Usuario
+from servicios.metricas import cronometrar_bd
+from servicios.paginacion import cortar_pagina, paginar
 
 ADMIN_ROLE_ID = 0
 
+@cronometrar_bd("registrar_inferencia")
 def registrar_inferencia(
     db: Session,
     id_usuario: int | None,
     prediccion_especie: str,
     confianza: float,
     top_5: dict,
-    tiempo_ejecucion: float
+    tiempo_ejecucion: float,
+    version_modelo: str = None,
+    tiempos_etapas: dict = None
 ):
     log = EjecucionInferencia(
         id_usuario=id_usuario,
         prediccion_especie=prediccion_especie,
         confianza=confianza,
         top_5=top_5,
-        tiempo_ejecucion=tiempo_ejecucion
+        tiempo_ejecucion=tiempo_ejecucion,
+        version_modelo=version_modelo,
+        tiempos_etapas=tiempos_etapas
     )
 
     db.add(log)
     db.commit()
 
+    return log
 
-def obtener_inferencias(db: Session, usuario):
 
-    query = db.query(EjecucionInferencia)
+# Solo las columnas que devuelve el historial, con metadatos y usuario en el mismo JOIN
+COLUMNAS_HISTORIAL = (
+    EjecucionInferencia.log_id,
+    EjecucionInferencia.prediccion_especie,
+    EjecucionInferencia.confianza,
+    EjecucionInferencia.tiempo_ejecucion,
+    EjecucionInferencia.fecha_ejecuta,
+    EjecucionInferencia.top_5,
+    MetadatoAudio.localizacion,
+    MetadatoAudio.latitud,
+    MetadatoAudio.longitud,
+)
 
-    return (
-        query
-        .filter(EjecucionInferencia.id_usuario == usuario.id_usuario)
+
+def consulta_historial(cursor: str | None, limite: int, id_usuario: int = None):
+    consulta = (
+        select(*COLUMNAS_HISTORIAL, Usuario.nombre_completo)
         .outerjoin(MetadatoAudio, EjecucionInferencia.log_id == MetadatoAudio.id_inferencia)
-        .order_by(EjecucionInferencia.fecha_ejecuta.desc())
-        .all()
+        .outerjoin(Usuario, EjecucionInferencia.id_usuario == Usuario.id_usuario)
     )
+    if id_usuario is not None:
+        consulta = consulta.where(EjecucionInferencia.id_usuario == id_usuario)
+    return paginar(consulta, EjecucionInferencia.fecha_ejecuta, EjecucionInferencia.log_id, cursor, limite)
 
 
-def obtener_inferencias_admin(db: Session):
+def clave_historial(fila) -> tuple:
+    return fila.fecha_ejecuta, fila.log_id
 
-    query = db.query(EjecucionInferencia)
 
-    return (
-        query
-        .outerjoin(MetadatoAudio, EjecucionInferencia.log_id == MetadatoAudio.id_inferencia)
-        .order_by(EjecucionInferencia.fecha_ejecuta.desc())
-        .all()
-    )
+@cronometrar_bd("historial_inferencias_admin")
+def obtener_inferencias_admin(db: Session, cursor: str | None, limite: int) -> tuple:
+    """Una página del historial de todos los usuarios: (filas, cursor siguiente)."""
+    filas = db.execute(consulta_historial(cursor, limite)).all()
+    return cortar_pagina(filas, limite, clave_historial)
 
 
+@cronometrar_bd("registrar_metadata_audio")
 def registrar_metadata_audio(
     db: Session,
     *,
@@ -74,3 +97,64 @@ def registrar_metadata_audio(
     db.refresh(metadata)
 
     return metadata
+
+
+@cronometrar_bd("registrar_inferencias_lote")
+def registrar_inferencias_lote(
+    db: Session,
+    inferencias: list,
+    metadatos: list
+) -> list:
+    """
+    Inserta las inferencias de un lote en una sola sentencia (RETURNING log_id)
+    y sus metadatos en otra; metadatos[i] corresponde a inferencias[i].
+    """
+    if not inferencias:
+        return []
+
+    log_ids = db.scalars(
+        insert(EjecucionInferencia).returning(EjecucionInferencia.log_id, sort_by_parameter_order=True),
+        inferencias
+    ).all()
+
+    db.execute(
+        insert(MetadatoAudio),
+        [{**metadata, "id_inferencia": log_id} for metadata, log_id in zip(metadatos, log_ids)]
+    )
+    db.commit()
+
+    return list(log_ids)
+
+# ------------------------------------------------------------------
+# VERSIONES ASYNC (rutas con get_db_async)
+# ------------------------------------------------------------------
+
+@cronometrar_bd("registrar_inferencia_con_metadata")
+async def registrar_inferencia_con_metadata_async(
+    db: AsyncSession,
+    inferencia: dict,
+    metadata: dict
+) -> int:
+    """
+    Inferencia y sus metadatos en una sola transacción. El flush inserta la
+    inferencia con RETURNING log_id; un único commit y sin refresh.
+    """
+    try:
+        log = EjecucionInferencia(**inferencia)
+        db.add(log)
+        await db.flush()
+
+        db.add(MetadatoAudio(**metadata, id_inferencia=log.log_id))
+        await db.commit()
+    except BaseException:
+        await db.rollback()
+        raise
+
+    return log.log_id
+
+
+@cronometrar_bd("historial_inferencias")
+async def obtener_inferencias_async(db: AsyncSession, usuario, cursor: str | None, limite: int) -> tuple:
+    """Una página del historial del usuario: (filas, cursor siguiente)."""
+    filas = (await db.execute(consulta_historial(cursor, limite, usuario.id_usuario))).all()
+    return cortar_pagina(filas, limite, clave_historial)
@@ -1,4 +1,5 @@
 # servicios/logs_error.py
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from db.modelos import LogErrorSistema, Usuario
 
@@ -17,6 +18,21 @@ def registrar_error_sistema(
     db.commit()
 
 
+async def registrar_error_sistema_async(
+    db: AsyncSession,
+    mensaje_error: str,
+    fuente: str,
+    id_usuario: int
+):
+    log = LogErrorSistema(
+        mensaje_error=mensaje_error,
+        fuente=fuente,
+        id_usuario=id_usuario
+    )
+    db.add(log)
+    await db.commit()
+
+
 def obtener_logs_error(db: Session, limite: int):
     if limite == 0:
         limite = 100  # Valor por defecto si no se especifica límite
@@ -0,0 +1,236 @@
+# servicios/metricas.py
+# Métricas del proceso en formato de texto de Prometheus (GET /metrics), sin dependencias.
+#
+# Contadores e histogramas con etiquetas se actualizan en caliente; los medidores
+# (profundidad de colas) se leen de las estadísticas de cada componente al exportar.
+# Con varios workers de gunicorn cada proceso expone sus propias métricas: el
+# scrape debe ir a cada worker o agregarse fuera.
+import functools
+import inspect
+import os
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from time import perf_counter
+
+# ---------------- CONFIGURACIÓN ----------------
+METRICAS_HABILITADAS = os.getenv("METRICAS_HABILITADAS", "1") == "1"
+PREFIJO = "aves_"
+
+CUBETAS_SEGUNDOS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CUBETAS_LOTE = (1, 2, 4, 8, 16, 32, 64)
+
+_metricas = []
+_lock_registro = threading.Lock()
+
+
+def _escapar(valor: str) -> str:
+    return valor.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores, extra: str = "") -> str:
+    pares = [f'{n}="{_escapar(str(v))}"' for n, v in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return f"{valor:g}" if isinstance(valor, float) else str(valor)
+
+# ------------------------------------------------------------------
+# TIPOS DE MÉTRICA
+# ------------------------------------------------------------------
+
+class Contador:
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = ()):
+        self.nombre = PREFIJO + nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self._lock = threading.Lock()
+        self._valores = {}
+
+    def incrementar(self, *valores, cantidad: float = 1):
+        if not METRICAS_HABILITADAS:
+            return
+        with self._lock:
+            self._valores[valores] = self._valores.get(valores, 0) + cantidad
+
+    def lineas(self) -> list:
+        with self._lock:
+            copia = dict(self._valores)
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, v)} {_numero(n)}" for v, n in sorted(copia.items())]
+
+
+class Histograma:
+    tipo = "histogram"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: tuple = (), cubetas: tuple = CUBETAS_SEGUNDOS):
+        self.nombre = PREFIJO + nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.cubetas = tuple(cubetas)
+        self._lock = threading.Lock()
+        # etiquetas -> [conteos por cubeta (no acumulados) + desbordes, suma, total]
+        self._series = {}
+
+    def observar(self, valor: float, *valores):
+        if not METRICAS_HABILITADAS:
+            return
+        with self._lock:
+            serie = self._series.get(valores)
+            if serie is None:
+                serie = self._series[valores] = [[0] * (len(self.cubetas) + 1), 0.0, 0]
+            serie[0][bisect_left(self.cubetas, valor)] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def cronometro(self, *valores):
+        inicio = perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(perf_counter() - inicio, *valores)
+
+    def lineas(self) -> list:
+        with self._lock:
+            copia = {v: (list(c), s, n) for v, (c, s, n) in self._series.items()}
+
+        lineas = []
+        for valores, (conteos, suma, total) in sorted(copia.items()):
+            acumulado = 0
+            for limite, conteo in zip(self.cubetas + (float("inf"),), conteos):
+                acumulado += conteo
+                le = _etiquetas(self.etiquetas, valores, f'le="{_numero(float(limite))}"')
+                lineas.append(f"{self.nombre}_bucket{le} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, valores)} {_numero(suma)}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, valores)} {total}")
+        return lineas
+
+
+class Medidor:
+    """
+    Valor leído al exportar: `funcion` devuelve un número o {(valores de etiquetas): número}.
+    Con tipo="counter" expone contadores que ya lleva otro componente (p. ej. rechazos por saturación).
+    """
+
+    def __init__(self, nombre: str, ayuda: str, funcion, etiquetas: tuple = (), tipo: str = "gauge"):
+        self.nombre = PREFIJO + nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.funcion = funcion
+        self.tipo = tipo
+
+    def lineas(self) -> list:
+        try:
+            valores = self.funcion()
+        except Exception:
+            return []
+        if not isinstance(valores, dict):
+            valores = {(): valores}
+        return [f"{self.nombre}{_etiquetas(self.etiquetas, v)} {_numero(n)}" for v, n in sorted(valores.items())]
+
+
+def _registrar(metrica):
+    with _lock_registro:
+        _metricas.append(metrica)
+    return metrica
+
+
+def contador(nombre: str, ayuda: str, etiquetas: tuple = ()) -> Contador:
+    return _registrar(Contador(nombre, ayuda, etiquetas))
+
+
+def histograma(nombre: str, ayuda: str, etiquetas: tuple = (), cubetas: tuple = CUBETAS_SEGUNDOS) -> Histograma:
+    return _registrar(Histograma(nombre, ayuda, etiquetas, cubetas))
+
+
+def medidor(nombre: str, ayuda: str, funcion, etiquetas: tuple = (), tipo: str = "gauge") -> Medidor:
+    return _registrar(Medidor(nombre, ayuda, funcion, etiquetas, tipo))
+
+
+def exportar() -> str:
+    with _lock_registro:
+        metricas = list(_metricas)
+
+    lineas = []
+    for m in metricas:
+        lineas.append(f"# HELP {m.nombre} {m.ayuda}")
+        lineas.append(f"# TYPE {m.nombre} {m.tipo}")
+        lineas += m.lineas()
+    return "\n".join(lineas) + "\n"
+
+# ------------------------------------------------------------------
+# MÉTRICAS DE LA APLICACIÓN
+# ------------------------------------------------------------------
+
+peticiones_http = contador(
+    "peticiones_http_total", "Peticiones HTTP por ruta, método y código de estado.", ("ruta", "metodo", "estado")
+)
+duracion_http = histograma(
+    "peticion_http_duracion_segundos", "Latencia de las peticiones HTTP por ruta.", ("ruta", "metodo")
+)
+duracion_etapa = histograma(
+    "etapa_duracion_segundos", "Latencia de cada etapa de la inferencia (recepción, decodificación, log-mel, modelo...).", ("etapa",)
+)
+duracion_bd = histograma(
+    "bd_operacion_duracion_segundos", "Latencia de las escrituras en la BD (incluye el commit).", ("operacion",)
+)
+filas_lote_modelo = histograma(
+    "modelo_lote_filas", "Filas (ventanas) por llamada al modelo tras el micro-batching.", cubetas=CUBETAS_LOTE
+)
+duracion_lote_modelo = histograma(
+    "modelo_lote_duracion_segundos", "Duración de cada llamada al modelo."
+)
+
+
+def cronometrar_bd(operacion: str):
+    """Decorador para los helpers de servicios que escriben en la BD (síncronos o async)."""
+    def decorador(funcion):
+        if inspect.iscoroutinefunction(funcion):
+            @functools.wraps(funcion)
+            async def envoltura_async(*args, **kwargs):
+                with duracion_bd.cronometro(operacion):
+                    return await funcion(*args, **kwargs)
+            return envoltura_async
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with duracion_bd.cronometro(operacion):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+# ------------------------------------------------------------------
+# DESGLOSE POR ETAPAS DE UNA PETICIÓN
+# ------------------------------------------------------------------
+
+class TiemposEtapas:
+    """
+    Tiempos por etapa de una inferencia. Cada etapa alimenta el histograma
+    etapa_duracion_segundos y el desglose se guarda con la fila de
+    EjecucionInferencia (columna tiempos_etapas, en milisegundos).
+    """
+
+    def __init__(self):
+        self.etapas = {}
+
+    def agregar(self, etapa: str, segundos: float):
+        self.etapas[etapa] = self.etapas.get(etapa, 0.0) + segundos
+        duracion_etapa.observar(segundos, etapa)
+
+    @contextmanager
+    def medir(self, etapa: str):
+        inicio = perf_counter()
+        try:
+            yield
+        finally:
+            self.agregar(etapa, perf_counter() - inicio)
+
+    def como_dict(self) -> dict:
+        return {etapa: round(segundos * 1000, 3) for etapa, segundos in self.etapas.items()}
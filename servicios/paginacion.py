@@ -0,0 +1,82 @@
+# servicios/paginacion.py
+# Paginación por clave (keyset) para los listados.
+#
+# Cada listado se ordena por (fecha DESC NULLS FIRST, id DESC) y el cursor guarda la fecha y
+# el id de la última fila devuelta: la página siguiente es "WHERE (fecha, id) <
+# (cursor)" con un LIMIT, que usa el índice compuesto y cuesta lo mismo en la
+# página 1 que en la 1000 (OFFSET recorre y descarta todas las filas anteriores).
+# El cursor de la página siguiente viaja en la cabecera X-Siguiente-Cursor; si no
+# viene, no hay más filas. El cuerpo sigue siendo la lista de siempre.
+#
+# Filas antiguas sin fecha (NULL): van primero, como en el DESC por defecto de
+# PostgreSQL (así sirven los índices fecha DESC, id DESC), y su cursor guarda fecha null.
+# Dentro de ese tramo el cursor es un filtro sobre el índice (cuesta las filas sin
+# fecha ya servidas); desde la primera fila con fecha vuelve a ser un límite del recorrido.
+import base64
+import json
+import os
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_, tuple_
+
+# ---------------- CONFIGURACIÓN ----------------
+PAGINA_DEFECTO = int(os.getenv("PAGINA_DEFECTO", "50"))
+PAGINA_MAX = int(os.getenv("PAGINA_MAX", "200"))
+
+CABECERA_CURSOR = "X-Siguiente-Cursor"
+
+
+def tamano_pagina(limite: int | None) -> int:
+    # Nunca más de PAGINA_MAX filas por página, pida lo que pida el cliente
+    if not limite or limite < 1:
+        return PAGINA_DEFECTO
+    return min(limite, PAGINA_MAX)
+
+
+def codificar_cursor(fecha: datetime, id_fila: int) -> str:
+    datos = json.dumps([fecha.isoformat() if fecha is not None else None, id_fila], separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(cursor: str | None) -> tuple | None:
+    if not cursor:
+        return None
+    try:
+        fecha, id_fila = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return (datetime.fromisoformat(fecha) if fecha is not None else None), int(id_fila)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido.")
+
+
+def despues_de(columna_fecha, columna_id, cursor: tuple | None):
+    """Condición de keyset para orden (fecha DESC NULLS FIRST, id DESC); None si es la primera página."""
+    if cursor is None:
+        return None
+    fecha, id_fila = cursor
+    if fecha is None:
+        # Aún en el tramo de filas sin fecha: quedan las de id menor y todas las fechadas
+        return or_(
+            and_(columna_fecha.is_(None), columna_id < id_fila),
+            columna_fecha.is_not(None)
+        )
+    # Comparación de filas: PostgreSQL la usa como límite del recorrido del índice
+    # (Index Cond), mientras que el OR equivalente solo filtraría desde la primera fila.
+    # Las filas sin fecha ya salieron (y una comparación con NULL nunca es verdadera).
+    return tuple_(columna_fecha, columna_id) < tuple_(fecha, id_fila)
+
+
+def paginar(consulta, columna_fecha, columna_id, cursor: str | None, limite: int):
+    """Aplica cursor, orden y LIMIT (una fila de más para saber si hay otra página)."""
+    condicion = despues_de(columna_fecha, columna_id, decodificar_cursor(cursor))
+    if condicion is not None:
+        consulta = consulta.where(condicion)
+    return consulta.order_by(columna_fecha.desc().nulls_first(), columna_id.desc()).limit(limite + 1)
+
+
+def cortar_pagina(filas: list, limite: int, clave) -> tuple:
+    """(filas de la página, cursor siguiente o None). `clave(fila)` -> (fecha, id)."""
+    if len(filas) <= limite:
+        return filas, None
+    filas = filas[:limite]
+    return filas, codificar_cursor(*clave(filas[-1]))
@@ -0,0 +1,219 @@
+# servicios/perfilado.py
+# Perfilado a demanda de una petición (solo administradores).
+#
+# Con la cabecera "X-Perfilar: 1" o el parámetro "?perfilar=1" el middleware de
+# app/main.py muestrea las pilas de todos los hilos del proceso mientras dura la
+# petición y activa tracemalloc. Se guardan en PERFILES_DIR:
+#   <id>.folded  pilas colapsadas (flamegraph.pl, speedscope, inferno)
+#   <id>.json    ruta, usuario, duración y asignaciones de memoria principales
+# Sin la cabecera ni el parámetro el middleware (ASGI puro) solo mira las cabeceras
+# y la query string del scope y pasa la petición tal cual a la aplicación.
+#
+# Limitaciones: se perfila una petición a la vez y el muestreo ve todo el proceso
+# (también lo que hagan otras peticiones concurrentes). La decodificación y el
+# log-mel en el pool de procesos quedan fuera: en las pilas aparece la espera.
+import json
+import os
+import re
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import parse_qsl
+
+# ---------------- CONFIGURACIÓN ----------------
+PERFILES_DIR = os.getenv("PERFILES_DIR", "perfiles")
+PERFILES_INTERVALO_MS = float(os.getenv("PERFILES_INTERVALO_MS", "5"))
+PERFILES_MAX = int(os.getenv("PERFILES_MAX", "100"))
+PERFILES_TOP_ASIGNACIONES = int(os.getenv("PERFILES_TOP_ASIGNACIONES", "25"))
+PERFILES_PROFUNDIDAD_TRAZA = 10
+
+CABECERA_PERFIL = b"x-perfilar"
+PARAMETRO_PERFIL = "perfilar"
+
+# Hojas de pila de hilos en espera (pool sin tareas, event loop en select): no consumen CPU
+FUNCIONES_INACTIVAS = {
+    ("threading.py", "wait"),
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("thread.py", "_worker"),
+}
+
+PATRON_ID = re.compile(r"^[0-9TZ]+_[0-9a-f]{6}$")
+
+
+def solicita_perfil(scope) -> bool:
+    """X-Perfilar: 1 o ?perfilar=1, leídos del scope ASGI sin construir la Request."""
+    if any(nombre == CABECERA_PERFIL and valor == b"1" for nombre, valor in scope["headers"]):
+        return True
+    consulta = scope["query_string"]
+    return PARAMETRO_PERFIL.encode() in consulta and (PARAMETRO_PERFIL, "1") in parse_qsl(consulta.decode("latin-1"))
+
+
+def _marco(codigo) -> str:
+    archivo = "/".join(codigo.co_filename.replace("\\", "/").split("/")[-2:])
+    return f"{codigo.co_name} ({archivo}:{codigo.co_firstlineno})"
+
+
+class MuestreadorPilas(threading.Thread):
+    """Cada `intervalo` segundos cuenta la pila de cada hilo activo (formato colapsado)."""
+
+    def __init__(self, intervalo: float):
+        super().__init__(name="perfilado", daemon=True)
+        self.intervalo = intervalo
+        self.pilas = Counter()
+        self.muestras = 0
+        self._detener = threading.Event()
+
+    def run(self):
+        propio = threading.get_ident()
+        while not self._detener.wait(self.intervalo):
+            nombres = {h.ident: h.name for h in threading.enumerate()}
+            for ident, marco in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                codigo = marco.f_code
+                if (os.path.basename(codigo.co_filename), codigo.co_name) in FUNCIONES_INACTIVAS:
+                    continue
+
+                pila = []
+                while marco is not None:
+                    pila.append(_marco(marco.f_code))
+                    marco = marco.f_back
+                pila.append(nombres.get(ident, f"hilo-{ident}"))
+                self.pilas[";".join(reversed(pila))] += 1
+            self.muestras += 1
+
+    def detener(self):
+        self._detener.set()
+        self.join()
+
+
+class SesionPerfil:
+    def __init__(self, perfilador, metodo: str, ruta: str, id_usuario: int):
+        self.perfilador = perfilador
+        self.id = f"{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}_{secrets.token_hex(3)}"
+        self.metodo = metodo
+        self.ruta = ruta
+        self.id_usuario = id_usuario
+
+        self._inicio = time.perf_counter()
+        self._tracemalloc_propio = not tracemalloc.is_tracing()
+        if self._tracemalloc_propio:
+            tracemalloc.start(PERFILES_PROFUNDIDAD_TRAZA)
+        tracemalloc.reset_peak()
+        self._muestreador = MuestreadorPilas(perfilador.intervalo)
+        self._muestreador.start()
+
+    def terminar(self, estado: int) -> str:
+        """Detiene el muestreo, guarda el perfil y libera el perfilador. Devuelve el id."""
+        try:
+            duracion = time.perf_counter() - self._inicio
+            self._muestreador.detener()
+
+            _, pico = tracemalloc.get_traced_memory()
+            instantanea = tracemalloc.take_snapshot().filter_traces((
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            ))
+            if self._tracemalloc_propio:
+                tracemalloc.stop()
+
+            asignaciones = [
+                {
+                    "ubicacion": f"{e.traceback[0].filename}:{e.traceback[0].lineno}",
+                    "kb": round(e.size / 1024, 1),
+                    "bloques": e.count,
+                }
+                for e in instantanea.statistics("lineno")[:PERFILES_TOP_ASIGNACIONES]
+            ]
+
+            self.perfilador.guardar(self.id, {
+                "id": self.id,
+                "fecha": datetime.now(timezone.utc).isoformat(),
+                "metodo": self.metodo,
+                "ruta": self.ruta,
+                "estado": estado,
+                "id_usuario": self.id_usuario,
+                "duracion_ms": round(duracion * 1000, 1),
+                "intervalo_ms": self.perfilador.intervalo * 1000,
+                "muestras": self._muestreador.muestras,
+                "pico_memoria_kb": round(pico / 1024, 1),
+                "asignaciones": asignaciones,
+            }, self._muestreador.pilas)
+        finally:
+            self.perfilador.liberar()
+
+        return self.id
+
+
+class Perfilador:
+    def __init__(self, directorio: str = PERFILES_DIR, intervalo_ms: float = PERFILES_INTERVALO_MS, maximo: int = PERFILES_MAX):
+        self.directorio = directorio
+        self.intervalo = intervalo_ms / 1000
+        self.maximo = maximo
+        self._lock = threading.Lock()
+
+    def iniciar(self, metodo: str, ruta: str, id_usuario: int) -> SesionPerfil | None:
+        """None si ya hay otra petición perfilándose (tracemalloc es global al proceso)."""
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            return SesionPerfil(self, metodo, ruta, id_usuario)
+        except BaseException:
+            self._lock.release()
+            raise
+
+    def liberar(self):
+        self._lock.release()
+
+    def guardar(self, id_perfil: str, resumen: dict, pilas: Counter):
+        os.makedirs(self.directorio, exist_ok=True)
+        with open(os.path.join(self.directorio, f"{id_perfil}.folded"), "w", encoding="utf-8") as f:
+            for pila, cuenta in pilas.most_common():
+                f.write(f"{pila} {cuenta}\n")
+        with open(os.path.join(self.directorio, f"{id_perfil}.json"), "w", encoding="utf-8") as f:
+            json.dump(resumen, f, ensure_ascii=False, indent=2)
+
+        # Solo se conservan los PERFILES_MAX más recientes (los ids se ordenan por fecha)
+        for antiguo in self._ids()[:-self.maximo]:
+            for extension in (".json", ".folded"):
+                try:
+                    os.remove(os.path.join(self.directorio, antiguo + extension))
+                except FileNotFoundError:
+                    pass
+
+    def _ids(self) -> list:
+        if not os.path.isdir(self.directorio):
+            return []
+        return sorted(n[:-5] for n in os.listdir(self.directorio) if n.endswith(".json") and PATRON_ID.match(n[:-5]))
+
+    def listar(self) -> list:
+        perfiles = []
+        for id_perfil in reversed(self._ids()):
+            resumen = self.resumen(id_perfil)
+            if resumen is not None:
+                resumen.pop("asignaciones", None)
+                perfiles.append(resumen)
+        return perfiles
+
+    def resumen(self, id_perfil: str) -> dict | None:
+        if not PATRON_ID.match(id_perfil):
+            return None
+        try:
+            with open(os.path.join(self.directorio, f"{id_perfil}.json"), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def ruta_pilas(self, id_perfil: str) -> str | None:
+        if not PATRON_ID.match(id_perfil):
+            return None
+        ruta = os.path.join(self.directorio, f"{id_perfil}.folded")
+        return ruta if os.path.exists(ruta) else None
+
+
+perfilador = Perfilador()
@@ -0,0 +1,159 @@
+# servicios/planificador.py
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+
+import numpy as np
+
+from servicios.metricas import duracion_lote_modelo, filas_lote_modelo
+
+# ---------------- CONFIGURACIÓN ----------------
+BATCH_MAX = int(os.getenv("INFERENCIA_BATCH_MAX", "16"))
+ESPERA_MAX_MS = float(os.getenv("INFERENCIA_ESPERA_MS", "10"))
+COLA_MAX = int(os.getenv("INFERENCIA_COLA_MAX", "64"))
+
+
+class ColaInferenciaLlena(Exception):
+    """La cola del planificador alcanzó su profundidad máxima."""
+
+
+class PlanificadorInferencia:
+    """
+    Micro-batching dinámico para el modelo.
+
+    Las peticiones concurrentes encolan sus tensores (n, 128, 216, 1) y un
+    único hilo los agrupa en un lote. El lote se ejecuta cuando llega a
+    `batch_max` filas o cuando la petición más antigua lleva `espera_max_ms`
+    en la cola; cada llamador recibe solo sus filas de probabilidades.
+    """
+
+    def __init__(
+        self,
+        funcion_modelo,
+        batch_max: int = BATCH_MAX,
+        espera_max_ms: float = ESPERA_MAX_MS,
+        cola_max: int = COLA_MAX
+    ):
+        self.funcion_modelo = funcion_modelo
+        self.batch_max = batch_max
+        self.espera_max_ms = espera_max_ms
+        self.cola = queue.Queue(maxsize=cola_max)
+
+        self._hilo = None
+        self._lock = threading.Lock()
+        self._pendiente = None
+        self._tamanos = Counter()
+        self._rechazadas = 0
+
+    # ---------------- API ----------------
+
+    def enviar(self, X: np.ndarray) -> Future:
+        """Encola un tensor (n, 128, 216, 1) y devuelve un Future con (n, clases)."""
+        self._iniciar()
+
+        futuro = Future()
+        try:
+            self.cola.put_nowait((X, futuro, time.monotonic()))
+        except queue.Full:
+            with self._lock:
+                self._rechazadas += 1
+            raise ColaInferenciaLlena(
+                f"Cola de inferencia llena ({self.cola.maxsize} peticiones en espera)"
+            )
+
+        return futuro
+
+    def predecir(self, X: np.ndarray) -> np.ndarray:
+        return self.enviar(X).result()
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            tamanos = dict(sorted(self._tamanos.items()))
+            rechazadas = self._rechazadas
+
+        lotes = sum(tamanos.values())
+        filas = sum(t * n for t, n in tamanos.items())
+
+        return {
+            "batch_max": self.batch_max,
+            "espera_max_ms": self.espera_max_ms,
+            "cola_max": self.cola.maxsize,
+            "cola_actual": self.cola.qsize(),
+            "lotes_ejecutados": lotes,
+            "filas_procesadas": filas,
+            "tamano_medio_lote": filas / lotes if lotes else 0.0,
+            "histograma_tamanos": {str(t): n for t, n in tamanos.items()},
+            "rechazadas_cola_llena": rechazadas
+        }
+
+    # ---------------- HILO DE EJECUCIÓN ----------------
+
+    def _iniciar(self):
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(
+                    target=self._bucle,
+                    name="planificador-inferencia",
+                    daemon=True
+                )
+                self._hilo.start()
+
+    def _bucle(self):
+        while True:
+            primero = self._pendiente or self.cola.get()
+            self._pendiente = None
+
+            lote = [primero]
+            filas = len(primero[0])
+            limite = primero[2] + self.espera_max_ms / 1000
+
+            while filas < self.batch_max:
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self.cola.get(timeout=restante)
+                except queue.Empty:
+                    break
+
+                # Si no cabe, abre el siguiente lote
+                if filas + len(item[0]) > self.batch_max:
+                    self._pendiente = item
+                    break
+
+                lote.append(item)
+                filas += len(item[0])
+
+            self._ejecutar(lote)
+
+    def _ejecutar(self, lote):
+        lote = [item for item in lote if item[1].set_running_or_notify_cancel()]
+        if not lote:
+            return
+
+        X = lote[0][0] if len(lote) == 1 else np.concatenate([x for x, _, _ in lote])
+
+        inicio = time.perf_counter()
+        try:
+            probs = np.asarray(self.funcion_modelo(X))
+        except Exception as e:
+            for _, futuro, _ in lote:
+                futuro.set_exception(e)
+            return
+
+        duracion_lote_modelo.observar(time.perf_counter() - inicio)
+        filas_lote_modelo.observar(len(X))
+
+        with self._lock:
+            self._tamanos[len(X)] += 1
+
+        inicio = 0
+        for x, futuro, _ in lote:
+            futuro.set_result(probs[inicio:inicio + len(x)])
+            inicio += len(x)
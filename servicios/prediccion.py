@@ -1,114 +1,105 @@
 # app/servicios/prediccion.py
-import os
 import numpy as np
-import librosa
-import tensorflow as tf
 
-from sqlalchemy.orm import Session
-from db.modelos import Ave
+from servicios.catalogo_especies import catalogo
+from servicios.compuerta_actividad import compuerta
+from servicios.metricas import TiemposEtapas, medidor
+from servicios.planificador import PlanificadorInferencia
+from servicios.registro_modelos import registro
+from servicios.preprocesado import (
+    AGREGACIONES, FMAX, FMIN, HOP_LENGTH, MODOS, N_FFT, N_MELS, SALTO_VENTANA, TARGET_FRAMES, TARGET_SR,
+    TOPK_VENTANAS, audio_a_logmel, audio_a_logmel_completo, frontend, limpiar_audio, preprocesar_audio,
+    preprocesar_audio_compuerta, ventanas_activas, ventanas_logmel
+)
 
-# ---------------- CONFIGURACIÓN ----------------
-MODEL_PATH = "modelo_cnn/best_model.keras"
+# Cargar el modelo al importar (backend INFERENCIA_BACKEND, versión de servicios/registro_modelos.py);
+# después se cambia en caliente desde administración sin reiniciar el proceso
+registro.iniciar()
 
-TARGET_SR = 44100
-N_MELS = 128
-TARGET_FRAMES = 216
-FMIN = 500
-FMAX = 11025
+# Un solo forward pass por lote; el planificador agrupa las peticiones concurrentes.
+# Con CASCADA_BACKEND el modelo activo es una cascada (servicios/cascada.py).
+def _forward(X):
+    return registro.predecir(X)
 
-# Cargar modelo UNA sola vez
-model = tf.keras.models.load_model(MODEL_PATH)
+planificador = PlanificadorInferencia(_forward)
 
-#Limpieza de audio.
+medidor("modelo_cola", "Peticiones esperando en la cola del planificador.", lambda: planificador.cola.qsize())
+medidor(
+    "modelo_cola_rechazadas_total", "Peticiones rechazadas con la cola del planificador llena.",
+    lambda: planificador.estadisticas()["rechazadas_cola_llena"], tipo="counter"
+)
 
-def limpiar_audio(y):
-    if y.ndim > 1:
-        y = librosa.to_mono(y)
+# Combinar las probabilidades por ventana (n, clases) en un solo vector
+def combinar_probabilidades(P, agregacion: str = "media", k: int = TOPK_VENTANAS):
+    if agregacion == "max":
+        return P.max(axis=0)
 
-    y = y / (np.max(np.abs(y)) + 1e-9)
-    y = librosa.effects.preemphasis(y, coef=0.97)
+    if agregacion == "topk":
+        k = min(k, len(P))
+        return np.sort(P, axis=0)[-k:].mean(axis=0)
 
-    return y
+    return P.mean(axis=0)
 
-# Generar espectrograma log-mel 128 x 216
-def audio_a_logmel(y, sr):
-    S = librosa.feature.melspectrogram(
-        y=y,
-        sr=sr,
-        n_mels=N_MELS,
-        fmin=FMIN,
-        fmax=FMAX
-    )
+# Obtener URL de imagen de ave por nombre científico (catálogo en memoria, sin consultar la BD).
 
-    S_db = librosa.power_to_db(S, ref=np.max)
-    S_norm = (S_db - S_db.min()) / (S_db.max() - S_db.min() + 1e-9)
-
-    frames = S_norm.shape[1]
-
-    if frames < TARGET_FRAMES:
-        S_norm = np.pad(
-            S_norm,
-            ((0, 0), (0, TARGET_FRAMES - frames)),
-            mode="constant"
-        )
-    elif frames > TARGET_FRAMES:
-        start = (frames - TARGET_FRAMES) // 2
-        S_norm = S_norm[:, start:start + TARGET_FRAMES]
-
-    return S_norm
-
-# Obtener URL de imagen de ave por nombre científico.
-
-def obtener_imagen_ave(db: Session, nombre_cientifico: str):
-    ave = (
-        db.query(Ave)
-        .filter(Ave.nombre_cientifico == nombre_cientifico)
-        .first()
-    )
-
-    return ave.url_imagen if ave else None
+def obtener_imagen_ave(nombre_cientifico: str):
+    return catalogo.url_imagen(nombre_cientifico)
 
 # Predicción de especie desde archivo de audio
 
 def predecir_audio(
     y: np.ndarray,
     sr: int,
-    db: Session,
-    top_n: int = 5
+    top_n: int = 5,
+    modo: str = "centro",
+    salto_ventana: int = SALTO_VENTANA,
+    agregacion: str = "media",
+    etapas: TiemposEtapas = None
 ):
+    etapas = etapas or TiemposEtapas()
+    with etapas.medir("logmel"):
+        X, omitidas = preprocesar_audio_compuerta(y, sr, modo=modo, salto_ventana=salto_ventana)
+    compuerta.registrar(len(X) + omitidas, omitidas)
+    return predecir_tensor(X, top_n=top_n, agregacion=agregacion, etapas=etapas)
+
+# Predicción de especie desde el tensor log-mel ya calculado
+
+def predecir_tensor(
+    X: np.ndarray,
+    top_n: int = 5,
+    agregacion: str = "media",
+    etapas: TiemposEtapas = None
+):
+    etapas = etapas or TiemposEtapas()
+    # 4. Inferencia (micro-batching con otras peticiones en curso).
+    # Todas las ventanas del clip viajan en una sola llamada al modelo.
+    with etapas.medir("modelo"):
+        P = planificador.predecir(X)
 
-    # 1. Limpieza
-    y = limpiar_audio(y)
-
-    # 2. Log-mel
-    S = audio_a_logmel(y, sr)
-
-    # 3. Tensor (1, 128, 216, 1)
-    X = S[np.newaxis, ..., np.newaxis]
+    with etapas.medir("top_n"):
+        probs = P[0] if len(P) == 1 else combinar_probabilidades(P, agregacion)
+        return resultados_top_n(probs, top_n=top_n)
 
-    # 4. Inferencia
-    probs = model.predict(X)[0]
+# Top-N de especies a partir del vector de probabilidades
 
+def resultados_top_n(
+    probs: np.ndarray,
+    top_n: int = 5
+):
     # 5 . Top-N
     top_indices = np.argsort(probs)[::-1][:top_n]
 
     resultados = []
 
     for idx in top_indices:
-        ave = (
-            db.query(Ave)
-            .filter(Ave.id_ave == int(idx))
-            .first()
-        )
+        ave = catalogo.por_indice(int(idx))
 
         resultados.append({
             "id_ave": int(idx),
             "nombre_cientifico": ave.nombre_cientifico if ave else "desconocido",
-            "nombre": ave.nombre if ave else "desconocido",
+            "nombre": ave.nombre if ave and ave.nombre else "desconocido",
             "probabilidad": float(probs[idx])
         })
 
     return resultados
 #-----------------------------------------------------------
-
-
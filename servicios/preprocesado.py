@@ -0,0 +1,174 @@
+# servicios/preprocesado.py
+# Decodificación y log-mel sin dependencias del modelo: se importa también
+# desde los procesos del pool de preprocesado (servicios/ejecucion.py).
+import os
+from time import perf_counter
+
+import numpy as np
+
+from servicios.compuerta_actividad import compuerta
+from servicios.decodificacion import TARGET_SR, decodificar_audio, tiempos_recientes
+from servicios.frontend_logmel import FrontendLogMel
+
+# ---------------- CONFIGURACIÓN ----------------
+N_MELS = 128
+TARGET_FRAMES = 216
+FMIN = 500
+FMAX = 11025
+N_FFT = 2048
+HOP_LENGTH = 512
+
+# Modo ventanas: recorre todo el clip con ventanas de TARGET_FRAMES solapadas
+MODOS = ("centro", "ventanas")
+AGREGACIONES = ("media", "max", "topk")
+SALTO_VENTANA = int(os.getenv("SALTO_VENTANA", str(TARGET_FRAMES // 2)))
+TOPK_VENTANAS = int(os.getenv("TOPK_VENTANAS", "3"))
+
+# Frontend log-mel con banco de filtros y ventana precalculados
+frontend = FrontendLogMel(
+    sr=TARGET_SR,
+    n_fft=N_FFT,
+    hop_length=HOP_LENGTH,
+    n_mels=N_MELS,
+    fmin=FMIN,
+    fmax=FMAX
+)
+
+# Parámetros que determinan el tensor de entrada (forman parte de la clave de la caché de predicciones)
+def parametros_preprocesado(modo: str, salto_ventana: int, agregacion: str) -> dict:
+    parametros = {
+        "sr": TARGET_SR, "n_mels": N_MELS, "frames": TARGET_FRAMES, "fmin": FMIN, "fmax": FMAX,
+        "n_fft": N_FFT, "hop": HOP_LENGTH, "modo": modo
+    }
+    if modo == "ventanas":
+        parametros.update(salto_ventana=salto_ventana, agregacion=agregacion, topk=TOPK_VENTANAS, **compuerta.parametros())
+    return parametros
+
+#Limpieza de audio.
+
+def limpiar_audio(y):
+    if y.ndim > 1:
+        y = np.mean(y, axis=0)
+
+    return frontend.limpiar(y)
+
+# Espectrograma log-mel normalizado de todo el clip (128 x frames)
+def audio_a_logmel_completo(y, sr):
+    if sr != frontend.sr:
+        raise ValueError(f"Frecuencia de muestreo {sr} distinta de TARGET_SR={frontend.sr}")
+
+    return frontend.logmel(y)
+
+# Generar espectrograma log-mel 128 x 216
+def audio_a_logmel(y, sr):
+    S_norm = audio_a_logmel_completo(y, sr)
+
+    frames = S_norm.shape[1]
+
+    if frames < TARGET_FRAMES:
+        S_norm = np.pad(
+            S_norm,
+            ((0, 0), (0, TARGET_FRAMES - frames)),
+            mode="constant"
+        )
+    elif frames > TARGET_FRAMES:
+        start = (frames - TARGET_FRAMES) // 2
+        S_norm = S_norm[:, start:start + TARGET_FRAMES]
+
+    return S_norm
+
+# Cortar el log-mel completo en ventanas solapadas (n, 128, 216)
+def ventanas_logmel(S, salto: int = SALTO_VENTANA):
+    frames = S.shape[1]
+
+    if frames <= TARGET_FRAMES:
+        S = np.pad(S, ((0, 0), (0, TARGET_FRAMES - frames)), mode="constant")
+        return S[np.newaxis]
+
+    # Vista sin copia (128, n, 216); se asegura una última ventana pegada al final
+    vistas = np.lib.stride_tricks.sliding_window_view(S, TARGET_FRAMES, axis=1)
+    inicios = list(range(0, frames - TARGET_FRAMES + 1, salto))
+    if inicios[-1] != frames - TARGET_FRAMES:
+        inicios.append(frames - TARGET_FRAMES)
+
+    return np.moveaxis(vistas[:, inicios], 1, 0)
+
+# Ventanas que pasan la compuerta de actividad y número de omitidas.
+# Si ninguna pasa se conserva la de más energía: el clip siempre recibe una predicción.
+def ventanas_activas(y, salto: int = SALTO_VENTANA):
+    P = frontend.potencia_mel(y)
+    V = ventanas_logmel(frontend.normalizar(frontend.potencia_a_db(P)), salto)
+
+    if not compuerta.activa or len(V) == 1:
+        return V, 0
+
+    P_ventanas = ventanas_logmel(P, salto)
+    activas = compuerta.evaluar(P_ventanas)
+    if not activas.any():
+        activas[np.argmax(P_ventanas.mean(axis=(1, 2)))] = True
+
+    return V[activas], int(len(V) - activas.sum())
+
+# Tensor de entrada al modelo: (1, 128, 216, 1) en modo centro, (n, 128, 216, 1) en modo ventanas
+# (solo las ventanas con actividad). Devuelve (X, ventanas omitidas por la compuerta).
+
+def preprocesar_audio_compuerta(
+    y: np.ndarray,
+    sr: int,
+    modo: str = "centro",
+    salto_ventana: int = SALTO_VENTANA
+):
+    # 1. Limpieza
+    y = limpiar_audio(y)
+
+    # 2-3. Log-mel y tensor
+    if modo == "ventanas":
+        if sr != frontend.sr:
+            raise ValueError(f"Frecuencia de muestreo {sr} distinta de TARGET_SR={frontend.sr}")
+        V, omitidas = ventanas_activas(y, salto_ventana)
+        return V[..., np.newaxis], omitidas
+
+    S = audio_a_logmel(y, sr)
+    return S[np.newaxis, ..., np.newaxis], 0
+
+def preprocesar_audio(
+    y: np.ndarray,
+    sr: int,
+    modo: str = "centro",
+    salto_ventana: int = SALTO_VENTANA
+):
+    return preprocesar_audio_compuerta(y, sr, modo=modo, salto_ventana=salto_ventana)[0]
+
+# Trabajo completo de un proceso del pool: decodificar, validar duración y log-mel.
+# Devuelve (X, duración, tiempos de decodificación, ventanas omitidas por la compuerta,
+# segundos por etapa); X es None si la duración no es válida. Los contadores de la
+# compuerta y las métricas se registran en el proceso principal, no en el del pool.
+# Etapas: "decodificacion" sin el remuestreo con soxr, que va aparte en "remuestreo"
+# (solo en los procesos del pool; con ffmpeg el remuestreo va dentro de la decodificación).
+
+def decodificar_y_preprocesar(
+    fuente,
+    content_type: str,
+    modo: str = "centro",
+    salto_ventana: int = SALTO_VENTANA,
+    min_duracion: float = 0.0,
+    max_duracion: float = float("inf")
+):
+    inicio = perf_counter()
+    y = decodificar_audio(fuente, content_type)
+    duracion = len(y) / TARGET_SR
+
+    tiempos = tiempos_recientes()
+    remuestreo = sum(t for clave, t in tiempos if clave == "remuestreo")
+    etapas = {"decodificacion": perf_counter() - inicio - remuestreo}
+    if remuestreo:
+        etapas["remuestreo"] = remuestreo
+
+    if not min_duracion <= duracion <= max_duracion:
+        return None, duracion, tiempos, 0, etapas
+
+    inicio = perf_counter()
+    X, omitidas = preprocesar_audio_compuerta(y, TARGET_SR, modo=modo, salto_ventana=salto_ventana)
+    etapas["logmel"] = perf_counter() - inicio
+
+    return X, duracion, tiempos, omitidas, etapas
@@ -0,0 +1,397 @@
+# servicios/recepcion.py
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import zipfile
+
+from fastapi import UploadFile
+
+from servicios.decodificacion import formato_de
+
+# ---------------- CONFIGURACIÓN ----------------
+CHUNK_BYTES = 64 * 1024
+SPOOL_MAX_BYTES = int(float(os.getenv("RECEPCION_SPOOL_MB", "8")) * 1024 * 1024)
+CABECERA_MIN_BYTES = 64 * 1024    # se intenta sondear la duración a partir de aquí
+CABECERA_MAX_BYTES = 1024 * 1024  # si no hay respuesta con 1 MB se deja para la decodificación
+
+# Lotes: archivos de audio dentro de un .zip (el tipo MIME se deduce de la extensión)
+TIPOS_ZIP = ("application/zip", "application/x-zip-compressed")
+EXTENSIONES_AUDIO = {
+    ".wav": "audio/wav",
+    ".flac": "audio/flac",
+    ".mp3": "audio/mpeg",
+    ".webm": "audio/webm",
+}
+
+
+class ArchivoDemasiadoGrande(Exception):
+    def __init__(self, tamano: int):
+        super().__init__(f"Tamaño excedido: {tamano} bytes")
+        self.tamano = tamano
+
+
+class DuracionInvalida(Exception):
+    def __init__(self, duracion: float):
+        super().__init__(f"Duración inválida: {duracion:.2f}s (estimada por cabecera)")
+        self.duracion = duracion
+
+
+class AudioRecibido:
+    """Subida ya validada: en memoria si es pequeña, en un archivo temporal si no."""
+
+    def __init__(
+        self,
+        contenido: bytes | None,
+        ruta: str | None,
+        tamano: int,
+        duracion_estimada: float | None,
+        huella: str | None = None
+    ):
+        self.contenido = contenido
+        self.ruta = ruta
+        self.tamano = tamano
+        self.duracion_estimada = duracion_estimada
+        # SHA-256 de los bytes subidos, calculado mientras se reciben
+        self.huella = huella
+        # Futuro del pool de preprocesado que lee el temporal (ver usar_en)
+        self._en_uso = None
+
+    @property
+    def fuente(self):
+        # decodificacion acepta tanto bytes como rutas
+        return self.contenido if self.contenido is not None else self.ruta
+
+    def usar_en(self, futuro):
+        """Mientras `futuro` no termine, cerrar() aplaza el borrado del temporal."""
+        self._en_uso = futuro
+
+    def cerrar(self):
+        # Una tarea ya enviada al pool sigue leyendo el archivo aunque se cancele su espera
+        if self._en_uso is not None and not self._en_uso.done():
+            self._en_uso.add_done_callback(lambda _: self.cerrar())
+            return
+
+        if self.ruta and os.path.exists(self.ruta):
+            os.remove(self.ruta)
+        self.contenido = None
+        self.ruta = None
+
+# ------------------------------------------------------------------
+# RECEPCIÓN POR BLOQUES
+# ------------------------------------------------------------------
+
+async def recibir_audio(
+    file: UploadFile,
+    max_bytes: int,
+    min_duracion: float,
+    max_duracion: float
+) -> AudioRecibido:
+    """
+    Copia la subida por bloques a memoria o a un temporal (spool acotado) y calcula su
+    huella. Deja de copiar en cuanto se supera el tamaño máximo o la cabecera indica
+    una duración fuera de rango, antes de decodificar nada.
+
+    No es un rechazo durante la recepción: cuando se llama al handler, Starlette ya
+    ha recibido y guardado todo el cuerpo multipart en su propio temporal. Lo que
+    acota es la copia y la memoria de este proceso. El único rechazo antes de recibir
+    el cuerpo es el middleware de Content-Length de app/main.py, y una subida sin
+    Content-Length (chunked) se recibe entera antes de llegar aquí.
+    """
+    formato = formato_de(file.content_type)
+    tamano_declarado = file.size
+
+    if tamano_declarado is not None and tamano_declarado > max_bytes:
+        raise ArchivoDemasiadoGrande(tamano_declarado)
+
+    memoria = bytearray()
+    temporal = None
+    cabecera = bytearray()
+    duracion = None
+    sondeado = False
+    total = 0
+    huella = hashlib.sha256()
+
+    try:
+        while True:
+            bloque = await file.read(CHUNK_BYTES)
+            fin = not bloque
+            total += len(bloque)
+
+            if total > max_bytes:
+                raise ArchivoDemasiadoGrande(total)
+            huella.update(bloque)
+
+            # Spool acotado: pasa a disco al superar SPOOL_MAX_BYTES
+            if temporal is None and len(memoria) + len(bloque) > SPOOL_MAX_BYTES:
+                temporal = tempfile.NamedTemporaryFile(prefix="audio_", delete=False)
+                temporal.write(memoria)
+                memoria = None
+            if temporal is not None:
+                temporal.write(bloque)
+            else:
+                memoria += bloque
+
+            # Sondeo de la duración con los primeros bytes
+            if not sondeado:
+                if len(cabecera) < CABECERA_MAX_BYTES:
+                    cabecera += bloque[:CABECERA_MAX_BYTES - len(cabecera)]
+
+                if fin or len(cabecera) >= CABECERA_MIN_BYTES:
+                    duracion = estimar_duracion(bytes(cabecera), formato, tamano_declarado or (total if fin else None))
+                    sondeado = duracion is not None or fin or len(cabecera) >= CABECERA_MAX_BYTES
+
+                    if duracion is not None and not min_duracion <= duracion <= max_duracion:
+                        raise DuracionInvalida(duracion)
+
+            if fin:
+                break
+    except BaseException:
+        if temporal is not None:
+            temporal.close()
+            os.remove(temporal.name)
+        raise
+
+    if temporal is not None:
+        temporal.close()
+        return AudioRecibido(None, temporal.name, total, duracion, huella.hexdigest())
+
+    return AudioRecibido(bytes(memoria), None, total, duracion, huella.hexdigest())
+
+# ------------------------------------------------------------------
+# ARCHIVOS ZIP (PROCESAMIENTO POR LOTES)
+# ------------------------------------------------------------------
+
+def es_zip(content_type: str | None, nombre: str | None) -> bool:
+    return content_type in TIPOS_ZIP or (nombre or "").lower().endswith(".zip")
+
+
+def extraer_zip(fuente, max_archivos: int, max_bytes_archivo: int) -> list:
+    """
+    Audios de un .zip como [(nombre, content_type, AudioRecibido | None, error | None)].
+    El tamaño se comprueba con la cabecera de cada entrada antes de descomprimirla.
+    """
+    contenedor = io.BytesIO(fuente) if isinstance(fuente, (bytes, bytearray)) else fuente
+    archivos = []
+
+    with zipfile.ZipFile(contenedor) as zf:
+        entradas = [
+            info for info in zf.infolist()
+            if not info.is_dir() and not os.path.basename(info.filename).startswith(".")
+        ]
+        if len(entradas) > max_archivos:
+            raise ValueError(f"El zip contiene {len(entradas)} archivos, el máximo es {max_archivos}")
+
+        for info in entradas:
+            nombre = info.filename
+            content_type = EXTENSIONES_AUDIO.get(os.path.splitext(nombre)[1].lower())
+
+            if content_type is None:
+                archivos.append((nombre, None, None, f"Extensión no soportada: {nombre}"))
+                continue
+            if info.file_size > max_bytes_archivo:
+                archivos.append((nombre, content_type, None, str(ArchivoDemasiadoGrande(info.file_size))))
+                continue
+
+            try:
+                with zf.open(info) as entrada:
+                    audio = volcar_entrada(entrada, max_bytes_archivo)
+            except ArchivoDemasiadoGrande as e:
+                archivos.append((nombre, content_type, None, str(e)))
+                continue
+            except BaseException:
+                for _, _, anterior, _ in archivos:
+                    if anterior is not None:
+                        anterior.cerrar()
+                raise
+            archivos.append((nombre, content_type, audio, None))
+
+    return archivos
+
+
+def volcar_entrada(entrada, max_bytes: int) -> AudioRecibido:
+    """
+    Descomprime una entrada del zip por bloques con el mismo spool que recibir_audio:
+    en memoria hasta SPOOL_MAX_BYTES y después en un temporal, así un lote no
+    tiene todos sus audios descomprimidos en memoria a la vez.
+    """
+    memoria = bytearray()
+    temporal = None
+    total = 0
+    huella = hashlib.sha256()
+
+    try:
+        while bloque := entrada.read(CHUNK_BYTES):
+            total += len(bloque)
+            # El tamaño de la cabecera del zip puede mentir
+            if total > max_bytes:
+                raise ArchivoDemasiadoGrande(total)
+            huella.update(bloque)
+
+            if temporal is None and len(memoria) + len(bloque) > SPOOL_MAX_BYTES:
+                temporal = tempfile.NamedTemporaryFile(prefix="audio_", delete=False)
+                temporal.write(memoria)
+                memoria = None
+            if temporal is not None:
+                temporal.write(bloque)
+            else:
+                memoria += bloque
+    except BaseException:
+        if temporal is not None:
+            temporal.close()
+            os.remove(temporal.name)
+        raise
+
+    if temporal is not None:
+        temporal.close()
+        return AudioRecibido(None, temporal.name, total, None, huella.hexdigest())
+
+    return AudioRecibido(bytes(memoria), None, total, None, huella.hexdigest())
+
+# ------------------------------------------------------------------
+# SONDEO DE CABECERAS (WAV / FLAC / MP3 / WEBM)
+# ------------------------------------------------------------------
+
+def estimar_duracion(cabecera: bytes, formato: str | None, tamano_total: int | None) -> float | None:
+    """Duración en segundos leída de la cabecera del contenedor, o None si no se puede saber."""
+    try:
+        if cabecera[:4] == b"RIFF" and cabecera[8:12] == b"WAVE":
+            return _duracion_wav(cabecera, tamano_total)
+        if cabecera[:4] == b"fLaC":
+            return _duracion_flac(cabecera)
+        if cabecera[:4] == b"\x1a\x45\xdf\xa3":
+            return _duracion_webm(cabecera)
+        if formato == "mp3" or cabecera[:3] == b"ID3":
+            return _duracion_mp3(cabecera, tamano_total)
+    except (struct.error, IndexError, ValueError, ZeroDivisionError):
+        return None
+    return None
+
+
+def _duracion_wav(cabecera: bytes, tamano_total: int | None):
+    pos = 12
+    byte_rate = None
+
+    while pos + 8 <= len(cabecera):
+        id_chunk = cabecera[pos:pos + 4]
+        tamano = struct.unpack("<I", cabecera[pos + 4:pos + 8])[0]
+
+        if id_chunk == b"fmt ":
+            byte_rate = struct.unpack("<I", cabecera[pos + 16:pos + 20])[0]
+        elif id_chunk == b"data":
+            if not byte_rate:
+                return None
+            # Grabaciones en streaming dejan el tamaño del chunk sin rellenar
+            if tamano in (0, 0xFFFFFFFF) and tamano_total:
+                tamano = tamano_total - (pos + 8)
+            return tamano / byte_rate
+
+        pos += 8 + tamano + (tamano & 1)
+
+    return None
+
+
+def _duracion_flac(cabecera: bytes):
+    # Primer bloque de metadatos: STREAMINFO (tipo 0)
+    if cabecera[4] & 0x7F != 0:
+        return None
+    info = cabecera[8:8 + 34]
+
+    sr = (info[10] << 12) | (info[11] << 4) | (info[12] >> 4)
+    muestras = ((info[13] & 0x0F) << 32) | struct.unpack(">I", info[14:18])[0]
+
+    return muestras / sr if muestras and sr else None
+
+
+_MP3_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],  # MPEG-1 capa III
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],      # MPEG-2/2.5 capa III
+}
+_MP3_FRECUENCIAS = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+
+def _duracion_mp3(cabecera: bytes, tamano_total: int | None):
+    inicio = 0
+    if cabecera[:3] == b"ID3":
+        tamano_id3 = (cabecera[6] << 21) | (cabecera[7] << 14) | (cabecera[8] << 7) | cabecera[9]
+        inicio = 10 + tamano_id3
+
+    # Primera trama válida (sincronía de 11 bits, capa III)
+    pos = inicio
+    while pos + 4 <= len(cabecera):
+        if cabecera[pos] == 0xFF and cabecera[pos + 1] & 0xE6 == 0xE2:
+            break
+        pos += 1
+    else:
+        return None
+
+    version = (cabecera[pos + 1] >> 3) & 0x03
+    indice_bitrate = cabecera[pos + 2] >> 4
+    indice_sr = (cabecera[pos + 2] >> 2) & 0x03
+    modo_canal = cabecera[pos + 3] >> 6
+    if version == 1 or indice_sr == 3 or indice_bitrate in (0, 15):
+        return None
+
+    sr = _MP3_FRECUENCIAS[version][indice_sr]
+    muestras_trama = 1152 if version == 3 else 576
+
+    # Cabecera Xing/Info (VBR) con el número de tramas
+    lado = (32 if modo_canal != 3 else 17) if version == 3 else (17 if modo_canal != 3 else 9)
+    xing = pos + 4 + lado
+    if cabecera[xing:xing + 4] in (b"Xing", b"Info") and cabecera[xing + 7] & 0x01:
+        tramas = struct.unpack(">I", cabecera[xing + 8:xing + 12])[0]
+        return tramas * muestras_trama / sr
+
+    # Cabecera VBRI (Fraunhofer)
+    vbri = pos + 4 + 32
+    if cabecera[vbri:vbri + 4] == b"VBRI":
+        tramas = struct.unpack(">I", cabecera[vbri + 14:vbri + 18])[0]
+        return tramas * muestras_trama / sr
+
+    # CBR: tamaño del audio / bitrate
+    if not tamano_total:
+        return None
+    bitrate = _MP3_BITRATES[1 if version == 3 else 2][indice_bitrate] * 1000
+    return (tamano_total - pos) * 8 / bitrate
+
+
+def _leer_vint(datos: bytes, pos: int, es_id: bool):
+    primero = datos[pos]
+    longitud = 1
+    while longitud <= 8 and not primero & (0x80 >> (longitud - 1)):
+        longitud += 1
+    if longitud > 8:
+        raise ValueError("VINT inválido")
+
+    valor = primero if es_id else primero & (0xFF >> longitud)
+    for b in datos[pos + 1:pos + longitud]:
+        valor = (valor << 8) | b
+
+    return valor, pos + longitud
+
+
+def _duracion_webm(cabecera: bytes):
+    # Segment > Info > (TimecodeScale, Duration)
+    info = cabecera.find(b"\x15\x49\xa9\x66")
+    if info < 0:
+        return None
+
+    tamano_info, pos = _leer_vint(cabecera, info + 4, es_id=False)
+    fin = min(len(cabecera), pos + tamano_info)
+    escala = 1_000_000
+    duracion = None
+
+    while pos < fin:
+        id_elemento, pos = _leer_vint(cabecera, pos, es_id=True)
+        tamano, pos = _leer_vint(cabecera, pos, es_id=False)
+        valor = cabecera[pos:pos + tamano]
+
+        if id_elemento == 0x2AD7B1:
+            escala = int.from_bytes(valor, "big")
+        elif id_elemento == 0x4489:
+            duracion = struct.unpack(">f" if tamano == 4 else ">d", valor)[0]
+        pos += tamano
+
+    # MediaRecorder suele omitir Duration en grabaciones en vivo
+    return duracion * escala / 1e9 if duracion else None
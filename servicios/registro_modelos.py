@@ -0,0 +1,353 @@
+# servicios/registro_modelos.py
+# Registro de versiones del modelo con cambio en caliente y modo sombra.
+#
+# Cada versión es un directorio MODELOS_DIR/<version>/ con los mismos archivos que
+# modelo_cnn/ (best_model.keras, best_model.tflite...); "base" es el propio modelo_cnn/.
+# La versión activa y la sombra se guardan en MODELOS_DIR/estado.json: el proceso que
+# recibe la orden la carga y solo si lo consigue la escribe ahí; los demás (otros
+# workers de uvicorn, procesos de herramientas.trabajador_inferencia) lo detectan al
+# sondear el archivo.
+#
+# El cambio es atómico: la versión nueva se carga y se calienta en segundo plano y
+# luego se reemplaza la referencia. Un lote que ya empezó termina con el modelo anterior.
+import json
+import os
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import monotonic, perf_counter
+
+import numpy as np
+
+from servicios.backends import BACKEND, BACKENDS, MODEL_DIR, cargar_backend
+from servicios.cascada import CASCADA_BACKEND, ModeloCascada
+from servicios.planificador import BATCH_MAX
+from servicios.preprocesado import N_MELS, TARGET_FRAMES
+
+# ---------------- CONFIGURACIÓN ----------------
+MODELOS_DIR = os.getenv("MODELOS_DIR", os.path.join(MODEL_DIR, "versiones"))
+VERSION_BASE = "base"
+# Versión al arrancar si estado.json no indica otra
+MODELO_VERSION = os.getenv("MODELO_VERSION", VERSION_BASE)
+REGISTRO_SONDEO_S = float(os.getenv("REGISTRO_SONDEO_S", "10"))
+# Lotes en espera para el modelo sombra; si está ocupado la muestra se descarta
+SOMBRA_COLA_MAX = int(os.getenv("SOMBRA_COLA_MAX", "4"))
+
+_MUESTRAS_LATENCIA = 1000
+
+
+class VersionDesconocida(Exception):
+    pass
+
+
+def ruta_version(version: str) -> str:
+    if version == VERSION_BASE:
+        return MODEL_DIR
+    # Solo nombres de directorio, nunca rutas
+    if not version or os.path.basename(version) != version or version.startswith("."):
+        raise VersionDesconocida(version)
+    ruta = os.path.join(MODELOS_DIR, version)
+    if not os.path.isdir(ruta):
+        raise VersionDesconocida(version)
+    return ruta
+
+
+def calentar(backend):
+    """Primeras inferencias fuera del tráfico real (trazado de Keras, asignación de tensores TFLite)."""
+    for n in (1, BATCH_MAX):
+        backend.predecir(np.zeros((n, N_MELS, TARGET_FRAMES, 1), dtype=np.float32))
+
+
+class EstadisticasSombra:
+    def __init__(self):
+        self.muestras = 0
+        self.ventanas = 0
+        self.acuerdo_top1 = 0
+        self.solape_top5 = 0.0
+        self.descartadas = 0
+        self.errores = 0
+        self.latencia_principal = deque(maxlen=_MUESTRAS_LATENCIA)
+        self.latencia_sombra = deque(maxlen=_MUESTRAS_LATENCIA)
+
+    def resumen(self) -> dict:
+        def percentiles(valores):
+            if not valores:
+                return None
+            t = np.array(valores) * 1000
+            return {"p50_ms": float(np.percentile(t, 50)), "p95_ms": float(np.percentile(t, 95))}
+
+        return {
+            "lotes_comparados": self.muestras,
+            "ventanas_comparadas": self.ventanas,
+            "acuerdo_top1": self.acuerdo_top1 / self.ventanas if self.ventanas else None,
+            "solape_medio_top5": self.solape_top5 / self.ventanas if self.ventanas else None,
+            "descartadas_ocupado": self.descartadas,
+            "errores": self.errores,
+            "latencia_principal": percentiles(self.latencia_principal),
+            "latencia_sombra": percentiles(self.latencia_sombra),
+        }
+
+
+class RegistroModelos:
+    def __init__(self, nombre_backend: str = BACKEND, directorio: str = MODELOS_DIR):
+        self.nombre_backend = nombre_backend
+        self.directorio = directorio
+
+        self.activo = None
+        self.version_activa = None
+        self.sombra = None
+        self.version_sombra = None
+        self.fraccion_sombra = 0.0
+
+        self._lock = threading.Lock()
+        self._carga = {"version": None, "estado": "inactiva", "error": None}
+        self._cambios = 0
+        self._estadisticas_sombra = EstadisticasSombra()
+        self._ejecutor_sombra = ThreadPoolExecutor(max_workers=1, thread_name_prefix="modelo-sombra")
+        self._sombra_pendientes = 0
+        self._estado_mtime = None
+        self._vigilante = None
+
+    # ---------------- ESTADO COMPARTIDO ----------------
+
+    def _ruta_estado(self) -> str:
+        return os.path.join(self.directorio, "estado.json")
+
+    def _leer_estado(self) -> dict:
+        try:
+            with open(self._ruta_estado()) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _escribir_estado(self, **cambios):
+        estado = {**self._leer_estado(), **cambios}
+        os.makedirs(self.directorio, exist_ok=True)
+        temporal = self._ruta_estado() + f".{os.getpid()}.tmp"
+        with open(temporal, "w") as f:
+            json.dump(estado, f)
+        os.replace(temporal, self._ruta_estado())
+
+    # ---------------- CARGA ----------------
+
+    def _cargar(self, version: str):
+        ruta = ruta_version(version)
+        backend = cargar_backend(self.nombre_backend, ruta)
+        calentar(backend)
+        if not CASCADA_BACKEND:
+            return backend
+
+        # Primera etapa de la cascada: variante rápida del mismo directorio de versión
+        primera = cargar_backend(CASCADA_BACKEND, ruta)
+        calentar(primera)
+        return ModeloCascada(primera, backend)
+
+    def iniciar(self):
+        """Carga síncrona al importar servicios.prediccion y arranque del sondeo de estado.json."""
+        estado = self._leer_estado()
+        version = estado.get("activa", MODELO_VERSION)
+        try:
+            backend = self._cargar(version)
+        except Exception:
+            if version == VERSION_BASE:
+                raise
+            # estado.json apunta a una versión rota o borrada: se arranca con la base
+            version, backend = VERSION_BASE, self._cargar(VERSION_BASE)
+
+        self.activo, self.version_activa = backend, version
+        try:
+            self._aplicar_sombra(estado)
+        except Exception:
+            pass  # sin sombra; el modelo activo ya está listo
+        self._estado_mtime = self._mtime_estado()
+
+        self._vigilante = threading.Thread(target=self._vigilar, name="registro-modelos", daemon=True)
+        self._vigilante.start()
+
+    def _activar(self, version: str, persistir: bool):
+        try:
+            backend = self._cargar(version)
+        except Exception as e:
+            with self._lock:
+                self._carga.update(estado="error", error=str(e))
+            return
+
+        with self._lock:
+            # Cambio atómico de referencia; los lotes en curso terminan con el modelo anterior
+            self.activo, self.version_activa = backend, version
+            self._cambios += 1
+            self._carga.update(
+                estado="activa",
+                segundos=round(monotonic() - self._carga["inicio"], 2),
+                fecha=datetime.now(timezone.utc).isoformat()
+            )
+
+        # Solo una versión ya cargada y calentada llega a estado.json: si la carga
+        # falla, los demás workers no intentan la versión rota y siguen coincidiendo
+        if persistir:
+            self._escribir_estado(activa=version)
+            self._estado_mtime = self._mtime_estado()
+
+    def activar(self, version: str, persistir: bool = True):
+        """Carga, calienta y activa `version` en segundo plano."""
+        ruta_version(version)
+        with self._lock:
+            if self._carga["estado"] == "cargando":
+                raise RuntimeError(f"Ya se está cargando la versión {self._carga['version']}")
+            self._carga = {"version": version, "estado": "cargando", "error": None, "inicio": monotonic()}
+
+        threading.Thread(target=self._activar, args=(version, persistir), name="registro-modelos-carga", daemon=True).start()
+
+    # ---------------- SOMBRA ----------------
+
+    def _aplicar_sombra(self, estado: dict):
+        version = estado.get("sombra")
+        fraccion = float(estado.get("fraccion_sombra", 0.0))
+
+        if not version or fraccion <= 0:
+            self.sombra, self.version_sombra, self.fraccion_sombra = None, None, 0.0
+            return
+        if version != self.version_sombra:
+            sombra = self._cargar(version)
+            with self._lock:
+                self.sombra, self.version_sombra = sombra, version
+                self._estadisticas_sombra = EstadisticasSombra()
+        self.fraccion_sombra = fraccion
+
+    def configurar_sombra(self, version: str | None, fraccion: float = 0.0):
+        """Ejecuta `version` sobre una fracción de los lotes reales (None la desactiva)."""
+        if version:
+            ruta_version(version)
+        estado = {"sombra": version, "fraccion_sombra": fraccion if version else 0.0}
+        self._aplicar_sombra(estado)
+        self._escribir_estado(**estado)
+        self._estado_mtime = self._mtime_estado()
+
+    def _comparar(self, sombra, X: np.ndarray, P: np.ndarray):
+        try:
+            inicio = perf_counter()
+            Q = np.asarray(sombra.predecir(X))
+            latencia = perf_counter() - inicio
+
+            top_p = np.argsort(P, axis=1)[:, ::-1][:, :5]
+            top_q = np.argsort(Q, axis=1)[:, ::-1][:, :5]
+            solape = sum(len(set(a) & set(b)) / 5 for a, b in zip(top_p, top_q))
+
+            with self._lock:
+                e = self._estadisticas_sombra
+                e.muestras += 1
+                e.ventanas += len(X)
+                e.acuerdo_top1 += int((top_p[:, 0] == top_q[:, 0]).sum())
+                e.solape_top5 += solape
+                e.latencia_sombra.append(latencia)
+        except Exception:
+            with self._lock:
+                self._estadisticas_sombra.errores += 1
+        finally:
+            with self._lock:
+                self._sombra_pendientes -= 1
+
+    # ---------------- INFERENCIA ----------------
+
+    def predecir(self, X: np.ndarray) -> np.ndarray:
+        # Una sola lectura de la referencia por lote
+        activo, sombra = self.activo, self.sombra
+
+        inicio = perf_counter()
+        P = activo.predecir(X)
+        latencia = perf_counter() - inicio
+
+        if sombra is not None and random.random() < self.fraccion_sombra:
+            with self._lock:
+                self._estadisticas_sombra.latencia_principal.append(latencia)
+                ocupado = self._sombra_pendientes >= SOMBRA_COLA_MAX
+                if ocupado:
+                    self._estadisticas_sombra.descartadas += 1
+                else:
+                    self._sombra_pendientes += 1
+            if not ocupado:
+                # Fuera del camino de la respuesta: el llamador no espera al modelo sombra
+                self._ejecutor_sombra.submit(self._comparar, sombra, X, np.asarray(P))
+
+        return P
+
+    @property
+    def version(self) -> str:
+        """Huella del modelo activo (clave de la caché y columna version_modelo)."""
+        return self.activo.version
+
+    @property
+    def nombre(self) -> str:
+        return self.activo.nombre
+
+    # ---------------- SONDEO DE estado.json ----------------
+
+    def _mtime_estado(self):
+        try:
+            return os.path.getmtime(self._ruta_estado())
+        except OSError:
+            return None
+
+    def _vigilar(self):
+        while True:
+            time.sleep(REGISTRO_SONDEO_S)
+            mtime = self._mtime_estado()
+            if mtime is None or mtime == self._estado_mtime:
+                continue
+            self._estado_mtime = mtime
+
+            estado = self._leer_estado()
+            try:
+                version = estado.get("activa")
+                if version and version != self.version_activa and self._carga["estado"] != "cargando":
+                    self.activar(version, persistir=False)
+                self._aplicar_sombra(estado)
+            except Exception as e:
+                with self._lock:
+                    self._carga = {"version": estado.get("activa"), "estado": "error", "error": str(e)}
+
+    # ---------------- CONSULTAS ----------------
+
+    def versiones(self) -> list:
+        nombres = [VERSION_BASE]
+        if os.path.isdir(self.directorio):
+            nombres += sorted(
+                d for d in os.listdir(self.directorio)
+                if os.path.isdir(os.path.join(self.directorio, d)) and not d.startswith(".")
+            )
+
+        return [
+            {
+                "version": nombre,
+                "backends": [b for b, archivo in BACKENDS.items() if os.path.exists(os.path.join(ruta_version(nombre), archivo))],
+                "activa": nombre == self.version_activa,
+                "sombra": nombre == self.version_sombra,
+            }
+            for nombre in nombres
+        ]
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            carga = {k: v for k, v in self._carga.items() if k != "inicio"}
+            sombra = self._estadisticas_sombra.resumen() if self.sombra is not None else None
+
+        return {
+            "backend": self.nombre_backend,
+            "version_activa": self.version_activa,
+            "huella_activa": self.activo.version if self.activo else None,
+            "cambios": self._cambios,
+            "ultima_carga": carga,
+            "cascada": self.activo.estadisticas() if isinstance(self.activo, ModeloCascada) else None,
+            "sombra": {
+                "version": self.version_sombra,
+                "huella": self.sombra.version,
+                "fraccion": self.fraccion_sombra,
+                **sombra,
+            } if sombra is not None else None,
+        }
+
+
+registro = RegistroModelos()
@@ -2,9 +2,11 @@ from datetime import datetime, timedelta
 from jose import jwt, JWTError
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from fastapi import Depends, HTTPException, status
-from db.database import get_db
+from db.database import get_db, get_db_async
 from db.modelos import Usuario
 import hashlib
 import bcrypt
@@ -74,6 +76,37 @@ def get_current_user(
 
     return user
 
+# Misma validación con la sesión async (rutas migradas a get_db_async)
+async def get_current_user_async(
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db_async)
+):
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="No autenticado",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        username: str = payload.get("sub")
+        if username is None:
+            raise credentials_exception
+    except JWTError:
+        raise credentials_exception
+
+    user = await db.scalar(select(Usuario).filter(Usuario.email == username))
+    if user is None:
+        raise credentials_exception
+
+    if not user.usuario_activo:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="La cuenta de usuario se encuentra inactiva"
+        )
+
+    return user
+
 # ------------------------------------------------------------------
 # AUTORIZACIÓN ADMIN
 # ------------------------------------------------------------------
@@ -85,4 +118,22 @@ def require_admin(usuario = Depends(get_current_user)):
             detail="Acceso restringido, solo administradores del sistema tienen acceso a este módulo."
         )
     return usuario
+
+
+# Usuario administrador del token o None, sin excepciones (middlewares fuera de las dependencias)
+def admin_desde_token(db: Session, token: str | None):
+    if not token:
+        return None
+    try:
+        username = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+    if username is None:
+        return None
+
+    user = db.query(Usuario).filter(Usuario.email == username).first()
+    if user is None or not user.usuario_activo or user.role_id != ADMIN_ROLE_ID:
+        return None
+    return user
+
 # ----------------------------------------------------------------
@@ -1,8 +1,9 @@
 from fastapi import HTTPException
-from sqlalchemy import func
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
 from servicios.seguridad import hash_password
 from db.modelos import Ave, EjecucionInferencia, SesionUsuario, Usuario
+from servicios.paginacion import cortar_pagina, paginar
 
 ADMIN_ROLE_ID = 0
 
@@ -50,47 +51,67 @@ def registrar_sesion_usuario_fallido(
     db.commit()
 
 # ------------------------------------------------------------------
-# CONSULTAS SESIONES PARA USUARIO LOGEADO
+# CONSULTAS SESIONES (paginadas por fecha_ingreso, id_sesion)
 # ------------------------------------------------------------------
-def obtener_sesiones(db: Session, usuario):
-    query = db.query(SesionUsuario).options(
-        joinedload(SesionUsuario.usuario)
-    )
+def consulta_sesiones(cursor: str | None, limite: int, id_usuario: int = None):
+    consulta = select(
+        SesionUsuario.id_sesion,
+        SesionUsuario.fecha_ingreso,
+        SesionUsuario.ip_origen,
+        SesionUsuario.agente,
+        SesionUsuario.estado,
+        SesionUsuario.observacion,
+        Usuario.id_usuario,
+        Usuario.email,
+        Usuario.role_id
+    ).join(Usuario, SesionUsuario.id_usuario == Usuario.id_usuario)
+
+    if id_usuario is not None:
+        consulta = consulta.where(SesionUsuario.id_usuario == id_usuario)
+    return paginar(consulta, SesionUsuario.fecha_ingreso, SesionUsuario.id_sesion, cursor, limite)
 
+
+def obtener_sesiones(db: Session, usuario, cursor: str | None, limite: int) -> tuple:
     # USUARIO NORMAL SOLO SUS SESIONES
-    return (
-        query
-        .filter(SesionUsuario.id_usuario == usuario.id_usuario)
-        .order_by(SesionUsuario.fecha_ingreso.desc())
-        .all()
-    )
+    filas = db.execute(consulta_sesiones(cursor, limite, usuario.id_usuario)).all()
+    return cortar_pagina(filas, limite, lambda f: (f.fecha_ingreso, f.id_sesion))
 
 
+def obtener_sesiones_admin(db: Session, usuario, cursor: str | None, limite: int) -> tuple:
+    # SOLO ADMIN VE TODAS LAS SESIONES
+    if usuario.role_id != ADMIN_ROLE_ID:
+        return [], None
+
+    filas = db.execute(consulta_sesiones(cursor, limite)).all()
+    return cortar_pagina(filas, limite, lambda f: (f.fecha_ingreso, f.id_sesion))
+
 # ------------------------------------------------------------------
-# CONSULTAS SESIONES PARA USUARIO ADMIN
+# CONSULTAS USUARIOS (paginadas por fecha_creacion, id_usuario)
 # ------------------------------------------------------------------
-def obtener_sesiones_admin(db: Session, usuario):
-    query = db.query(SesionUsuario).options(
-        joinedload(SesionUsuario.usuario)
+def consulta_usuarios(cursor: str | None, limite: int, nombre: str = None):
+    consulta = select(
+        Usuario.id_usuario,
+        Usuario.email,
+        Usuario.nombre_completo,
+        Usuario.role_id,
+        Usuario.fecha_creacion,
+        Usuario.usuario_activo
     )
+    if nombre is not None:
+        consulta = consulta.where(Usuario.nombre_completo.ilike(f"%{nombre}%"))
+    return paginar(consulta, Usuario.fecha_creacion, Usuario.id_usuario, cursor, limite)
 
-    # SOLO ADMIN VE TODAS LAS SESIONES
-    if usuario.role_id == ADMIN_ROLE_ID:
-        return query.order_by(
-            SesionUsuario.fecha_ingreso.desc()
-        ).all()
 
-# ------------------------------------------------------------------
-# CONSULTAS USUARIOS
-# ------------------------------------------------------------------
-def obtener_usuarios(db: Session):
-    return db.query(Usuario).order_by(Usuario.fecha_creacion.desc()).all()
+def obtener_usuarios(db: Session, cursor: str | None, limite: int) -> tuple:
+    filas = db.execute(consulta_usuarios(cursor, limite)).all()
+    return cortar_pagina(filas, limite, lambda f: (f.fecha_creacion, f.id_usuario))
 
 # ------------------------------------------------------------------
 # CONSULTAS USUARIOS POR NOMBRE
 # ------------------------------------------------------------------
-def obtener_usuario_nombre(db: Session, nombre: str):
-    return db.query(Usuario).filter(Usuario.nombre_completo.ilike(f"%{nombre}%")).order_by(Usuario.fecha_creacion.desc()).all()
+def obtener_usuario_nombre(db: Session, nombre: str, cursor: str | None, limite: int) -> tuple:
+    filas = db.execute(consulta_usuarios(cursor, limite, nombre)).all()
+    return cortar_pagina(filas, limite, lambda f: (f.fecha_creacion, f.id_usuario))
 
 #--------------------------------------------------
 #CONSULTAR USUARIOS INACTIVOS POR NOMBRE
@@ -0,0 +1,451 @@
+# servicios/trabajos.py
+# Cola de inferencias asíncronas sobre la tabla trabajos_inferencia.
+#
+# La API guarda el audio en TRABAJOS_DIR e inserta el trabajo como "pendiente".
+# Los trabajadores (hilos de la API o procesos de herramientas.trabajador_inferencia)
+# lo reclaman con FOR UPDATE SKIP LOCKED y un arrendamiento: si un trabajador muere,
+# el arrendamiento vence y otro trabajador lo reintenta.
+#
+# Las grabaciones largas solo las procesan los procesos de herramientas.trabajador_inferencia:
+# decodificar y calcular el log-mel de horas de audio en un hilo de la API competiría
+# por el GIL con el event loop, y la decodificación por bloques con estado no se puede
+# repartir entre los procesos del pool de preprocesado.
+import os
+import shutil
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from time import perf_counter
+
+from sqlalchemy import and_, or_, update
+from sqlalchemy.orm import Session
+
+from db.database import SessionLocal
+from db.modelos import EjecucionInferencia, MetadatoAudio, TrabajoInferencia
+from servicios.compuerta_actividad import compuerta
+from servicios.decodificacion import registrar_tiempos
+from servicios.ejecucion import ServidorSaturado, preproceso
+from servicios.metricas import TiemposEtapas
+
+# ---------------- CONFIGURACIÓN ----------------
+TRABAJOS_DIR = os.getenv("TRABAJOS_DIR", "trabajos_audio")
+# Hilos trabajadores dentro de cada proceso de la API (0 = solo trabajadores externos).
+# Solo toman clips cortos; las grabaciones largas necesitan herramientas.trabajador_inferencia
+TRABAJOS_TRABAJADORES = int(os.getenv("TRABAJOS_TRABAJADORES", "1"))
+TRABAJOS_MAX_INTENTOS = int(os.getenv("TRABAJOS_MAX_INTENTOS", "3"))
+TRABAJOS_ARRENDAMIENTO_S = float(os.getenv("TRABAJOS_ARRENDAMIENTO_S", "300"))
+TRABAJOS_ESPERA_S = float(os.getenv("TRABAJOS_ESPERA_S", "1"))
+# Las grabaciones largas renuevan el arrendamiento cada este tiempo mientras se analizan
+TRABAJOS_RENOVAR_S = float(os.getenv("TRABAJOS_RENOVAR_S", str(TRABAJOS_ARRENDAMIENTO_S / 3)))
+
+PENDIENTE = "pendiente"
+PROCESANDO = "procesando"
+COMPLETADO = "completado"
+ERROR = "error"
+ESTADOS_FINALES = (COMPLETADO, ERROR)
+
+# parametros["tipo"]: sin tipo = inferencia de un clip corto
+TIPO_GRABACION_LARGA = "grabacion_larga"
+
+
+class TrabajoInvalido(Exception):
+    """Error del propio audio (p. ej. duración fuera de rango): no se reintenta."""
+
+
+class TrabajoPerdido(Exception):
+    """Otro trabajador reclamó el trabajo: se abandona sin tocar su estado ni su audio."""
+
+# ------------------------------------------------------------------
+# ENCOLAR
+# ------------------------------------------------------------------
+
+def guardar_audio_trabajo(audio) -> str:
+    """Copia la subida (AudioRecibido) a TRABAJOS_DIR y devuelve su ruta."""
+    os.makedirs(TRABAJOS_DIR, exist_ok=True)
+    ruta = os.path.join(TRABAJOS_DIR, f"{audio.huella}_{time.time_ns()}")
+
+    if audio.ruta is not None:
+        shutil.move(audio.ruta, ruta)
+        audio.ruta = None
+    else:
+        with open(ruta, "wb") as f:
+            f.write(audio.contenido)
+
+    return ruta
+
+
+def crear_trabajo(db: Session, id_usuario: int, ruta_audio: str, parametros: dict) -> TrabajoInferencia:
+    trabajo = TrabajoInferencia(
+        id_usuario=id_usuario,
+        estado=PENDIENTE,
+        intentos=0,
+        ruta_audio=ruta_audio,
+        parametros=parametros
+    )
+    db.add(trabajo)
+    db.commit()
+    db.refresh(trabajo)
+    return trabajo
+
+
+def obtener_trabajo(db: Session, id_trabajo: int) -> TrabajoInferencia | None:
+    return db.query(TrabajoInferencia).filter(TrabajoInferencia.id_trabajo == id_trabajo).first()
+
+
+def estado_trabajo(trabajo: TrabajoInferencia) -> dict:
+    return {
+        "id_trabajo": trabajo.id_trabajo,
+        "estado": trabajo.estado,
+        "intentos": trabajo.intentos,
+        "log_id": trabajo.log_id,
+        "resultado": trabajo.resultado,
+        "error": trabajo.error,
+        "fecha_creacion": trabajo.fecha_creacion.isoformat() if trabajo.fecha_creacion else None,
+        "fecha_actualizacion": trabajo.fecha_actualizacion.isoformat() if trabajo.fecha_actualizacion else None,
+    }
+
+# ------------------------------------------------------------------
+# RECLAMAR / CERRAR
+# ------------------------------------------------------------------
+
+def recoger_trabajos_agotados(db: Session) -> int:
+    """
+    Cierra como error los trabajos cuyo último intento murió (arrendamiento vencido
+    con intentos >= TRABAJOS_MAX_INTENTOS): ningún trabajador puede reclamarlos ya.
+    """
+    agotados = (
+        db.query(TrabajoInferencia)
+        .filter(
+            TrabajoInferencia.estado == PROCESANDO,
+            TrabajoInferencia.bloqueado_hasta < datetime.now(timezone.utc),
+            TrabajoInferencia.intentos >= TRABAJOS_MAX_INTENTOS
+        )
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not agotados:
+        db.rollback()
+        return 0
+
+    rutas = []
+    for trabajo in agotados:
+        trabajo.estado = ERROR
+        trabajo.error = f"El trabajador {trabajo.trabajador} no terminó el intento {trabajo.intentos} de {TRABAJOS_MAX_INTENTOS}."
+        trabajo.bloqueado_hasta = None
+        rutas.append(trabajo.ruta_audio)
+        trabajo.ruta_audio = None
+    db.commit()
+
+    for ruta in rutas:
+        if ruta and os.path.exists(ruta):
+            os.remove(ruta)
+    return len(agotados)
+
+
+def reclamar_trabajo(db: Session, trabajador: str, grabaciones_largas: bool = True) -> TrabajoInferencia | None:
+    """`grabaciones_largas=False`: solo clips cortos (hilos trabajadores de la API)."""
+    recoger_trabajos_agotados(db)
+    ahora = datetime.now(timezone.utc)
+
+    consulta = db.query(TrabajoInferencia).filter(
+        TrabajoInferencia.intentos < TRABAJOS_MAX_INTENTOS,
+        or_(
+            TrabajoInferencia.estado == PENDIENTE,
+            # Arrendamiento vencido: el trabajador que lo tenía murió
+            and_(TrabajoInferencia.estado == PROCESANDO, TrabajoInferencia.bloqueado_hasta < ahora)
+        )
+    )
+    if not grabaciones_largas:
+        consulta = consulta.filter(TrabajoInferencia.parametros["tipo"].as_string().is_(None))
+
+    trabajo = (
+        consulta
+        .order_by(TrabajoInferencia.id_trabajo)
+        .with_for_update(skip_locked=True)
+        .first()
+    )
+    if trabajo is None:
+        db.rollback()
+        return None
+
+    trabajo.estado = PROCESANDO
+    trabajo.intentos += 1
+    trabajo.trabajador = trabajador
+    trabajo.bloqueado_hasta = ahora + timedelta(seconds=TRABAJOS_ARRENDAMIENTO_S)
+    db.commit()
+    return trabajo
+
+
+def renovar_arrendamiento(db: Session, id_trabajo: int, trabajador: str, intento: int):
+    """
+    Extiende bloqueado_hasta mientras el trabajo siga siendo de este trabajador y
+    de este intento. TrabajoPerdido si otro lo reclamó (el arrendamiento venció antes).
+    """
+    renovado = db.execute(
+        update(TrabajoInferencia)
+        .where(
+            TrabajoInferencia.id_trabajo == id_trabajo,
+            TrabajoInferencia.estado == PROCESANDO,
+            TrabajoInferencia.trabajador == trabajador,
+            TrabajoInferencia.intentos == intento
+        )
+        .values(bloqueado_hasta=datetime.now(timezone.utc) + timedelta(seconds=TRABAJOS_ARRENDAMIENTO_S))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    if not renovado:
+        raise TrabajoPerdido(f"El trabajo {id_trabajo} ya no pertenece a {trabajador}.")
+
+
+def _borrar_audio(trabajo: TrabajoInferencia):
+    if trabajo.ruta_audio and os.path.exists(trabajo.ruta_audio):
+        os.remove(trabajo.ruta_audio)
+    trabajo.ruta_audio = None
+
+
+def fallar_trabajo(db: Session, trabajo: TrabajoInferencia, error: str, definitivo: bool = False):
+    db.rollback()
+    trabajo.error = error
+    trabajo.bloqueado_hasta = None
+
+    if definitivo or trabajo.intentos >= TRABAJOS_MAX_INTENTOS:
+        trabajo.estado = ERROR
+        _borrar_audio(trabajo)
+    else:
+        trabajo.estado = PENDIENTE
+
+    db.commit()
+
+
+def liberar_trabajo(db: Session, trabajo: TrabajoInferencia):
+    """Devuelve el trabajo a la cola sin gastar un intento (p. ej. pool de preprocesado saturado)."""
+    db.rollback()
+    trabajo.estado = PENDIENTE
+    trabajo.intentos -= 1
+    trabajo.bloqueado_hasta = None
+    db.commit()
+
+
+def _completar_trabajo(db: Session, trabajo: TrabajoInferencia, log: EjecucionInferencia, origen: str, resultado: dict):
+    """Inferencia, metadatos y cierre del trabajo en una sola transacción."""
+    p = trabajo.parametros
+    db.add(log)
+    db.flush()
+
+    db.add(MetadatoAudio(
+        origen=origen,
+        formato=p["content_type"],
+        id_usuario=trabajo.id_usuario,
+        id_inferencia=log.log_id,
+        latitud=p.get("latitud") or 0.0,
+        longitud=p.get("longitud") or 0.0,
+        localizacion=p.get("localizacion") or 'No especificada'
+    ))
+
+    trabajo.estado = COMPLETADO
+    trabajo.log_id = log.log_id
+    trabajo.error = None
+    trabajo.bloqueado_hasta = None
+    trabajo.resultado = resultado
+    ruta_audio, trabajo.ruta_audio = trabajo.ruta_audio, None
+    db.commit()
+
+    # El audio se borra solo después del commit: si la transacción falla, el reintento lo necesita
+    if ruta_audio and os.path.exists(ruta_audio):
+        os.remove(ruta_audio)
+
+
+def procesar_grabacion_larga(db: Session, trabajo: TrabajoInferencia):
+    """
+    Línea de tiempo de detecciones; el audio se lee por bloques en este mismo hilo.
+    Solo en procesos de herramientas.trabajador_inferencia (los hilos de la API no las reclaman).
+    """
+    from servicios.grabaciones_largas import DuracionExcedida, analizar_grabacion
+    from servicios.prediccion import obtener_imagen_ave, planificador, registro
+
+    p = trabajo.parametros
+    version_modelo = registro.version
+    # El análisis puede durar más que el arrendamiento: se renueva entre bloques.
+    # El dueño se toma ahora: tras un commit los atributos se recargan de la BD
+    # y ya mostrarían al trabajador que lo hubiera reclamado después.
+    propietario = (trabajo.id_trabajo, trabajo.trabajador, trabajo.intentos)
+    proxima_renovacion = time.monotonic() + TRABAJOS_RENOVAR_S
+
+    def al_avanzar():
+        nonlocal proxima_renovacion
+        if time.monotonic() >= proxima_renovacion:
+            renovar_arrendamiento(db, *propietario)
+            proxima_renovacion = time.monotonic() + TRABAJOS_RENOVAR_S
+
+    try:
+        analisis = analizar_grabacion(
+            trabajo.ruta_audio,
+            p["content_type"],
+            planificador.predecir,
+            salto=p["salto_ventana"],
+            umbral=p["umbral"],
+            max_duracion=p["max_duracion"],
+            al_avanzar=al_avanzar
+        )
+    except DuracionExcedida as e:
+        raise TrabajoInvalido(str(e))
+
+    duracion = analisis["duracion_audio"]
+    if duracion < p["min_duracion"] or not analisis["top_5_predicciones"]:
+        raise TrabajoInvalido(f"Duración inválida: {duracion:.2f}s")
+
+    principal = analisis["top_5_predicciones"][0]
+    log = EjecucionInferencia(
+        id_usuario=trabajo.id_usuario,
+        prediccion_especie=principal["nombre_cientifico"],
+        confianza=principal["probabilidad"],
+        top_5=analisis["top_5_predicciones"],
+        tiempo_ejecucion=analisis["tiempo_ejecucion"],
+        version_modelo=version_modelo
+    )
+    _completar_trabajo(db, trabajo, log, "Grabacion_larga_API", {
+        "prediccion_principal": {
+            "archivo": p.get("archivo"),
+            "duracion_audio": f"{duracion:.2f} segundos.",
+            "tiempo_ejecucion": f"{analisis['tiempo_ejecucion']:.2f} segundos.",
+            "factor_tiempo_real": analisis["factor_tiempo_real"],
+            "ventanas": analisis["ventanas"],
+            "ventanas_omitidas": analisis["ventanas_omitidas"],
+            "especie": principal["nombre_cientifico"],
+            "probabilidad": principal["probabilidad"],
+            "url_imagen": obtener_imagen_ave(principal["nombre_cientifico"])
+        },
+        "linea_tiempo": analisis["linea_tiempo"],
+        "top_5_predicciones": analisis["top_5_predicciones"]
+    })
+
+
+def procesar_trabajo(db: Session, trabajo: TrabajoInferencia, preprocesar=None):
+    """`preprocesar` ejecuta decodificar_y_preprocesar (por defecto en el mismo hilo)."""
+    if trabajo.parametros.get("tipo") == TIPO_GRABACION_LARGA:
+        return procesar_grabacion_larga(db, trabajo)
+
+    # Importación diferida: carga el modelo solo en los procesos que procesan trabajos
+    from servicios.prediccion import combinar_probabilidades, obtener_imagen_ave, planificador, registro, resultados_top_n
+    from servicios.preprocesado import decodificar_y_preprocesar
+
+    p = trabajo.parametros
+    inicio = perf_counter()
+    etapas = TiemposEtapas()
+    preprocesar = preprocesar or (lambda fn, *args, **kwargs: fn(*args, **kwargs))
+
+    X, duracion, tiempos, omitidas, etapas_pool = preprocesar(
+        decodificar_y_preprocesar,
+        trabajo.ruta_audio,
+        p["content_type"],
+        modo=p["modo"],
+        salto_ventana=p["salto_ventana"],
+        min_duracion=p["min_duracion"],
+        max_duracion=p["max_duracion"]
+    )
+    registrar_tiempos(tiempos)
+    for etapa, segundos in etapas_pool.items():
+        etapas.agregar(etapa, segundos)
+    if X is None:
+        raise TrabajoInvalido(f"Duración inválida: {duracion:.2f}s")
+    compuerta.registrar(len(X) + omitidas, omitidas)
+
+    version_modelo = registro.version
+    with etapas.medir("modelo"):
+        P = planificador.predecir(X)
+    with etapas.medir("top_n"):
+        probs = P[0] if len(P) == 1 else combinar_probabilidades(P, p["agregacion"])
+        resultados = resultados_top_n(probs, top_n=5)
+    tiempo = perf_counter() - inicio
+
+    log = EjecucionInferencia(
+        id_usuario=trabajo.id_usuario,
+        prediccion_especie=resultados[0]["nombre_cientifico"],
+        confianza=resultados[0]["probabilidad"],
+        top_5=resultados,
+        tiempo_ejecucion=tiempo,
+        version_modelo=version_modelo,
+        tiempos_etapas=etapas.como_dict()
+    )
+    _completar_trabajo(db, trabajo, log, "Trabajo_asincrono_API", {
+        "prediccion_principal": {
+            "archivo": p.get("archivo"),
+            "duracion_audio": f"{duracion:.2f} segundos.",
+            "tiempo_ejecucion": f"{tiempo:.2f} segundos.",
+            "especie": resultados[0]["nombre_cientifico"],
+            "probabilidad": resultados[0]["probabilidad"],
+            "url_imagen": obtener_imagen_ave(resultados[0]["nombre_cientifico"])
+        },
+        "top_5_predicciones": resultados
+    })
+
+# ------------------------------------------------------------------
+# BUCLE DEL TRABAJADOR
+# ------------------------------------------------------------------
+
+def ejecutar_trabajador(nombre: str, detener: threading.Event | None = None, preprocesar=None, grabaciones_largas: bool = True):
+    detener = detener or threading.Event()
+
+    while not detener.is_set():
+        db = SessionLocal()
+        try:
+            trabajo = reclamar_trabajo(db, nombre, grabaciones_largas)
+            if trabajo is None:
+                detener.wait(TRABAJOS_ESPERA_S)
+                continue
+
+            try:
+                procesar_trabajo(db, trabajo, preprocesar)
+            except TrabajoPerdido:
+                db.rollback()
+            except ServidorSaturado:
+                liberar_trabajo(db, trabajo)
+                detener.wait(TRABAJOS_ESPERA_S)
+            except TrabajoInvalido as e:
+                fallar_trabajo(db, trabajo, str(e), definitivo=True)
+            except Exception as e:
+                fallar_trabajo(db, trabajo, str(e))
+        except Exception:
+            # BD no disponible: se reintenta tras la espera
+            detener.wait(TRABAJOS_ESPERA_S)
+        finally:
+            db.close()
+
+
+def _preprocesar_en_pool(fn, *args, **kwargs):
+    return preproceso.enviar(fn, *args, **kwargs).result()
+
+
+class TrabajadoresLocales:
+    """
+    Hilos trabajadores dentro del proceso de la API: el preprocesado va al pool
+    de procesos y la inferencia al planificador, igual que las peticiones síncronas.
+    Solo clips cortos: las grabaciones largas no pasan por el pool (ver cabecera).
+    """
+
+    def __init__(self, cantidad: int = TRABAJOS_TRABAJADORES):
+        self.cantidad = cantidad
+        self._detener = threading.Event()
+        self._hilos = []
+
+    def iniciar(self):
+        prefijo = f"{socket.gethostname()}:{os.getpid()}"
+        for i in range(self.cantidad):
+            hilo = threading.Thread(
+                target=ejecutar_trabajador,
+                args=(f"{prefijo}:{i}", self._detener, _preprocesar_en_pool, False),
+                name=f"trabajador-inferencia-{i}",
+                daemon=True
+            )
+            hilo.start()
+            self._hilos.append(hilo)
+
+    def detener(self):
+        self._detener.set()
+        for hilo in self._hilos:
+            hilo.join(timeout=TRABAJOS_ESPERA_S + 5)
+        self._hilos = []
+
+
+trabajadores = TrabajadoresLocales()